@@ -24,9 +24,6 @@ class CheckAstroPhoto(BaseValidationTest):
         self.min_mag = kwargs['min_mag']  # Minimum magnitude to bin the sample
         self.max_mag = kwargs['max_mag']  # Maximum magnitude to bin the sample
         self.nbins = kwargs['nbins_mag'] # Number of bins
-        self.ra=dict() # Here we are going to store the RA for all catalogs
-        self.dec=dict() # Here we are going to store the DEC for all catalogs
-        self.magnitude=dict() # Here we are going to store the magnitude (in different bands for all catalogs)
         self.selection_cuts = kwargs['selection_cuts'] # Selection cuts to perform on the data sample
         self.bands = kwargs['bands'] # Photometric band(s) to analyze
       
@@ -39,11 +36,8 @@ class CheckAstroPhoto(BaseValidationTest):
         data = catalog_instance.get_quantities(qs, filters=filters)
         data = {mags.get(k, k): v for k, v in data.items()}
         print('Selected %d objects for catalog %s' % (len(data), catalog_name))
-        self.ra[catalog_name] = data['ra']
-        self.dec[catalog_name] = data['dec']
-        
-        for band in self.bands:
-            self.magnitude[(catalog_name, band)] = data['mag_%s' % band]
+        # RA, DEC and magnitudes are stored on disk (instead of in memory) until conclude_test
+        self.save_result_artifact(output_dir, data, metadata={'catalog': catalog_name}, name='catalog_data')
         return TestResult(inspect_only=True)
 
     def scatter_project(self, x, y, xmin, xmax, ymin, ymax, nbins, xlabel, ylabel, savename, bin_stat=False):
@@ -95,26 +89,42 @@ class CheckAstroPhoto(BaseValidationTest):
         This function should gather the two catalogs, match them and perform the summary plots
         """     
 
-        if len(self.ra) != 2: # Making sure that we have *just* two catalogs
+        # Load the RA, DEC and magnitudes saved by run_on_single_catalog
+        ra = dict()
+        dec = dict()
+        magnitude = dict()
+        filenames = []
+        for catalog_name, artifact in self.iter_result_artifacts(output_dir, 'catalog_data'):
+            ra[catalog_name] = artifact['ra']
+            dec[catalog_name] = artifact['dec']
+            for band in self.bands:
+                magnitude[(catalog_name, band)] = artifact['mag_%s' % band]
+            filenames.append(artifact.filename)
+
+        # The catalog data are now in memory; do not leave them in the (web-served) output directory
+        for filename in filenames:
+            os.remove(filename)
+
+        if len(ra) != 2: # Making sure that we have *just* two catalogs
             raise ValueError('The test can compare two catalogs only!')
 
-        cat_names = list(self.ra) # This is an auxiliary list to easily get the catalogs 
-        cat_names = sorted(cat_names, key=lambda name: len(self.ra[name]))   
+        cat_names = list(ra) # This is an auxiliary list to easily get the catalogs 
+        cat_names = sorted(cat_names, key=lambda name: len(ra[name]))   
      
         # For this test we are going to match using closest neighbor since it is the fastest but it can be easily
         # swapped for any other matching strategy
         
-        matched_id = spatial_closest(self.ra[cat_names[0]], self.dec[cat_names[0]], 
-                                     self.ra[cat_names[1]], self.dec[cat_names[1]],
-                                     np.arange(len(self.ra[cat_names[1]])))[1]
+        matched_id = spatial_closest(ra[cat_names[0]], dec[cat_names[0]], 
+                                     ra[cat_names[1]], dec[cat_names[1]],
+                                     np.arange(len(ra[cat_names[1]])))[1]
         
-        delta_ra = self.ra[cat_names[0]]-self.ra[cat_names[1]][matched_id]
-        delta_dec = self.dec[cat_names[0]]-self.dec[cat_names[1]][matched_id]
+        delta_ra = ra[cat_names[0]]-ra[cat_names[1]][matched_id]
+        delta_dec = dec[cat_names[0]]-dec[cat_names[1]][matched_id]
         delta_mag = dict()
         good_mag = dict()
         for band in self.bands:
-            delta_mag[band] = self.magnitude[(cat_names[0], band)]-self.magnitude[(cat_names[1],band)][matched_id]
-            good_mag[band] = (np.isnan(self.magnitude[(cat_names[0], band)])==False) & (np.isinf(self.magnitude[(cat_names[0], band)])==False)
+            delta_mag[band] = magnitude[(cat_names[0], band)]-magnitude[(cat_names[1],band)][matched_id]
+            good_mag[band] = (np.isnan(magnitude[(cat_names[0], band)])==False) & (np.isinf(magnitude[(cat_names[0], band)])==False)
         # Scatter plot + histogram of RA and Dec (assumed to be in degrees)
         astro_savename = os.path.join(output_dir, 'astrometry_check_%s_%s.png' % (cat_names[0], cat_names[1]))
         self.scatter_project(delta_ra*3600, delta_dec*3600, -0.5, 0.5, -0.5, 0.5, 100, r'$\Delta$ RA [arcsec]',
@@ -123,11 +133,11 @@ class CheckAstroPhoto(BaseValidationTest):
         # Scatter plot + histogram of Delta mag vs mag
         for band in self.bands:
             photo_savename = os.path.join(output_dir, 'photometry_check_%s_%s_%s.png' % (cat_names[0], cat_names[1], band))
-            self.scatter_project(self.magnitude[(cat_names[0], band)][good_mag[band]],
+            self.scatter_project(magnitude[(cat_names[0], band)][good_mag[band]],
                 delta_mag[band][good_mag[band]], self.min_mag, self.max_mag,
                 -1, 1, self.nbins, '%s' % band, r'$\Delta %s$' % band, photo_savename, bin_stat=True)
-            n_true, _ = np.histogram(self.magnitude[(cat_names[1], band)], bins=50, range=(10, 30))
-            n_meas, bin_edges = np.histogram(self.magnitude[(cat_names[0], band)], bins=50, range=(10, 30))
+            n_true, _ = np.histogram(magnitude[(cat_names[1], band)], bins=50, range=(10, 30))
+            n_meas, bin_edges = np.histogram(magnitude[(cat_names[0], band)], bins=50, range=(10, 30))
             fig = plt.figure()
             plt.plot(0.5*(bin_edges[1:]+bin_edges[:-1]), n_meas.astype(float)/n_true,'o')
             plt.xlabel('{}'.format(band))
@@ -5,14 +5,14 @@ import re
 import numpy as np
 import scipy.special as scsp
 import treecorr
-import healpy as hp
-from sklearn.cluster import k_means
 from GCR import GCRQuery
 
 from .base import BaseValidationTest, TestResult
-from .plotting import plt
-from .utils import (generate_uniform_random_ra_dec_footprint,
-                    get_healpixel_footprint,
+from .plotting import plt, save_figure
+from .cosmology import get_distance_table
+from .utils import (HealpixFootprint,
+                    get_catalog_footprint,
+                    get_jackknife_regions,
                     generate_uniform_random_dist)
 
 __all__ = ['CorrelationsAngularTwoPoint', 'CorrelationsProjectedTwoPoint',
@@ -31,7 +31,7 @@ def redshift2dist(z, cosmology):
     -------
     float array like of comoving distances
     """
-    return cosmology.comoving_distance(z).to('Mpc').value * cosmology.h
+    return get_distance_table(cosmology).comoving_distance(z) * cosmology.h
 
 
 class CorrelationUtilities(BaseValidationTest):
@@ -73,11 +73,16 @@ class CorrelationUtilities(BaseValidationTest):
         }
         self.random_nside = kwargs.get('random_nside', 1024)
         self.random_mult = kwargs.get('random_mult', 3)
+        # use the (shared, cached) footprint of the whole catalog instead of the loaded sample
+        self.use_catalog_footprint = kwargs.get('use_catalog_footprint', False)
+        self.footprint_cache_dir = kwargs.get('footprint_cache_dir', None)
 
         # jackknife errors
         self.jackknife = kwargs.get('jackknife', False)
         if self.jackknife:
             self.N_jack = kwargs.get('N_jack', 30)
+            # nside of the (coarser) pixels that are grouped into jackknife regions
+            self.jackknife_region_nside = min(kwargs.get('jackknife_region_nside', 64), self.random_nside)
             jackknife_quantities = kwargs.get('jackknife_quantities',
                                               {'ra':['ra', 'ra_true'], 'dec':['dec', 'dec_true']})
             if 'ra' not in self.requested_columns or 'dec' not in self.requested_columns:
@@ -188,6 +193,32 @@ class CorrelationUtilities(BaseValidationTest):
         return GCRQuery(*filters).filter(catalog_data)
 
 
+    def save_correlation_artifact(self, output_dir, corr_data, catalog_name, covariances=None):
+        """ Save measured correlation functions (and jackknife covariances)
+        as a result artifact.
+
+        Parameters
+        ----------
+        output_dir : string
+            Full path of the directory to write results to.
+        corr_data : dict
+            sample name -> (separation, amplitude, amp_err)
+        catalog_name : string
+            Name of the catalog used in the test.
+        covariances : dict, optional
+            '<sample name>/xi' -> covariance of amplitude
+        """
+        data = dict()
+        for sample_name, (xi_rad, xi, xi_sig) in corr_data.items():
+            data[sample_name + '/r'] = xi_rad
+            data[sample_name + '/xi'] = xi
+            data[sample_name + '/xi_err'] = xi_sig
+        self.save_result_artifact(output_dir, data, covariances, metadata={
+            'catalog': catalog_name,
+            'samples': {name: self.test_samples[name] for name in corr_data},
+        })
+
+
     def plot_data_comparison(self, corr_data, catalog_name, output_dir):
         """ Plot measured correlation functions and compare them against test
         data.
@@ -238,9 +269,7 @@ class CorrelationUtilities(BaseValidationTest):
 
             self.decorate_plot(ax, catalog_name)
 
-        fig.tight_layout()
-        fig.savefig(os.path.join(output_dir, '{:s}.png'.format(self.test_name)), bbox_inches='tight')
-        plt.close(fig)
+        save_figure(fig, os.path.join(output_dir, '{:s}.png'.format(self.test_name)), tight_layout=True, bbox_inches='tight')
 
 
     def get_legend_title(self, test_samples, exclude='mstellar'):
@@ -309,8 +338,7 @@ class CorrelationUtilities(BaseValidationTest):
         return TestResult(inspect_only=True)
 
 
-    @staticmethod
-    def get_jackknife_randoms(N_jack, catalog_data, generate_randoms, ra='ra', dec='dec'):
+    def get_jackknife_randoms(self, N_jack, catalog_data, generate_randoms, ra='ra', dec='dec', footprint=None):
         """
         Computes the jackknife regions and random catalogs for each region 
         Parameters
@@ -318,15 +346,21 @@ class CorrelationUtilities(BaseValidationTest):
         N_jack : number of regions
         catalog_data : input catalog
         generate_randoms: function to generate randoms (eg self.generate_processed_randoms)
+        footprint: HealpixFootprint of catalog_data (computed if not given)
 
         Returns
         -------
         jack_labels: array of regions in catalog data
         randoms: dict of randoms labeled by region
         """
-        #cluster
-        nn = np.stack((catalog_data[ra], catalog_data[dec]), axis=1)
-        _, jack_labels, _ = k_means(n_clusters=N_jack, random_state=0, X=nn)
+        #assign regions by healpix lookup (regions are shared by tests with the same footprint)
+        if footprint is None:
+            footprint = self.get_footprint(catalog_data)
+        regions = get_jackknife_regions(footprint, N_jack, self.jackknife_region_nside)
+        jack_labels = regions.get_labels(catalog_data[ra], catalog_data[dec])
+        n_unlabeled = np.count_nonzero(jack_labels < 0)
+        if n_unlabeled:
+            print('Warning: {} galaxies are outside the jackknife regions and are kept in every jackknife sample'.format(n_unlabeled))
 
         randoms = {}
         for nj in range(N_jack):
@@ -381,14 +415,27 @@ class CorrelationUtilities(BaseValidationTest):
 
         return covariance
 
-    def check_footprint(self, catalog_data):
+    def get_footprint(self, catalog_data, catalog_instance=None, catalog_name=None):
         """
+        Healpix footprint (at nside = random_nside) of the catalog positions,
+        from which both the footprint area and the randoms are derived.
+        If `use_catalog_footprint` is set, the footprint of the full catalog
+        is obtained from `get_catalog_footprint` and shared with other tests;
+        it uses the same ra/dec columns as `catalog_data`.
         """
-        pix_footprint = get_healpixel_footprint(catalog_data['ra'], 
-                                                catalog_data['dec'], self.random_nside)
-        area_footprint = 4.*np.pi*(180./np.pi)**2*len(pix_footprint)/hp.nside2npix(self.random_nside)
+        if self.use_catalog_footprint and catalog_instance is not None:
+            ra, dec = (catalog_instance.first_available(*self.requested_columns[k]) for k in ('ra', 'dec'))
+            return get_catalog_footprint(catalog_instance, catalog_name, self.random_nside, self.footprint_cache_dir,
+                                         ra=ra, dec=dec)
+        return HealpixFootprint(self.random_nside).add(catalog_data['ra'], catalog_data['dec'])
 
-        return area_footprint
+    def check_footprint(self, catalog_data, footprint=None):
+        """
+        Returns the footprint area in sq. deg.
+        """
+        if footprint is None:
+            footprint = self.get_footprint(catalog_data)
+        return footprint.get_sky_area()
 
 
 class CorrelationsAngularTwoPoint(CorrelationUtilities):
@@ -401,23 +448,23 @@ class CorrelationsAngularTwoPoint(CorrelationUtilities):
         self.treecorr_config['sep_units'] = 'deg'
 
 
-    def generate_processed_randoms(self, catalog_data):
+    def generate_processed_randoms(self, catalog_data, footprint=None):
         """ Create and process random data for the 2pt correlation function.
 
         Parameters
         ----------
         catalog_data : dict
+        footprint : HealpixFootprint, optional
+            footprint of catalog_data, computed if not given
 
         Returns
         -------
         tuple of (random catalog treecorr.Catalog instance,
                   processed treecorr.NNCorrelation on the random catalog)
         """
-        rand_ra, rand_dec = generate_uniform_random_ra_dec_footprint(
-            catalog_data['ra'].size * self.random_mult,
-            get_healpixel_footprint(catalog_data['ra'], catalog_data['dec'], self.random_nside),
-            self.random_nside,
-        )
+        if footprint is None:
+            footprint = self.get_footprint(catalog_data)
+        rand_ra, rand_dec = footprint.generate_uniform_random_ra_dec(catalog_data['ra'].size * self.random_mult)
         rand_cat = treecorr.Catalog(ra=rand_ra, dec=rand_dec, ra_units='deg', dec_units='deg')
         rr = treecorr.NNCorrelation(**self.treecorr_config)
         rr.process(rand_cat)
@@ -482,20 +529,24 @@ class CorrelationsAngularTwoPoint(CorrelationUtilities):
             return TestResult(skipped=True,
                               summary='Missing requested quantities {}'.format(', '.join(cols)))
 
+        footprint = self.get_footprint(catalog_data, catalog_instance, catalog_name) #assumes ra and dec exist
+
         if self.truncate_cat_name:
             catalog_name = re.split('_', catalog_name)[0]
 
-        rand_cat, rr = self.generate_processed_randoms(catalog_data) #assumes ra and dec exist
+        rand_cat, rr = self.generate_processed_randoms(catalog_data, footprint)
         with open(os.path.join(output_dir, 'galaxy_count.dat'), 'a') as f:
-            f.write('Total (= catalog) Area = {:.1f} sq. deg.\n'.format(self.check_footprint(catalog_data)))
+            f.write('Total (= catalog) Area = {:.1f} sq. deg.\n'.format(self.check_footprint(catalog_data, footprint)))
             f.write('NOTE: 1) assuming catalog is of equal depth over the full area\n')
             f.write('      2) assuming sample contains enough galaxies to measure area\n')
 
         if self.jackknife:                     #evaluate randoms for jackknife footprints
             jack_labels, randoms = self.get_jackknife_randoms(self.N_jack, catalog_data,
-                                                              self.generate_processed_randoms)
+                                                              self.generate_processed_randoms,
+                                                              footprint=footprint)
 
         correlation_data = dict()
+        covariances = dict()
         for sample_name, sample_conditions in self.test_samples.items():
             tmp_catalog_data = self.create_test_sample(
                 catalog_data, sample_conditions)
@@ -521,7 +572,10 @@ class CorrelationsAngularTwoPoint(CorrelationUtilities):
                 xi_sig = np.sqrt(np.diag(covariance))
 
             correlation_data[sample_name] = (xi_rad, xi, xi_sig)
+            if self.jackknife:
+                covariances[sample_name + '/xi'] = covariance
 
+        self.save_correlation_artifact(output_dir, correlation_data, catalog_name, covariances)
         self.plot_data_comparison(corr_data=correlation_data,
                                   catalog_name=catalog_name,
                                   output_dir=output_dir)
@@ -550,14 +604,12 @@ class CorrelationsProjectedTwoPoint(CorrelationUtilities):
         if not catalog_data:
             return TestResult(skipped=True, summary='Missing requested quantities')
 
+        footprint = self.get_footprint(catalog_data, catalog_instance, catalog_name)
+
         if self.truncate_cat_name:
             catalog_name = re.split('_', catalog_name)[0]
 
-        rand_ra, rand_dec = generate_uniform_random_ra_dec_footprint(
-            catalog_data['ra'].size*self.random_mult,
-            get_healpixel_footprint(catalog_data['ra'], catalog_data['dec'], self.random_nside),
-            self.random_nside,
-        )
+        rand_ra, rand_dec = footprint.generate_uniform_random_ra_dec(catalog_data['ra'].size*self.random_mult)
 
         correlation_data = dict()
         for sample_name, sample_conditions in self.test_samples.items():
@@ -584,6 +636,7 @@ class CorrelationsProjectedTwoPoint(CorrelationUtilities):
 
             correlation_data[sample_name] = (xi_rad, xi, xi_sig)
 
+        self.save_correlation_artifact(output_dir, correlation_data, catalog_name)
         self.plot_data_comparison(corr_data=correlation_data,
                                   catalog_name=catalog_name,
                                   output_dir=output_dir)
@@ -761,9 +814,7 @@ class DEEP2StellarMassTwoPoint(CorrelationsProjectedTwoPoint):
                             alpha=0.15, color='grey') #validation region
 
         self.decorate_plot(ax, catalog_name)
-        fig.tight_layout()
-        fig.savefig(os.path.join(output_dir, '{:s}.png'.format(self.test_name)), bbox_inches='tight')
-        plt.close(fig)
+        save_figure(fig, os.path.join(output_dir, '{:s}.png'.format(self.test_name)), tight_layout=True, bbox_inches='tight')
 
 
     def score_and_test(self, corr_data):
@@ -1,12 +1,12 @@
 import os
 import numpy as np
-from scipy.interpolate import interp1d
 from astropy import units as u
 from astropy.coordinates import SkyCoord, search_around_sky
 import astropy.constants as cst
 from astropy.cosmology import WMAP7 # pylint: disable=no-name-in-module
 from .base import BaseValidationTest, TestResult
 from .plotting import plt
+from .cosmology import get_distance_table
 
 __all__ = ['DeltaSigmaTest']
 
@@ -38,12 +38,10 @@ class DeltaSigmaTest(BaseValidationTest):
             cosmo = catalog_instance.cosmology
         except AttributeError:
             cosmo = WMAP7
-        # Create interpolation tables for efficient computation of sigma crit
-        z = np.linspace(0, self.zmax, self.zmax*100)
-        d1 = cosmo.angular_diameter_distance(z) # in Mpc
-        angular_diameter_distance = interp1d(z, d1, kind='quadratic')
-        d2 = cosmo.comoving_transverse_distance(z) # in Mpc
-        comoving_transverse_distance = interp1d(z, d2, kind='quadratic')
+        # Use interpolation tables for efficient computation of sigma crit (distances in Mpc)
+        distances = get_distance_table(cosmo)
+        angular_diameter_distance = distances.angular_diameter_distance
+        comoving_transverse_distance = distances.comoving_transverse_distance
 
         res = catalog_instance.get_quantities(['redshift_true', 'ra', 'dec', 'shear_1', 'shear_2',
                                                'convergence', 'mag_true_i_sdss', 'mag_true_z_sdss',
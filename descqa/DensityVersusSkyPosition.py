@@ -4,18 +4,11 @@ import numpy as np
 from scipy.stats import binned_statistic
 from .base import BaseValidationTest, TestResult
 from .plotting import plt
+from .utils import HealpixFootprint
 import healpy as hp
 
 __all__ = ['DensityVersusSkyPosition']
 
-def create_hp_map(ra, dec, nside):
-    """
-    Auxiliary function to generate HEALPix maps from catalogs.
-    It reads the ra and dec in degrees and returns a HEALPix map
-    """
-    pixnums = hp.ang2pix(nside, ra, dec, lonlat=True)
-    return np.bincount(pixnums, minlength=hp.nside2npix(nside)).astype(float)  # pylint: disable=no-member
-
 class DensityVersusSkyPosition(BaseValidationTest):
     """
     This test checks the object density as a function
@@ -44,8 +37,11 @@ class DensityVersusSkyPosition(BaseValidationTest):
         if not catalog_instance.has_quantities(['ra', 'dec', 'extendedness']):
             return TestResult(skipped=True, summary='catalog does not have needed quantities')
 
-        catalog_data = catalog_instance.get_quantities(['ra', 'dec', 'extendedness'], filters=['extendedness == 1'])
-        data_map = create_hp_map(catalog_data['ra'], catalog_data['dec'], self.nside)
+        # accumulate the HEALPix map chunk by chunk
+        healpix_map = HealpixFootprint(self.nside)
+        for catalog_data in catalog_instance.get_quantities(['ra', 'dec'], filters=['extendedness == 1'], return_iterator=True):
+            healpix_map.add(catalog_data['ra'], catalog_data['dec'])
+        data_map = healpix_map.get_map().astype(float)
         mask = data_map>0 # This is a good approximation if the pixels are big enough
         xmin, xmax = np.percentile(self.validation_data[mask], [5,95])
         data_map /= (3600*hp.nside2pixarea(self.nside, degrees=True)) # To get the density in arcmin^-2
@@ -13,6 +13,7 @@ from GCR import GCRQuery
 
 from .base import BaseValidationTest, TestResult
 from .plotting import plt
+from .utils import MomentHistogram
 
 __all__ = ['EllipticityDistribution']
 
@@ -258,11 +259,9 @@ class EllipticityDistribution(BaseValidationTest):
         fig.text(self.yaxis_xoffset, self.yaxis_yoffset, self.yaxis, va='center', rotation='vertical',
                  fontsize=self.yfont_size) #setup a common axis label
 
-        #initialize arrays for storing histogram sums
-        N_array = np.zeros((self.nrows, self.ncolumns, len(self.ebins)-1), dtype=np.int)
-        sume_array = np.zeros((self.nrows, self.ncolumns, len(self.ebins)-1))
-        sume2_array = np.zeros((self.nrows, self.ncolumns, len(self.ebins)-1))
-        
+        #initialize histogram of counts and moments for all morphologies
+        hist = MomentHistogram(self.ebins, n_masks=len(self.morphology))
+
         #initialize boolean values for checking ellipticity endpoints
         any_low = False
         any_high = False
@@ -273,55 +272,47 @@ class EllipticityDistribution(BaseValidationTest):
         #get catalog data by looping over data iterator (needed for large catalogs) and aggregate histograms
         for catalog_data in catalog_instance.get_quantities(all_quantities, filters=self.filters, return_iterator=True):
             catalog_data = GCRQuery(*((np.isfinite, col) for col in catalog_data)).filter(catalog_data)
-            for morphology, N, sume, sume2 in zip_longest(
-                    self.morphology,
-                    N_array.reshape(-1, N_array.shape[-1]), #flatten all but last dimension of array
-                    sume_array.reshape(-1, sume_array.shape[-1]),
-                    sume2_array.reshape(-1, sume2_array.shape[-1]),
-            ):
+            #compute ellipticity from definition
+            e_all = self.ellipticity_function(*[catalog_data[q] for q in required_quantities])
+            masks = []
+            for morphology in self.morphology:
                 #make cuts
-                if morphology is not None:
-                    mask = (catalog_data[mag_field] < self.mag_lo.get(morphology))
-                    mask &= (self.Mag_hi.get(morphology) < catalog_data[Mag_field]) & (catalog_data[Mag_field] < self.Mag_lo.get(morphology))
-                    if self.ancillary_quantities is not None:
-                        for aq, key  in zip_longest(self.ancillary_quantities, self.validation_data['cuts'].get('ancillary_keys')):
-                            mask &= (self.validation_data['cuts'][morphology].get(key+'_min') < catalog_data[aq]) &\
-                                    (catalog_data[aq] < self.validation_data['cuts'][morphology].get(key+'_max'))
-
-                    print('Number of {} galaxies passing selection cuts for morphology {} = {}'.format(catalog_name, morphology, np.sum(mask)))
-                    #compute ellipticity from definition
-                    e_this = self.ellipticity_function(*[catalog_data[q][mask] for q in required_quantities])
-                    #print('mm', np.min(e_this), np.max(e_this))
-                    del mask
-
-                    #accumulate histograms
-                    N += np.histogram(e_this, bins=self.ebins)[0]
-                    sume += np.histogram(e_this, bins=self.ebins, weights=e_this)[0]
-                    sume2 += np.histogram(e_this, bins=self.ebins, weights=e_this**2)[0]
-                    
-                    #check borders
-                    if len(e_this)>0:
-                        if np.min(e_this)<0:
-                            any_low = True
-                            print('Value<0 found for morphology {} in catalog {}: {}'.format(morphology, catalog_name, np.min(e_this)))
-                        if np.max(e_this)>1:
-                            any_high = True
-                            print('Value>1 found for morphology {} in catalog {}: {}'.format(morphology, catalog_name, np.max(e_this)))
+                mask = (catalog_data[mag_field] < self.mag_lo.get(morphology))
+                mask &= (self.Mag_hi.get(morphology) < catalog_data[Mag_field]) & (catalog_data[Mag_field] < self.Mag_lo.get(morphology))
+                if self.ancillary_quantities is not None:
+                    for aq, key  in zip_longest(self.ancillary_quantities, self.validation_data['cuts'].get('ancillary_keys')):
+                        mask &= (self.validation_data['cuts'][morphology].get(key+'_min') < catalog_data[aq]) &\
+                                (catalog_data[aq] < self.validation_data['cuts'][morphology].get(key+'_max'))
+
+                print('Number of {} galaxies passing selection cuts for morphology {} = {}'.format(catalog_name, morphology, np.sum(mask)))
+                masks.append(mask)
+
+                #check borders
+                e_this = e_all[mask]
+                if len(e_this)>0:
+                    if np.min(e_this)<0:
+                        any_low = True
+                        print('Value<0 found for morphology {} in catalog {}: {}'.format(morphology, catalog_name, np.min(e_this)))
+                    if np.max(e_this)>1:
+                        any_high = True
+                        print('Value>1 found for morphology {} in catalog {}: {}'.format(morphology, catalog_name, np.max(e_this)))
+
+            #bin ellipticities once and accumulate histograms
+            hist.add(e_all, masks)
 
         #check that catalog has entries for quantity to be plotted
-        if not np.asarray([N.sum() for N in N_array]).sum():
+        if not hist.get_counts().sum():
             raise ValueError('No data found for quantities {}'.format(', '.join(required_quantities)))
 
         #make plots
         results = {}
         n_fails = 0 + any_low + any_high
-        for n, (ax_this, summary_ax_this, morphology, N, sume, sume2) in enumerate(zip_longest(
+        for n, (ax_this, summary_ax_this, morphology, N, sume) in enumerate(zip_longest(
                 ax.flat,
                 self.summary_ax.flat,
                 self.morphology,
-                N_array.reshape(-1, N_array.shape[-1]), #flatten all but last dimension of array
-                sume_array.reshape(-1, sume_array.shape[-1]),
-                sume2_array.reshape(-1, sume2_array.shape[-1]),
+                hist.get_counts(),
+                hist.get_moment(1),
         )):
             if morphology is not None:
                 #get labels
@@ -375,7 +366,7 @@ class EllipticityDistribution(BaseValidationTest):
                 summary_ax_this.set_visible(False)
         
         #check overall ellipticity distribution
-        global_N = np.sum(np.sum(N_array, axis=1), axis=0)
+        global_N = hist.get_counts().sum(axis=0)
         number_passed, percentiles = self.validate_percentiles(global_N)
         print("Percentiles for global distribution are: "+', '.join([" {:.3f} ({})".format(p, v) for p,v in zip(percentiles, self.validation_percentiles['percentiles'])]))
         if number_passed>0:
@@ -4,7 +4,8 @@
 # W0231 gives a warning because __init__() is not called for BaseValidationTest
 # W0201 gives a warning when defining attributes outside of __init__()
 from __future__ import unicode_literals, absolute_import, division
-from os import path
+from os import path, makedirs
+import hashlib
 import numpy as np
 from astropy import units as u
 from astropy.cosmology import Planck15 as cosmo
@@ -13,6 +14,7 @@ from matplotlib.colors import LogNorm
 from GCR import GCRQuery
 from pandas import read_csv
 from descqa import BaseValidationTest, TestResult
+from descqa.stats import kstest_2d
 
 emline_names = {'ha': r'H$\alpha$', 'hb': r'H$\beta$', 'oii': '[OII]', 'oiii': '[OIII]'}
 
@@ -60,10 +62,20 @@ class EmlineRatioTest(BaseValidationTest):
     truncate_cat_name: Bool, optional, (default: False)
         Specifies whether the catalog name displayed in the summary figure should be 
         shortened.
+    z_match_tol: float, optional, (default: 0.01)
+        The maximum redshift difference allowed when matching catalog galaxies to the
+        redshifts of the SDSS galaxies.
+    random_seed: int, optional, (default: 0)
+        The seed used for the random draws. It is also part of the cache key for the
+        redshift-matched indices.
+    cache_dir: str or None, optional, (default: 'data/sdss_emission_lines/cache')
+        Directory in which the redshift-matched catalog indices are cached (as .npy files).
+        Set to None to disable caching.
     """
     def __init__(self, **kwargs):
 
-        np.random.seed(0)
+        self.random_seed = kwargs.get('random_seed', 0)
+        np.random.seed(self.random_seed)
 
         # load test config options
         self.kwargs = kwargs
@@ -100,6 +112,9 @@ class EmlineRatioTest(BaseValidationTest):
 
         self.truncate_cat_name = kwargs.get('truncate_cat_name', False)
 
+        self.z_match_tol = kwargs.get('z_match_tol', 0.01)
+        self.cache_dir = kwargs.get('cache_dir', path.join(self.data_dir, 'sdss_emission_lines', 'cache'))
+
 
     def run_on_single_catalog(self, catalog_instance, catalog_name, output_dir):
 
@@ -163,7 +178,9 @@ class EmlineRatioTest(BaseValidationTest):
 
         # indices = np.random.choice(np.arange(len(Halpha)), size=self.sim_drawnum, replace=False)
 
-        indices = self.sdsscat.drawinds(z, size = self.sim_drawnum, catname = catalog_name)
+        cache_key = (catalog_name, getattr(catalog_instance, 'version', ''), self.random_seed)
+        indices = self.sdsscat.drawinds(z, size=self.sim_drawnum, tol=self.z_match_tol,
+                                        cache_dir=self.cache_dir, cache_key=cache_key)
 
         self.z = z[indices]
         self.ha = Halpha[indices]
@@ -339,58 +356,6 @@ class EmlineRatioTest(BaseValidationTest):
 
 
 
-def fhCounts(x, edge):
-    # computes local CDF at a given point considering all possible axis orderings
-
-    templist = [np.sum((x[0, 0:] >= edge[0]) & (x[1, 0:] >= edge[1])),
-                np.sum((x[0, 0:] <= edge[0]) & (x[1, 0:] >= edge[1])),
-                np.sum((x[0, 0:] <= edge[0]) & (x[1, 0:] <= edge[1])),
-                np.sum((x[0, 0:] >= edge[0]) & (x[1, 0:] <= edge[1]))]
-    return templist
-
-def kstest_2d(dist1, dist2):
-    """
-    Perform the 2-D KS-test on dist1 and dist2.
-    """
-    num1 = dist1.shape[1]
-    num2 = dist2.shape[1]
-
-    KSstat = -np.inf
-
-    for iX in np.arange(0, num1+num2):
-
-        if iX < num1:
-            edge = dist1[0:, iX]
-        else:
-            edge = dist2[0:, iX-num1]
-
-        vfCDF1 = np.array(fhCounts(dist1, edge)) / num1
-        vfCDF2 = np.array(fhCounts(dist2, edge)) / num2
-
-        vfThisKSTS = np.abs(vfCDF1 - vfCDF2)
-        fKSTS = np.amax(vfThisKSTS)
-
-        if fKSTS > KSstat:
-            KSstat = fKSTS
-
-    # Peacock Z calculation and P estimation
-
-    n = num1 * num2 /(num1 + num2)
-    Zn = np.sqrt(n) * KSstat
-    Zinf = Zn / (1 - 0.53 * n**(-0.9))
-    pValue = 2 *np.exp(-2 * (Zinf - 0.5)**2)
-
-    # Clip invalid values for P
-    if pValue > 1.0:
-        pValue = 1.0
-
-#     H = (pValue <= alpha)
-
-    return pValue, KSstat
-
-
-
-
 class sdsscat:
     """
     This class holds the SDSS data in an easily accessible form, and also dust corrects
@@ -502,54 +467,42 @@ class sdsscat:
             return np.NaN
 
 
-    def drawinds(self, z, size, catname = None, cache = 'descqa/data/sdss_emission_lines/cache/'):
+    def drawinds(self, z, size, tol=0.05, cache_dir=None, cache_key=None):
+        """
+        Draw `size` indices of `z` such that the drawn redshifts match those of randomly
+        chosen SDSS galaxies to within `tol`. All matches are drawn in one vectorized step
+        by looking up the matching range of each SDSS redshift in the sorted `z`.
 
-        if catname:
-            if path.isfile(cache + catname + str(int(size))):
+        If `cache_dir` is set, the indices are saved to (and later read from) a .npy file
+        in `cache_dir` named after a hash of `cache_key`, `size`, `tol` and `z` itself.
+        """
+        cache_path = None
+        if cache_dir:
+            h = hashlib.sha1(repr((cache_key, int(size), float(tol))).encode())
+            h.update(np.ascontiguousarray(z, dtype=np.float64).tobytes())
+            cache_path = path.join(cache_dir, 'drawinds_{}.npy'.format(h.hexdigest()))
+            if path.isfile(cache_path):
                 print('WARNING: READING REDSHIFT MATCHES FROM FILE')
-                return np.loadtxt(cache + catname + str(int(size)), dtype = int)
-            else:
-
-                indices = np.arange(len(z))
-
-                sdss_z = np.copy(self.z)
-
-                np.random.shuffle(sdss_z)
-
-                sdss_z = sdss_z[:size]
-
-                return_inds = []
-
-                for thisz in sdss_z:
-
-                    close_inds = indices[np.where(np.abs(z-thisz) <= 0.01)]
-
-                    return_inds.append(np.random.choice(close_inds))
-
-                return_inds = np.array(return_inds, dtype = int)
-
-                np.savetxt(cache + catname + str(int(size)), return_inds, fmt = '%i')
-
-                return return_inds
-        else:
-
-            indices = np.arange(len(z))
-
-            sdss_z = np.copy(self.z)
-
-            np.random.shuffle(sdss_z)
-
-            sdss_z = sdss_z[:size]
-
-            return_inds = []
+                return np.load(cache_path)
 
-            for thisz in sdss_z:
+        sdss_z = np.copy(self.z)
+        np.random.shuffle(sdss_z)
+        sdss_z = sdss_z[:size]
 
-                close_inds = indices[np.where(np.abs(z-thisz) <= 0.05)]
+        z_order = np.argsort(z, kind='mergesort')
+        z_sorted = z[z_order]
+        lo = np.searchsorted(z_sorted, sdss_z - tol, 'left')
+        n_match = np.searchsorted(z_sorted, sdss_z + tol, 'right') - lo
 
-                return_inds.append(np.random.choice(close_inds))
+        if (n_match == 0).any():
+            raise ValueError('No catalog galaxies within {} of SDSS redshift {}'.format(tol, sdss_z[n_match == 0][0]))
 
-            return_inds = np.array(return_inds, dtype = int)
+        pick = lo + (np.random.random_sample(len(sdss_z)) * n_match).astype(np.int64)
+        return_inds = z_order[np.minimum(pick, lo + n_match - 1)]
 
-            return return_inds
+        if cache_path is not None:
+            if not path.isdir(cache_dir):
+                makedirs(cache_dir)
+            np.save(cache_path, return_inds)
 
+        return return_inds
@@ -8,10 +8,10 @@ except ImportError:
 
 import numpy as np
 from GCR import GCRQuery
-from sklearn.cluster import k_means
 
 from .base import BaseValidationTest, TestResult
 from .plotting import plt
+from .utils import MomentHistogram, StreamingHistogram, get_catalog_footprint, get_jackknife_regions
 
 __all__ = ['NumberDensityVersusRedshift']
 
@@ -54,6 +54,10 @@ class NumberDensityVersusRedshift(BaseValidationTest):
         label of RA column (used if `jackknife` is `True`)    
     dec : str, optional, (default: 'dec')
         label of Dec column (used if `jackknife` is `True`)
+    jackknife_nside : int, optional (default: 1024)
+        nside of the catalog footprint used to define the jackknife regions
+    jackknife_region_nside : int, optional (default: 64)
+        nside of the (coarser) pixels that are grouped into jackknife regions
     pass_limit : float, optional (default: 2.)
         chi^2 value needs to be less than this value to pass the test
     use_diagonal_only : bool, optional (default: False)
@@ -103,7 +107,7 @@ class NumberDensityVersusRedshift(BaseValidationTest):
     def __init__(self, z='redshift_true', band='i', N_zbins=10, zlo=0., zhi=1.1,
                  observation='', mag_lo=27, mag_hi=18, ncolumns=2, normed=True,
                  jackknife=False, N_jack=20, ra='ra', dec='dec', pass_limit=2., 
-                 use_diagonal_only=False, rest_frame=False, **kwargs):
+                 use_diagonal_only=False, rest_frame=False, jackknife_nside=1024, jackknife_region_nside=64, **kwargs):
         # pylint: disable=W0231
 
         #catalog quantities
@@ -135,6 +139,8 @@ class NumberDensityVersusRedshift(BaseValidationTest):
         #errors
         self.jackknife = jackknife
         self.N_jack = N_jack
+        self.jackknife_nside = jackknife_nside
+        self.jackknife_region_nside = min(jackknife_region_nside, jackknife_nside)
         self.ra = ra
         self.dec = dec
         self.use_diagonal_only = use_diagonal_only
@@ -161,12 +167,6 @@ class NumberDensityVersusRedshift(BaseValidationTest):
         #setup subplot configuration and get magnitude cuts for each plot
         self.mag_lo, self.mag_hi = self.init_plots(mag_lo, mag_hi)
 
-        #setup summary plot
-        self.summary_fig, self.summary_ax = plt.subplots(self.nrows, self.ncolumns, figsize=(self.figx_p, self.figy_p), sharex='col')
-        #could plot summary validation data here if available but would need to evaluate labels, bin values etc.
-        #otherwise setup a check so that validation data is plotted only once on summary plot
-        self.first_pass = True
-
         self._other_kwargs = kwargs
 
 
@@ -187,6 +187,22 @@ class NumberDensityVersusRedshift(BaseValidationTest):
         return mag_lo, mag_hi
 
 
+    def get_mag_intervals(self):
+        """
+        Returns the sorted magnitude cut values, mag_edges, and for each plot the
+        (start, stop) range of magnitude intervals that make up its cut, where
+        interval 0 is mag < mag_edges[0] and interval k is mag_edges[k-1] <= mag < mag_edges[k]
+        """
+        cuts = list(zip_longest(self.mag_lo, self.mag_hi))
+        mag_edges = np.unique([cut for cut_pair in cuts for cut in cut_pair if cut])
+        cut_ranges = []
+        for cut_lo, cut_hi in cuts:
+            stop = np.searchsorted(mag_edges, cut_lo) + 1 if cut_lo else 0
+            start = np.searchsorted(mag_edges, cut_hi) + 1 if cut_hi else 0
+            cut_ranges.append((start, max(start, stop)))
+        return mag_edges, cut_ranges
+
+
     def get_validation_data(self, band, observation):
         data_args = self.possible_observations[observation]
         data_path = os.path.join(self.data_dir, data_args['filename_template'].format(band))
@@ -229,56 +245,57 @@ class NumberDensityVersusRedshift(BaseValidationTest):
         catalog_color = next(self.colors)
         catalog_marker = next(self.markers)
 
-        #initialize arrays for storing histogram sums
-        N_array = np.zeros((self.nrows, self.ncolumns, len(self.zbins)-1), dtype=np.int)
-        sumz_array = np.zeros((self.nrows, self.ncolumns, len(self.zbins)-1))
+        #bin magnitudes into the intervals delimited by all cut values; each magnitude cut
+        #is a range of consecutive intervals, so a single (magnitude interval x z) histogram
+        #per chunk gives N(z) for all cuts
+        mag_edges, cut_ranges = self.get_mag_intervals()
+        hist = MomentHistogram(self.zbins, n_masks=len(mag_edges), n_moments=1)
+
+        if self.jackknife:
+            #jackknife regions of the catalog footprint (shared with other tests), and
+            #a (region x magnitude interval x z) histogram filled in the same pass
+            #(the footprint is computed from the same columns as the labels, so that every galaxy has a region)
+            footprint = get_catalog_footprint(catalog_instance, catalog_name, self.jackknife_nside, ra=self.ra, dec=self.dec)
+            jackknife_regions = get_jackknife_regions(footprint, self.N_jack, self.jackknife_region_nside)
+            n_unlabeled = 0
+            jackknife_hist = StreamingHistogram([np.arange(self.N_jack+1) - 0.5, np.arange(len(mag_edges)+1) - 0.5, self.zbins])
 
-        jackknife_data = {}
         #get catalog data by looping over data iterator (needed for large catalogs) and aggregate histograms
         for catalog_data in catalog_instance.get_quantities(required_quantities, filters=self.filters, return_iterator=True):
             catalog_data = GCRQuery(*((np.isfinite, col) for col in catalog_data)).filter(catalog_data)
-            for n, (cut_lo, cut_hi, N, sumz) in enumerate(zip_longest(
-                    self.mag_lo,
-                    self.mag_hi,
-                    N_array.reshape(-1, N_array.shape[-1]), #flatten all but last dimension of array
-                    sumz_array.reshape(-1, sumz_array.shape[-1]),
-            )):
-                if cut_lo:
-                    mask = (catalog_data[mag_field] < cut_lo)
-                    if cut_hi:
-                        mask &= (catalog_data[mag_field] >= cut_hi)
-                    z_this = catalog_data[self.zlabel][mask]
-
-                    #save data for jackknife errors
-                    if self.jackknife:   #store all the jackknife data in numpy arrays for later processing
-                        if str(n) not in jackknife_data.keys(): #initialize sub-dict
-                            jackknife_data[str(n)] = dict(zip(required_quantities, [np.asarray([]) for jq in jackknife_quantities]))
-                        for jkey in jackknife_data[str(n)].keys():
-                            jackknife_data[str(n)][jkey] = np.hstack((jackknife_data[str(n)][jkey], catalog_data[jkey][mask]))
-
-                    del mask
-
-                    #bin catalog_data and accumulate subplot histograms
-                    N += np.histogram(z_this, bins=self.zbins)[0]
-                    sumz += np.histogram(z_this, bins=self.zbins, weights=z_this)[0]
+            mag_interval = np.searchsorted(mag_edges, catalog_data[mag_field], side='right')
+            mag_interval[mag_interval >= len(mag_edges)] = -1
+            hist.add(catalog_data[self.zlabel], group=mag_interval)
+
+            #accumulate counts in jackknife regions
+            if self.jackknife:
+                jack_labels = jackknife_regions.get_labels(catalog_data[self.ra], catalog_data[self.dec])
+                n_unlabeled += np.count_nonzero(jack_labels < 0)
+                jackknife_hist.add([jack_labels, mag_interval, catalog_data[self.zlabel]])
 
+        if self.jackknife and n_unlabeled:
+            print('Warning: {} galaxies are outside the jackknife regions and are left out of the jackknife errors'.format(n_unlabeled))
+
+        N_intervals = hist.get_counts()
+        sumz_intervals = hist.get_moment(1)
 
         #loop over magnitude cuts and make plots
         results = {}
+        summary_data = {}
+        catalog_labels = []
+        validation = []
         scores = np.array([self.pass_limit]*self.nplots)
-        for n, (ax_this, summary_ax_this, cut_lo, cut_hi, N, sumz, z0, z0err) in enumerate(zip_longest(
+        for n, (ax_this, cut_lo, cut_hi, N, sumz, z0, z0err) in enumerate(zip_longest(
                 ax.flat,
-                self.summary_ax.flat,
                 self.mag_lo,
                 self.mag_hi,
-                N_array.reshape(-1, N_array.shape[-1]),
-                sumz_array.reshape(-1, sumz_array.shape[-1]),
+                [N_intervals[start:stop].sum(axis=0) for start, stop in cut_ranges],
+                [sumz_intervals[start:stop].sum(axis=0) for start, stop in cut_ranges],
                 self.validation_data.get('z0values', []),
                 self.validation_data.get('z0errors', []),
         )):
             if cut_lo is None:  #cut_lo is None if self.mag_lo is exhausted
                 ax_this.set_visible(False)
-                summary_ax_this.set_visible(False)
             else:
                 cut_label = '{} $< {}$'.format(self.band, cut_lo)
                 if cut_hi:
@@ -290,7 +307,9 @@ class NumberDensityVersusRedshift(BaseValidationTest):
                 N = N.astype(np.float64)
 
                 if self.jackknife:
-                    covariance = self.get_jackknife_errors(self.N_jack, jackknife_data[str(n)], N)
+                    start, stop = cut_ranges[n]
+                    region_counts = jackknife_hist.get_counts()[:, start:stop].sum(axis=1)
+                    covariance = self.get_jackknife_errors(self.N_jack, region_counts, N)
                 else:
                     covariance = np.diag(N)
 
@@ -321,11 +340,10 @@ class NumberDensityVersusRedshift(BaseValidationTest):
 
                 self.decorate_subplot(ax_this, n)
 
-                #add curve for this catalog to summary plot
-                self.catalog_subplot(summary_ax_this, meanz, N, Nerrors, catalog_color, catalog_marker, catalog_label)
-                if self.first_pass and z0 and z0 > 0:
-                    self.validation_subplot(summary_ax_this, meanz, z0, z0err, validation_label) #add validation data if evaluating first catalog
-                self.decorate_subplot(summary_ax_this, n)
+                #keep curve for this catalog for the summary plot (made in conclude_test)
+                summary_data.update({'cut{}/meanz'.format(n): meanz, 'cut{}/N'.format(n): N, 'cut{}/N_err'.format(n): Nerrors})
+                catalog_labels.append(catalog_label)
+                validation.append((z0, z0err, validation_label) if z0 and z0 > 0 else None)
 
         #save results for catalog and validation data in txt files
         for filename, dtype, comment, info, info2 in zip_longest((filelabel, self.observation), ('N', 'fit'), (filtername,), ('total',), ('score',)):
@@ -342,8 +360,13 @@ class NumberDensityVersusRedshift(BaseValidationTest):
                             self.save_matrix(results[key]['inverse_cov_matrix'], f_handle, comment= key)
             
 
-        if self.first_pass: #turn off validation data plot in summary for remaining catalogs
-            self.first_pass = False
+        self.save_result_artifact(output_dir, summary_data, metadata={
+            'catalog': catalog_name,
+            'color': catalog_color,
+            'marker': catalog_marker,
+            'catalog_labels': catalog_labels,
+            'validation': validation,
+        })
 
         #make final adjustments to plots and save figure
         self.post_process_plot(fig)
@@ -357,20 +380,10 @@ class NumberDensityVersusRedshift(BaseValidationTest):
         return TestResult(score_ave, passed=score_ave < self.pass_limit)
 
 
-    def get_jackknife_errors(self, N_jack, jackknife_data, N):
-        nn = np.stack((jackknife_data[self.ra], jackknife_data[self.dec]), axis=1)
-        _, jack_labels, _ = k_means(n_clusters=N_jack, random_state=0, X=nn, n_jobs=-1)
-
-        #make histograms for jackknife regions
-        Njack_array = np.zeros((N_jack, len(self.zbins)-1), dtype=np.int)
-        for nj in range(N_jack):
-            Njack_array[nj] = np.histogram(jackknife_data[self.zlabel][jack_labels != nj], self.zbins)[0]
-
-        covariance = np.zeros((self.N_zbins, self.N_zbins))
-        for i in range(self.N_zbins):
-            for j in range(self.N_zbins):
-                for njack in Njack_array:
-                    covariance[i][j] += (N_jack - 1.)/N_jack * (N[i] - njack[i]) * (N[j] - njack[j])
+    @staticmethod
+    def get_jackknife_errors(N_jack, region_counts, N):
+        #the jackknife samples (all regions but one) differ from the full sample by the counts of the left-out region
+        covariance = (N_jack - 1.)/N_jack * np.dot(region_counts.T, region_counts)
 
         return covariance
 
@@ -475,6 +488,27 @@ class NumberDensityVersusRedshift(BaseValidationTest):
 
 
     def conclude_test(self, output_dir):
-        self.post_process_plot(self.summary_fig)
-        self.summary_fig.savefig(os.path.join(output_dir, 'summary.png'))
-        plt.close(self.summary_fig)
+        #build the summary plot from the results saved for each catalog, so that
+        #no figure or catalog data needs to be kept in memory between catalogs
+        summary_fig, summary_ax = plt.subplots(self.nrows, self.ncolumns, figsize=(self.figx_p, self.figy_p), sharex='col')
+        first_pass = True
+        for _, artifact in self.iter_result_artifacts(output_dir):
+            metadata = artifact.metadata
+            for n, (catalog_label, validation) in enumerate(zip(metadata['catalog_labels'], metadata['validation'])):
+                key = 'cut{}/'.format(n)
+                self.catalog_subplot(summary_ax.flat[n], artifact[key + 'meanz'], artifact[key + 'N'], artifact[key + 'N_err'],
+                                     metadata['color'], metadata['marker'], catalog_label)
+                if first_pass and validation: #add validation data with the bins of the first catalog only
+                    z0, z0err, validation_label = validation
+                    self.validation_subplot(summary_ax.flat[n], artifact[key + 'meanz'], z0, z0err, validation_label)
+            first_pass = False
+
+        for n, summary_ax_this in enumerate(summary_ax.flat):
+            if n < len(self.mag_lo):
+                self.decorate_subplot(summary_ax_this, n)
+            else:
+                summary_ax_this.set_visible(False)
+
+        self.post_process_plot(summary_fig)
+        summary_fig.savefig(os.path.join(output_dir, 'summary.png'))
+        plt.close(summary_fig)
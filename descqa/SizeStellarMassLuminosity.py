@@ -2,9 +2,7 @@ from __future__ import print_function, division, unicode_literals, absolute_impo
 import os
 import numpy as np
 import re
-from GCR import GCRQuery
 from scipy import interpolate
-from scipy.stats import binned_statistic
 try:
     from itertools import zip_longest
 except ImportError:
@@ -12,23 +10,19 @@ except ImportError:
 
 from .base import BaseValidationTest, TestResult
 from .plotting import plt
+from .cosmology import get_distance_table
+from .utils import MomentHistogram, StreamingHistogram
 
 
 __all__ = ['SizeStellarMassLuminosity']
 
 
-def redshift2dist(cosmology):
-    z = np.arange(0, 5.1, 0.5)
-    comov_d = cosmology.comoving_distance(z).to('kpc').value
-    spl = interpolate.splrep(z, comov_d)
-    return spl
-
-
 class SizeStellarMassLuminosity(BaseValidationTest):
     """
     Validation test of 2pt correlation function
     """
     _ARCSEC_TO_RADIAN = np.pi / 180. / 3600.
+    _L_BIN_EDGES = np.array([9, 9.5, 10, 10.5, 11, 11.5])
 
     def __init__(self, **kwargs):
         #pylint: disable=W0231
@@ -92,7 +86,7 @@ class SizeStellarMassLuminosity(BaseValidationTest):
         Loop over magnitude cuts and make plots
         '''
         # load catalog data
-        spl = redshift2dist(catalog_instance.cosmology)
+        distances = get_distance_table(catalog_instance.cosmology)
 
         colnames = dict()
         colnames['z'] = catalog_instance.first_available('redshift', 'redshift_true')
@@ -119,41 +113,47 @@ class SizeStellarMassLuminosity(BaseValidationTest):
             '{} < {}'.format(colnames['z'], max(z_bin['z_max'] for z_bin in self.z_bins)),
             '{} >= {}'.format(colnames['z'], min(z_bin['z_min'] for z_bin in self.z_bins)),
         ))
-        catalog_data = catalog_instance.get_quantities(list(colnames.values()), filters=filters)
-        catalog_data = {k: catalog_data[v] for k, v in colnames.items()}
+
+        #bin all galaxies in a single pass over the catalog chunks, on (redshift interval x luminosity bin);
+        #the redshift intervals are delimited by the edges of all redshift bins, so that each redshift bin is
+        #a range of consecutive intervals and the bin index of each galaxy is shared by all panels and sizes
+        z_edges = np.unique([z_bin[k] for z_bin in self.z_bins for k in ('z_min', 'z_max')])
+        z_ranges = [slice(*np.searchsorted(z_edges, (z_bin['z_min'], z_bin['z_max']))) for z_bin in self.z_bins]
+        size_names = [k for k in ('size', 'size_bulge', 'size_disk') if k in colnames]
+        binned_sizes = MomentHistogram([z_edges, self._L_BIN_EDGES], names=size_names)
+        #galaxies per redshift interval, regardless of luminosity (a panel is only hidden if it has none)
+        z_counts = StreamingHistogram([z_edges])
+        for catalog_data in catalog_instance.get_quantities(list(colnames.values()), filters=filters, return_iterator=True):
+            catalog_data = {k: catalog_data[v] for k, v in colnames.items()}
+            logL = self.ConvertAbsMagLuminosity(catalog_data['mag'], band)
+            #convert angular sizes to kpc, once per galaxy, with the distance lookup table
+            arcsec_to_kpc = self._ARCSEC_TO_RADIAN * distances.comoving_distance(catalog_data['z']) * 1.e3 / (1 + catalog_data['z'])
+            binned_sizes.add([catalog_data['z'], logL], data={k: catalog_data[k] * arcsec_to_kpc for k in size_names})
+            z_counts.add([catalog_data['z']])
 
         fig, axes = plt.subplots(self.nrows, self.ncolumns, figsize=(self.fig_x, self.fig_y), sharex=True, sharey=True)
         list_of_validation_values = []
         try:
-            for z_bin, ax in zip_longest(self.z_bins, axes.flat):
-                # filter catalog data for this bin
+            for z_bin, z_range, ax in zip_longest(self.z_bins, z_ranges, axes.flat):
                 if z_bin is None:
                     ax.set_visible(False)
                     continue
-                filters = [
-                    'z < {}'.format(z_bin['z_max']),
-                    'z >= {}'.format(z_bin['z_min']),
-                ]
                 z_mean = (z_bin['z_max'] + z_bin['z_min']) / 2.
                 z_width = (z_bin['z_max'] - z_bin['z_min']) / 2.
                 legend_title = self.label_template.format(z_bin['z_min'], z_bin['z_max'])
 
-                catalog_data_this = GCRQuery(*filters).filter(catalog_data)
                 maskz = (self.validation_data[:,0] < z_mean + z_width) & (self.validation_data[:,0] > z_mean - z_width)
                 maskL = (self.validation_data[:,1] > 0.)
                 validation_this = self.validation_data[(maskz) & (maskL)]
-                if len(catalog_data_this['z']) == 0 or len(validation_this) == 0:
+                if not z_counts.counts[0, z_range].any() or len(validation_this) == 0:
                     ax.set_visible(False)
                     continue
                 output_filepath = os.path.join(output_dir, self.output_filename_template.format(catalog_name, z_bin['z_min'], z_bin['z_max']))
                 colors = ['r', 'b']
-                default_L_bin_edges = np.array([9, 9.5, 10, 10.5, 11, 11.5])
-                default_L_bins = (default_L_bin_edges[1:] + default_L_bin_edges[:-1]) / 2.
+                default_L_bins = (self._L_BIN_EDGES[1:] + self._L_BIN_EDGES[:-1]) / 2.
                 if self.observation == 'onecomp':
-                    logL_G = self.ConvertAbsMagLuminosity(catalog_data_this['mag'], band)
-                    size_kpc = catalog_data_this['size'] * self._ARCSEC_TO_RADIAN * interpolate.splev(catalog_data_this['z'], spl) / (1 + catalog_data_this['z'])
-                    binned_size_kpc = binned_statistic(logL_G, size_kpc, bins=default_L_bin_edges, statistic='mean')[0]
-                    binned_size_kpc_err = binned_statistic(logL_G, size_kpc, bins=default_L_bin_edges, statistic='std')[0]
+                    binned_size_kpc = binned_sizes.get_mean('size', (z_range,))[0]
+                    binned_size_kpc_err = binned_sizes.get_std('size', (z_range,))[0]
                     heading = 'Luminosity Size (kpc), Size Error (kpc)'
                     np.savetxt(output_filepath, np.transpose((default_L_bins, binned_size_kpc, binned_size_kpc_err)), fmt='%11.4e', header=heading)
 
@@ -165,13 +165,10 @@ class SizeStellarMassLuminosity(BaseValidationTest):
                                                     validation_this[:,1], 10**validation_this[:,2])
                     list_of_validation_values.append(validation)                                
                 elif self.observation == 'twocomp':
-                    logL_I = self.ConvertAbsMagLuminosity(catalog_data_this['mag'], band)
-                    arcsec_to_kpc = self._ARCSEC_TO_RADIAN * interpolate.splev(catalog_data_this['z'], spl) / (1 + catalog_data_this['z'])
-
-                    binned_bulgesize_kpc = binned_statistic(logL_I, catalog_data_this['size_bulge'] * arcsec_to_kpc, bins=default_L_bin_edges, statistic='mean')[0]
-                    binned_bulgesize_kpc_err = binned_statistic(logL_I, catalog_data_this['size_bulge'] * arcsec_to_kpc, bins=default_L_bin_edges, statistic='std')[0]
-                    binned_disksize_kpc = binned_statistic(logL_I, catalog_data_this['size_disk'] * arcsec_to_kpc, bins=default_L_bin_edges, statistic='mean')[0]
-                    binned_disksize_kpc_err = binned_statistic(logL_I, catalog_data_this['size_disk'] * arcsec_to_kpc, bins=default_L_bin_edges, statistic='std')[0]
+                    binned_bulgesize_kpc = binned_sizes.get_mean('size_bulge', (z_range,))[0]
+                    binned_bulgesize_kpc_err = binned_sizes.get_std('size_bulge', (z_range,))[0]
+                    binned_disksize_kpc = binned_sizes.get_mean('size_disk', (z_range,))[0]
+                    binned_disksize_kpc_err = binned_sizes.get_std('size_disk', (z_range,))[0]
                     binned_bulgesize_kpc = np.nan_to_num(binned_bulgesize_kpc)
                     binned_bulgesize_kpc_err = np.nan_to_num(binned_bulgesize_kpc_err)
                     binned_disksize_kpc = np.nan_to_num(binned_disksize_kpc)
@@ -198,7 +195,6 @@ class SizeStellarMassLuminosity(BaseValidationTest):
                     validation_disk = self.compute_chisq(default_L_bins, binned_disksize_kpc, binned_disksize_kpc_err,
                                                     validation_this[:,1]+0.2, validation_this[:,3])
                     list_of_validation_values.append([validation_bulge, validation_disk])                                
-                del catalog_data_this
                 if self.fig_xlim is not None:
                     ax.set_xlim(self.fig_xlim)
                 if self.fig_xlim is not None:
@@ -9,7 +9,7 @@ import numpy as np
 from GCR import GCRQuery
 from .base import BaseValidationTest, TestResult
 from .plotting import plt
-from .utils import get_sky_volume, get_opt_binpoints
+from .utils import get_sky_volume, MomentHistogram
 
 __all__ = ['StellarMassFunction']
 
@@ -84,13 +84,6 @@ class StellarMassFunction(BaseValidationTest):
         zmax = np.max(self.z_hi)
         self.filters = [(lambda z: (z > zmin) & (z < zmax), self.zlabel)]
 
-        #setup summary plot
-        self.summary_fig, self.summary_ax = plt.subplots(self.nrows, self.ncolumns, sharex='col')
-        self.summary_fig.text(self.yaxis_xoffset, self.yaxis_yoffset, self.yaxis, va='center', rotation='vertical') #setup a common axis label
-        #could plot summary validation data here if available but would need to evaluate labels, bin values etc.
-        #otherwise setup a check so that validation data is plotted only once on summary plot
-        self.first_pass = True
-
         self._other_kwargs = kwargs
 
 
@@ -149,55 +142,36 @@ class StellarMassFunction(BaseValidationTest):
         fig, ax = plt.subplots(self.nrows, self.ncolumns, sharex='col')
         fig.text(self.yaxis_xoffset, self.yaxis_yoffset, self.yaxis, va='center', rotation='vertical') #setup a common axis label
 
-        #initialize arrays for storing histogram sums
-        N_array = np.zeros((self.nrows, self.ncolumns, len(self.Mbins)-1), dtype=np.int)
-        sumM_array = np.zeros((self.nrows, self.ncolumns, len(self.Mbins)-1))
-        sumM2_array = np.zeros((self.nrows, self.ncolumns, len(self.Mbins)-1))
+        #initialize histogram of counts and moments for all redshift cuts
+        hist = MomentHistogram(self.Mbins, n_masks=len(self.z_lo))
 
         #get catalog data by looping over data iterator (needed for large catalogs) and aggregate histograms
         for catalog_data in catalog_instance.get_quantities([self.zlabel, self.Mlabel], filters=self.filters, return_iterator=True):
             catalog_data = GCRQuery(*((np.isfinite, col) for col in catalog_data)).filter(catalog_data)
-            for cut_lo, cut_hi, N, sumM, sumM2 in zip_longest(
-                self.z_lo,
-                self.z_hi,
-                N_array.reshape(-1, N_array.shape[-1]), #flatten all but last dimension of array
-                sumM_array.reshape(-1, sumM_array.shape[-1]),
-                sumM2_array.reshape(-1, sumM2_array.shape[-1]),
-            ):
-                if cut_lo is not None:  #cut_lo can be 0. so cannot use if cut_lo
-                    mask = (cut_lo < catalog_data[self.zlabel]) & (catalog_data[self.zlabel] < cut_hi)
-                    M_this = catalog_data[self.Mlabel][mask]
-                    del mask
-
-                    #bin catalog_data and accumulate subplot histograms
-                    N += np.histogram(M_this, bins=self.Mbins)[0]
-                    sumM += np.histogram(M_this, bins=self.Mbins, weights=M_this)[0]
-                    sumM2 += np.histogram(M_this, bins=self.Mbins, weights=M_this**2)[0]
+            z_this = catalog_data[self.zlabel]
+            #bin catalog_data once and accumulate subplot histograms
+            hist.add(catalog_data[self.Mlabel], [(cut_lo < z_this) & (z_this < cut_hi) for cut_lo, cut_hi in zip(self.z_lo, self.z_hi)])
 
         #check that catalog has entries for quantity to be plotted
-        if not np.asarray([N.sum() for N in N_array]).sum():
+        if not hist.get_counts().sum():
             raise ValueError('No data found for quantity {}'.format(self.Mlabel))
 
         #loop over magnitude cuts and make plots
         results = {}
-        for n, (ax_this, summary_ax_this, cut_lo, cut_hi, N, sumM, sumM2, zkey) in enumerate(zip_longest(
+        for n, (ax_this, cut_lo, cut_hi, N, Mvalues, zkey) in enumerate(zip_longest(
             ax.flat,
-            self.summary_ax.flat,
             self.z_lo,
             self.z_hi,
-            N_array.reshape(-1, N_array.shape[-1]),
-            sumM_array.reshape(-1, sumM_array.shape[-1]),
-            sumM2_array.reshape(-1, sumM2_array.shape[-1]),
+            hist.get_counts(),
+            hist.get_opt_binpoints(),
             [k for k in self.validation_data.keys() if self.zkey_match in k],
         )):
             if cut_lo is None:  #cut_lo is None if self.z_lo is exhausted
                 ax_this.set_visible(False)
-                summary_ax_this.set_visible(False)
             else:
                 if not zkey:
                     zkey = '{:.1f} < z < {:.1f}'.format(cut_lo, cut_hi)
                 cut_label = '${}$'.format(zkey)
-                Mvalues = get_opt_binpoints(N, sumM, sumM2, self.Mbins)
                 sumN = N.sum()
                 total = '(# of galaxies = {})'.format(sumN)
                 Nerrors = np.sqrt(N)
@@ -214,12 +188,6 @@ class StellarMassFunction(BaseValidationTest):
                     results[zkey].update(data)
                 self.decorate_subplot(ax_this, n, label=cut_label)
 
-                #add curve for this catalog to summary plot
-                self.catalog_subplot(summary_ax_this, Mvalues, phi, phi_errors, catalog_color, catalog_name)
-                if self.first_pass and zkey in self.validation_data.keys():  #add validation data if evaluating first catalog
-                    self.validation_subplot(summary_ax_this, self.validation_data[zkey], validation_label)
-                self.decorate_subplot(summary_ax_this, n, label=cut_label)
-
 
         #save results for catalog and validation data in txt files
         for filename, dtype, info in zip_longest((catalog_name, self.observation), ('phi', 'data'), ('total',)):
@@ -229,8 +197,17 @@ class StellarMassFunction(BaseValidationTest):
                     for key, value in results.items():
                         self.save_quantities(dtype, value, f_handle, comment=' '.join((key, value.get(info, ''))))
 
-        if self.first_pass: #turn off validation data plot in summary for remaining catalogs
-            self.first_pass = False
+        #save results for catalog in a result artifact (also used to make the summary plot in conclude_test)
+        artifact_data = {}
+        for n, (key, value) in enumerate(results.items()):
+            for field, artifact_field in (('Mphi', 'M'), ('phi', 'phi'), ('phi+-', 'phi_err')):
+                artifact_data['z{}/{}'.format(n, artifact_field)] = value[field]
+        self.save_result_artifact(output_dir, artifact_data, metadata={
+            'catalog': catalog_name,
+            'z_bins': list(results),
+            'M_label': self.Mlabel,
+            'color': catalog_color,
+        })
 
         #make final adjustments to plots and save figure
         self.post_process_plot(fig)
@@ -304,6 +281,27 @@ class StellarMassFunction(BaseValidationTest):
 
 
     def conclude_test(self, output_dir):
-        self.post_process_plot(self.summary_fig)
-        self.summary_fig.savefig(os.path.join(output_dir, 'summary.png'))
-        plt.close(self.summary_fig)
+        #make summary plot from the results saved for each catalog
+        summary_fig, summary_ax = plt.subplots(self.nrows, self.ncolumns, sharex='col')
+        summary_fig.text(self.yaxis_xoffset, self.yaxis_yoffset, self.yaxis, va='center', rotation='vertical') #setup a common axis label
+
+        zkeys = []
+        for catalog_name, artifact in self.iter_result_artifacts(output_dir):
+            zkeys = zkeys or artifact.metadata['z_bins']
+            for n, summary_ax_this in enumerate(summary_ax.flat[:len(artifact.metadata['z_bins'])]):
+                self.catalog_subplot(summary_ax_this, artifact['z{}/M'.format(n)], artifact['z{}/phi'.format(n)],
+                                     artifact['z{}/phi_err'.format(n)], artifact.metadata.get('color'),
+                                     artifact.metadata.get('catalog', catalog_name))
+
+        validation_label = self.validation_data.get('label', '')
+        for n, (summary_ax_this, zkey) in enumerate(zip_longest(summary_ax.flat, zkeys)):
+            if n >= len(self.z_lo):
+                summary_ax_this.set_visible(False)
+                continue
+            if zkey in self.validation_data.keys():
+                self.validation_subplot(summary_ax_this, self.validation_data[zkey], validation_label)
+            self.decorate_subplot(summary_ax_this, n, label='${}$'.format(zkey) if zkey else None)
+
+        self.post_process_plot(summary_fig)
+        summary_fig.savefig(os.path.join(output_dir, 'summary.png'))
+        plt.close(summary_fig)
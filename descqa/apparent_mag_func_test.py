@@ -51,6 +51,7 @@ class ApparentMagFuncTest(BaseValidationTest):
         self.x_lower_limit = kwargs.get('x_lower_limit', 15)
         self.print_title = kwargs.get('print_title', False)
         self.min_mag = kwargs.get('min_mag', 19.)
+        self.footprint_cache_dir = kwargs.get('footprint_cache_dir', None)
 
         # catalog quantities needed
         possible_mag_fields = ('mag_{}_cModel',
@@ -161,7 +162,8 @@ class ApparentMagFuncTest(BaseValidationTest):
         if sky_area is None:
             if not catalog_instance.has_quantities(['ra', 'dec']):
                 return TestResult(skipped=True, summary="'ra' and/or 'dec' not available to compute sky area")
-            sky_area = get_sky_area(catalog_instance) # compute area from ra and dec
+            # compute area from ra and dec (shared between tests of the same catalog)
+            sky_area = get_sky_area(catalog_instance, catalog_name=catalog_name, cache_dir=self.footprint_cache_dir)
 
         sky_area_label = ' (Sky Area = {:.1f} $\\rm deg^2$)'.format(sky_area)
 
@@ -172,26 +174,20 @@ class ApparentMagFuncTest(BaseValidationTest):
         # filter on extended sources if quantity is available in catalog (eg. in object catalog)
         filters = ['extendedness == 1'] if catalog_instance.has_quantity('extendedness') else None
 
-        # retreive data from mock catalog
-        d = catalog_instance.get_quantities([mag_field_key], filters=filters)
-        m = d[mag_field_key]
-        m = np.sort(m)  # put into order--bright to faint
-
-        # get the total number of galaxies in catalog
-        N_tot = len(m)
-        N = np.cumsum(np.ones(N_tot))/sky_area
-
         # define the apparent magnitude bins for plotting purposes
         dmag = 0.1 # bin widths
         max_mag = self.band_lim[1] + 1.0  # go one mag beyond the limit
         min_mag = self.min_mag  # start at bright galaxies
         mag_bins = np.arange(min_mag, max_mag, dmag)
 
+        # count galaxies between consecutive mag_bins, chunk by chunk
+        # counts[i] is the number of galaxies with mag_bins[i-1] <= mag < mag_bins[i]
+        counts = np.zeros(mag_bins.size + 1, dtype=np.int64)
+        for d in catalog_instance.get_quantities([mag_field_key], filters=filters, return_iterator=True):
+            counts += np.bincount(np.searchsorted(mag_bins, d[mag_field_key], side='right'), minlength=counts.size)
+
         # calculate N(<mag) at the specified points
-        inds = np.searchsorted(m, mag_bins)
-        mask = (inds >= len(m))
-        inds[mask] = -1 # take care of edge case
-        sampled_N = N[inds]
+        sampled_N = np.cumsum(counts)[:-1] / sky_area
 
         #################################################
         # plot the cumulative apparent magnitude function
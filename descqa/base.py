@@ -1,7 +1,12 @@
 from __future__ import division, unicode_literals, absolute_import
 import os
+import json
+import numpy as np
 
-__all__ = ['BaseValidationTest', 'TestResult']
+__all__ = ['BaseValidationTest', 'TestResult', 'ResultArtifact', 'save_result_artifact']
+
+RESULT_ARTIFACT_SCHEMA = 'descqa-result-artifact'
+RESULT_ARTIFACT_VERSION = 1
 
 class TestResult(object):
     """
@@ -68,6 +73,87 @@ class TestResult(object):
         return '\n'.join(output)
 
 
+def save_result_artifact(filename, data, covariances=None, metadata=None):
+    """
+    Save data vectors, covariances and metadata as a compressed npz file with a schema header.
+
+    Parameters
+    ----------
+    filename : str
+        path of the output file (should end with .npz)
+    data : dict
+        name -> array-like data vector (e.g., {'r': r, 'xi': xi, 'xi_err': xi_err})
+    covariances : dict, optional
+        name -> 2d covariance matrix (e.g., {'xi': cov})
+    metadata : dict, optional
+        information such as units or sample definitions (saved as JSON; other objects are saved as strings)
+    """
+    arrays = {}
+    header = {
+        'schema': RESULT_ARTIFACT_SCHEMA,
+        'version': RESULT_ARTIFACT_VERSION,
+        'data': [],
+        'covariances': [],
+        'metadata': metadata or {},
+    }
+    for kind, prefix, items in (('data', 'data/', data), ('covariances', 'cov/', covariances or {})):
+        for name, value in items.items():
+            value = np.asarray(value)
+            if kind == 'covariances' and (value.ndim != 2 or value.shape[0] != value.shape[1]):
+                raise ValueError('covariance `{}` must be a square matrix'.format(name))
+            arrays[prefix + name] = value
+            header[kind].append({'name': name, 'shape': list(value.shape), 'dtype': value.dtype.str})
+    arrays['__header__'] = np.array(json.dumps(header, default=str))
+    np.savez_compressed(filename, **arrays)
+
+
+class ResultArtifact(object):
+    """
+    Read a file written by `save_result_artifact`. Arrays are only read from disk when accessed.
+
+    Attributes
+    ----------
+    metadata : dict
+    data_names : list of str
+    covariance_names : list of str
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._npz = np.load(filename, allow_pickle=False)
+        try:
+            header = json.loads(str(self._npz['__header__']))
+        except KeyError:
+            self.close()
+            raise ValueError('{} is not a result artifact'.format(filename))
+        if header.get('schema') != RESULT_ARTIFACT_SCHEMA or header.get('version', 0) > RESULT_ARTIFACT_VERSION:
+            self.close()
+            raise ValueError('{} has an unsupported schema'.format(filename))
+        self.metadata = header.get('metadata', {})
+        self.data_names = [d['name'] for d in header['data']]
+        self.covariance_names = [d['name'] for d in header['covariances']]
+
+    def get_data(self, name):
+        return self._npz['data/' + name]
+
+    def get_covariance(self, name):
+        return self._npz['cov/' + name]
+
+    def __getitem__(self, name):
+        return self.get_data(name)
+
+    def __contains__(self, name):
+        return name in self.data_names
+
+    def close(self):
+        self._npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+
 class BaseValidationTest(object):
     """
     very abstract class for validation test class
@@ -75,11 +161,45 @@ class BaseValidationTest(object):
 
     data_dir = os.path.join(os.path.dirname(__file__), 'data')
     external_data_dir = "/global/cfs/cdirs/lsst/groups/CS/descqa/data"
+    result_artifact_basename = 'result'
 
     def __init__(self, **kwargs):
         pass
 
 
+    def save_result_artifact(self, output_dir, data, covariances=None, metadata=None, name=None):
+        """
+        Save measured data vectors (and covariances, metadata) of this test in `output_dir`
+        as `<name>.npz` (default name: `result_artifact_basename`), see `save_result_artifact`.
+        The name of the test class is added to the metadata.
+        """
+        metadata = dict(metadata or {})
+        metadata.setdefault('test_class', type(self).__name__)
+        filename = os.path.join(output_dir, (name or self.result_artifact_basename) + '.npz')
+        save_result_artifact(filename, data, covariances, metadata)
+        return filename
+
+
+    def load_result_artifact(self, output_dir, name=None):
+        """
+        Load a result artifact saved by `save_result_artifact` (returns a `ResultArtifact`)
+        """
+        return ResultArtifact(os.path.join(output_dir, (name or self.result_artifact_basename) + '.npz'))
+
+
+    def iter_result_artifacts(self, output_dir, name=None):
+        """
+        In `conclude_test`, iterate over the result artifacts saved for each catalog.
+        Yields (catalog_name, ResultArtifact); the artifacts are closed after each iteration.
+        """
+        filename = (name or self.result_artifact_basename) + '.npz'
+        for catalog_name in sorted(os.listdir(output_dir)):
+            path = os.path.join(output_dir, catalog_name, filename)
+            if os.path.isfile(path):
+                with ResultArtifact(path) as artifact:
+                    yield catalog_name, artifact
+
+
     def run_on_single_catalog(self, catalog_instance, catalog_name, output_dir):
         """
         Run the validation test on a single catalog.
@@ -4,6 +4,8 @@ import numpy as np
 from GCR import GCRQuery
 from .base import BaseValidationTest, TestResult
 from .plotting import plt
+from .stats import quantile_from_histogram, histogram_fraction_above
+from .utils import StreamingHistogram
 
 __all__ = ['ConditionalLuminosityFunction']
 
@@ -19,6 +21,8 @@ class ConditionalLuminosityFunction(BaseValidationTest):
         self.z_bins = np.linspace(*kwargs.get('z_bins', (0.2, 1.0, 4)))
         self.color_cut_fraction = float(kwargs.get('color_cut_fraction', 0.2))
         self.color_cut_redshift = float(kwargs.get('color_cut_redshift', 0.2))
+        # fine colour bins; the colour cut is applied to the histograms after the single catalog pass
+        self.color_bins = np.linspace(*kwargs.get('color_bins', (-1.0, 3.0, 4001)))
 
         possible_Mag_fields = ('Mag_true_{}_lsst_z0',
                                'Mag_true_{}_lsst_z01',
@@ -68,23 +72,13 @@ class ConditionalLuminosityFunction(BaseValidationTest):
 
         absolute_magnitude1_field, absolute_magnitude2_field, quantities_needed = prepared
 
-        # find out color cut threshold
-        color = []
-        for data in catalog_instance.get_quantities(
-            [absolute_magnitude1_field, absolute_magnitude2_field, 'redshift_true'], 
-            filters=['redshift_true < 0.2'],
-            return_iterator=True,
-        ):
-            color.append(data[absolute_magnitude1_field] - data[absolute_magnitude2_field])
-        
-        color_cut_percentile_at = 100.0 * (1 - self.color_cut_fraction)
-        color_cut_thres = np.percentile(np.concatenate(color), color_cut_percentile_at)
-        del color
-
+        # single pass: histogram colour (finely) alongside magnitude, mass and redshift,
+        # together with the colour distribution at low redshift that sets the cut
         colnames = [absolute_magnitude2_field, 'halo_mass', 'redshift_true']
-        bins = (self.magnitude_bins, self.mass_bins, self.z_bins)
-        hist_cen = np.zeros((self.n_magnitude_bins, self.n_mass_bins, self.n_z_bins))
-        hist_sat = np.zeros_like(hist_cen)
+        color_range = (self.color_bins[0], self.color_bins[-1])
+        hist_color_low_z = StreamingHistogram([self.color_bins])
+        # group 0: centrals, group 1: satellites
+        hist = StreamingHistogram([self.color_bins, self.magnitude_bins, self.mass_bins, self.z_bins], n_groups=2)
 
         cen_query = GCRQuery('is_central')
         sat_query = ~GCRQuery('is_central')
@@ -92,19 +86,21 @@ class ConditionalLuminosityFunction(BaseValidationTest):
         if 'r_host' in quantities_needed and 'r_vir' in quantities_needed:
             sat_query &= GCRQuery('r_host < r_vir')
 
-        for data in catalog_instance.get_quantities(
-            quantities_needed, 
-            filters=['{} - {} > {}'.format(absolute_magnitude1_field, absolute_magnitude2_field, color_cut_thres)],
-            return_iterator=True,
-        ):
-            cen_mask = cen_query.mask(data)
-            sat_mask = sat_query.mask(data)
+        for data in catalog_instance.get_quantities(quantities_needed, return_iterator=True):
+            group = np.where(cen_query.mask(data), 0, np.where(sat_query.mask(data), 1, -1))
+
+            # out-of-range colours go to the first/last colour bin so that no galaxy is lost
+            color = np.clip(data[absolute_magnitude1_field] - data[absolute_magnitude2_field], *color_range)
+            hist_color_low_z.add([color], group=np.where(data['redshift_true'] < self.color_cut_redshift, 0, -1))
+            hist.add([color] + [data[k] for k in colnames], group=group)
 
-            data = np.stack((data[k] for k in colnames)).T
-            hist_cen += np.histogramdd(data[cen_mask], bins)[0]
-            hist_sat += np.histogramdd(data[sat_mask], bins)[0]
+        data = color = group = None
 
-        data = cen_mask = sat_mask = None
+        # find out color cut threshold, and keep galaxies redder than it
+        color_cut_thres = quantile_from_histogram(hist_color_low_z.get_counts(), self.color_bins, 1 - self.color_cut_fraction)
+        color_weights = histogram_fraction_above(self.color_bins, color_cut_thres)
+        hist_cen = np.tensordot(color_weights, hist.get_counts(0), axes=1)
+        hist_sat = np.tensordot(color_weights, hist.get_counts(1), axes=1)
 
         halo_counts = hist_cen.sum(axis=0)
         clf = dict()
@@ -0,0 +1,180 @@
+"""
+cosmology helpers shared by the validation tests
+"""
+from __future__ import unicode_literals, division, print_function, absolute_import
+import numpy as np
+from scipy.interpolate import CubicSpline
+from numba import jit
+
+
+__all__ = [
+    'cosmology_key',
+    'DistanceTable',
+    'get_distance_table',
+]
+
+
+_distance_table_cache = dict()
+
+
+_COSMOLOGY_PARAMETERS = ('H0', 'Om0', 'Ode0', 'Ob0', 'Tcmb0', 'Neff', 'm_nu', 'w0', 'wa', 'wz', 'wp', 'zp')
+
+
+def _parameter_value(value):
+    value = getattr(value, 'value', value)
+    if value is None:
+        return None
+    value = np.atleast_1d(np.asarray(value, dtype=np.float64))
+    return tuple(value.tolist())
+
+
+def cosmology_key(cosmo):
+    """
+    Parameters
+    ----------
+    cosmo : astropy.Cosmology
+
+    Returns
+    -------
+    key : tuple
+        hashable key that identifies the cosmological parameters (all the
+        parameters of the astropy class, e.g. w0, wa, m_nu and Neff),
+        including n_s and sigma8 if the cosmology carries them
+    """
+    names = set(_COSMOLOGY_PARAMETERS)
+    names.update(getattr(cosmo, 'parameters', ()))
+    parameters = tuple((name, _parameter_value(getattr(cosmo, name))) for name in sorted(names) if hasattr(cosmo, name))
+    return (
+        type(cosmo).__name__,
+        parameters,
+        float(getattr(cosmo, 'n_s', 0.963)),
+        float(getattr(cosmo, 'sigma8', 0.8)),
+    )
+
+
+@jit(nopython=True)
+def _eval_uniform_spline(x, x0, x1, dx, c, log1p_x):
+    # evaluate the piecewise cubic with coefficients c on the uniform grid x0, x0+dx, ..., x1;
+    # the interval is found by arithmetic rather than by a binary search;
+    # entries outside the grid (including nan) give nan
+    out = np.empty(x.size)
+    n = c.shape[1]
+    for j in range(x.size):
+        xj = np.log1p(x[j]) if log1p_x else x[j]
+        if not (xj >= x0 and xj <= x1):
+            out[j] = np.nan
+            continue
+        i = min(int((xj - x0) / dx), n - 1)
+        t = xj - (x0 + i * dx)
+        out[j] = ((c[0, i] * t + c[1, i]) * t + c[2, i]) * t + c[3, i]
+    return out
+
+
+class _UniformCubicSpline(object):
+    """
+    cubic spline on a uniform grid; if `log1p_x` is set, the grid is in log(1+x)
+    but the spline is called with x. Returns nan outside the table range
+    (`DistanceTable` hands those entries to astropy).
+    """
+    def __init__(self, x, y, log1p_x=False):
+        self._c = np.ascontiguousarray(CubicSpline(x, y).c)
+        self._x0 = x[0]
+        self._x1 = x[-1]
+        self._dx = (x[-1] - x[0]) / (len(x) - 1)
+        self._log1p_x = log1p_x
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        out = _eval_uniform_spline(x.ravel(), self._x0, self._x1, self._dx, self._c, self._log1p_x)
+        return out.reshape(x.shape) if x.ndim else out[0]
+
+
+class DistanceTable(object):
+    """
+    Cubic-spline lookup tables of distances and the Hubble parameter for one cosmology.
+    All methods take and return plain (unitless) arrays: distances in Mpc, H in km/s/Mpc.
+    Redshifts outside the tables (negative, or above `zmax`) are computed exactly with astropy;
+    nan gives nan.
+    Use `get_distance_table` to share the tables of the same cosmology across tests.
+
+    Parameters
+    ----------
+    cosmo : astropy.Cosmology
+    zmax : float, optional
+        maximal redshift covered by the tables
+    n_grid : int, optional
+        number of grid points (uniform in log(1+z)); the default gives a relative
+        accuracy of ~1e-10
+    """
+    def __init__(self, cosmo, zmax=20.0, n_grid=8192):
+        self.zmax = float(zmax)
+        self._cosmo = cosmo
+        x = np.linspace(0.0, np.log1p(self.zmax), n_grid)
+        z = np.expm1(x)
+        chi = cosmo.comoving_distance(z).to('Mpc').value
+        dm = cosmo.comoving_transverse_distance(z).to('Mpc').value
+        self.chi_max = chi[-1]
+        self._chi = _UniformCubicSpline(x, chi, log1p_x=True)
+        self._dm = _UniformCubicSpline(x, dm, log1p_x=True)
+        self._H = _UniformCubicSpline(x, cosmo.H(z).to('km / (s Mpc)').value, log1p_x=True)
+        chi_uniform = np.linspace(0.0, self.chi_max, n_grid)
+        self._z_at_chi = _UniformCubicSpline(chi_uniform, np.expm1(CubicSpline(chi, x)(chi_uniform)))
+
+    def _lookup(self, spline, z, exact):
+        # evaluate the table, and hand the entries outside of it to astropy
+        out = spline(z)
+        z = np.asarray(z, dtype=np.float64)
+        outside = np.isnan(out) & ~np.isnan(z)
+        if outside.any():
+            if outside.ndim:
+                out[outside] = exact(z[outside])
+            else:
+                out = exact(z)
+        return out
+
+    def comoving_distance(self, z):
+        """line-of-sight comoving distance in Mpc"""
+        return self._lookup(self._chi, z, lambda z: self._cosmo.comoving_distance(z).to('Mpc').value)
+
+    def comoving_transverse_distance(self, z):
+        """transverse comoving distance in Mpc"""
+        return self._lookup(self._dm, z, lambda z: self._cosmo.comoving_transverse_distance(z).to('Mpc').value)
+
+    def angular_diameter_distance(self, z):
+        """angular diameter distance in Mpc"""
+        return self.comoving_transverse_distance(z) / (1.0 + np.asarray(z))
+
+    def luminosity_distance(self, z):
+        """luminosity distance in Mpc"""
+        return self.comoving_transverse_distance(z) * (1.0 + np.asarray(z))
+
+    def H(self, z):
+        """Hubble parameter in km/s/Mpc"""
+        return self._lookup(self._H, z, lambda z: self._cosmo.H(z).to('km / (s Mpc)').value)
+
+    def redshift_at_comoving_distance(self, chi):
+        """inverse of `comoving_distance` (chi in Mpc, up to `chi_max`)"""
+        z = self._z_at_chi(chi)
+        if (np.isnan(z) & ~np.isnan(chi)).any():
+            raise ValueError('comoving distances must be between 0 and {:g} Mpc'.format(self.chi_max))
+        return z
+
+
+def get_distance_table(cosmo, zmax=20.0):
+    """
+    Return the (memoized) DistanceTable of `cosmo`.
+
+    Parameters
+    ----------
+    cosmo : astropy.Cosmology
+    zmax : float, optional
+        maximal redshift covered by the tables
+
+    Returns
+    -------
+    table : DistanceTable
+    """
+    key = (cosmology_key(cosmo), float(zmax))
+    if key not in _distance_table_cache:
+        _distance_table_cache[key] = DistanceTable(cosmo, zmax)
+    return _distance_table_cache[key]
@@ -1,3 +1,7 @@
+import os
+import pickle
+import traceback
+import warnings
 import matplotlib
 
 mpl = matplotlib
@@ -19,4 +23,134 @@ mpl.rcParams['ytick.minor.size'] = 3.0
 import matplotlib.pyplot
 plt = matplotlib.pyplot
 
-__all__ = ['matplotlib', 'mpl', 'plt']
+__all__ = ['matplotlib', 'mpl', 'plt', 'configure_plotting', 'save_figure', 'wait_for_figures']
+
+_plot_config = {'formats': (), 'n_workers': 0}
+_executor = None
+_pending = []
+_errors = []
+
+
+def configure_plotting(dpi=None, formats=None, n_workers=None):
+    """
+    Set how figures are rendered. These can also be set with the environment variables
+    DESCQA_PLOT_DPI, DESCQA_PLOT_FORMATS (comma-separated) and DESCQA_PLOT_WORKERS.
+
+    Parameters
+    ----------
+    dpi : float, optional
+        resolution of all saved figures (e.g., lower it for nightly runs)
+    formats : list of str, optional
+        additional formats (e.g., ['pdf']) that `save_figure` writes next to each figure
+    n_workers : int, optional
+        number of processes that `save_figure` uses to render figures in the background;
+        0 to render in the calling process
+
+    Figures still pending are written first when `n_workers` is given; errors from
+    those are kept and returned by the next `wait_for_figures`.
+    """
+    if dpi:
+        mpl.rcParams['savefig.dpi'] = float(dpi)
+    if formats is not None:
+        _plot_config['formats'] = tuple(f.strip().lower().lstrip('.') for f in formats if f.strip())
+    if n_workers is not None:
+        while _pending:
+            _collect_figure(*_pending.pop(0))
+        _plot_config['n_workers'] = max(int(n_workers), 0)
+
+
+def _render_figure(fig, filenames, tight_layout=False, **savefig_kwargs):
+    if tight_layout:
+        fig.tight_layout()
+    for filename in filenames:
+        fig.savefig(filename, **savefig_kwargs)
+    plt.close(fig)
+
+
+def _render_pickled_figure(fig_pickle, filenames, tight_layout=False, **savefig_kwargs):
+    try:
+        _render_figure(pickle.loads(fig_pickle), filenames, tight_layout, **savefig_kwargs)
+    except Exception: # pylint: disable=broad-except
+        return traceback.format_exc()
+
+
+def save_figure(fig, filename, tight_layout=False, **savefig_kwargs):
+    """
+    Save and close `fig`, also in the additional formats set by `configure_plotting`.
+    If background workers are enabled, the figure is pickled and rendered by a worker process,
+    so call `wait_for_figures` before reading the output files.
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+    filename : str
+    tight_layout : bool, optional
+        call `fig.tight_layout()` before saving (done by the worker, as it is costly)
+    savefig_kwargs
+        passed to `fig.savefig`
+    """
+    global _executor # pylint: disable=global-statement
+
+    root, ext = os.path.splitext(filename)
+    filenames = [filename] + ['{}.{}'.format(root, f) for f in _plot_config['formats'] if f != ext.lower().lstrip('.')]
+    savefig_kwargs.setdefault('dpi', mpl.rcParams['savefig.dpi'])
+
+    if _plot_config['n_workers'] > 0:
+        try:
+            fig_pickle = pickle.dumps(fig)
+        except Exception: # pylint: disable=broad-except
+            pass
+        else:
+            if _executor is None:
+                from concurrent.futures import ProcessPoolExecutor
+                _executor = ProcessPoolExecutor(_plot_config['n_workers'])
+            # bound the number of figures waiting in memory
+            while len(_pending) >= 4 * _plot_config['n_workers']:
+                _collect_figure(*_pending.pop(0))
+            _pending.append((filename, _executor.submit(_render_pickled_figure, fig_pickle, filenames, tight_layout, **savefig_kwargs)))
+            plt.close(fig)
+            return
+
+    _render_figure(fig, filenames, tight_layout, **savefig_kwargs)
+
+
+def _collect_figure(filename, future):
+    try:
+        error = future.result()
+    except Exception: # pylint: disable=broad-except
+        error = traceback.format_exc()
+    if error:
+        _errors.append((filename, error))
+
+
+def wait_for_figures():
+    """
+    Wait until all figures submitted by `save_figure` have been written.
+
+    Returns
+    -------
+    errors : list of (filename, traceback string)
+        figures that failed to render since the last call
+    """
+    while _pending:
+        _collect_figure(*_pending.pop(0))
+    errors = list(_errors)
+    del _errors[:]
+    return errors
+
+
+def _getenv(name, convert):
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        return convert(value)
+    except ValueError:
+        warnings.warn('Ignoring invalid value {}={!r}'.format(name, value))
+
+
+configure_plotting(
+    _getenv('DESCQA_PLOT_DPI', float),
+    _getenv('DESCQA_PLOT_FORMATS', lambda value: value.split(',')),
+    _getenv('DESCQA_PLOT_WORKERS', int),
+)
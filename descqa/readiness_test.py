@@ -9,7 +9,7 @@ import numexpr as ne
 from scipy.stats import norm
 
 from .base import BaseValidationTest, TestResult
-from .plotting import plt
+from .plotting import plt, save_figure
 
 
 __all__ = ['CheckQuantities']
@@ -352,8 +352,9 @@ class CheckQuantities(BaseValidationTest):
                     leg = ax.legend(loc='best', fontsize='x-small', ncol=3, frameon=True, facecolor='white',
                                     title=filter_labels, title_fontsize=self.lgndtitle_fontsize)
                     leg.get_frame().set_alpha(0.5)
-                fig.savefig(os.path.join(output_dir, plot_filename))
-            plt.close(fig)
+                save_figure(fig, os.path.join(output_dir, plot_filename))
+            else:
+                plt.close(fig)
 
         for same_quantities in quantity_hashes.values():
             if len(same_quantities) > 1:
@@ -2,6 +2,7 @@ from __future__ import division
 from builtins import range # pylint: disable=W0622
 import numpy as np
 from scipy.stats import chi2
+from numba import jit
 
 
 def get_subvolume_indices(x, y, z, box_size, n_side):
@@ -81,3 +82,109 @@ def CvM_statistic(n1, n2, x1, y1, x2, y2):
     cvm_omega = np.sqrt(np.trapz((y2_interp-y1_interp)**2, x=h))
 
     return cvm_omega
+
+
+@jit(nopython=True)
+def _fenwick_sweep(point_rank, n_added, query_rank, n_points):
+    # add points (in x order) to a Fenwick tree indexed by y rank,
+    # and query the prefix count for each query (in x order)
+    tree = np.zeros(n_points + 1, dtype=np.int64)
+    counts = np.empty(len(n_added), dtype=np.int64)
+    j = 0
+    for k in range(len(n_added)):
+        while j < n_added[k]:
+            i = point_rank[j] + 1
+            while i <= n_points:
+                tree[i] += 1
+                i += i & (-i)
+            j += 1
+        s = 0
+        i = query_rank[k]
+        while i > 0:
+            s += tree[i]
+            i -= i & (-i)
+        counts[k] = s
+    return counts
+
+
+def count_dominated_points(px, py, qx, qy):
+    '''
+    For each query point (qx, qy), count the number of points (px, py)
+    that satisfy px <= qx and py <= qy, in O((n+m) log n) time.
+    '''
+    px = np.asarray(px)
+    py = np.asarray(py)
+    qx = np.asarray(qx)
+    qy = np.asarray(qy)
+
+    p_order = np.argsort(px, kind='mergesort')
+    q_order = np.argsort(qx, kind='mergesort')
+    py_sorted = np.sort(py)
+
+    point_rank = np.searchsorted(py_sorted, py[p_order], 'left')
+    query_rank = np.searchsorted(py_sorted, qy[q_order], 'right')
+    n_added = np.searchsorted(px[p_order], qx[q_order], 'right')
+
+    counts = np.empty(len(qx), dtype=np.int64)
+    counts[q_order] = _fenwick_sweep(point_rank, n_added, query_rank, len(px))
+    return counts
+
+
+def kstest_2d(dist1, dist2):
+    '''
+    Perform the two-sample 2-D KS-test (Peacock 1983; Fasano & Franceschini 1987)
+    on dist1 and dist2, each of shape (2, n). All four quadrant counts around
+    every point of both samples are computed with sorted sweeps, so the cost
+    is O(n log n) rather than O(n^2).
+    Returns the Peacock p-value and the KS statistic.
+    '''
+    dist1 = np.asarray(dist1, dtype=np.float64)
+    dist2 = np.asarray(dist2, dtype=np.float64)
+    num1 = dist1.shape[1]
+    num2 = dist2.shape[1]
+    edges = np.hstack((dist1, dist2))
+
+    KSstat = -np.inf
+
+    # quadrants (x >= edge, y >= edge), (x <= edge, y >= edge), ... expressed as
+    # "<=" counts on sign-flipped coordinates
+    for sx, sy in ((-1.0, -1.0), (1.0, -1.0), (1.0, 1.0), (-1.0, 1.0)):
+        cdf1 = count_dominated_points(sx*dist1[0], sy*dist1[1], sx*edges[0], sy*edges[1]) / num1
+        cdf2 = count_dominated_points(sx*dist2[0], sy*dist2[1], sx*edges[0], sy*edges[1]) / num2
+        KSstat = max(KSstat, np.abs(cdf1 - cdf2).max())
+
+    # Peacock Z calculation and P estimation
+    n = num1 * num2 / (num1 + num2)
+    Zn = np.sqrt(n) * KSstat
+    Zinf = Zn / (1 - 0.53 * n**(-0.9))
+    pValue = 2 * np.exp(-2 * (Zinf - 0.5)**2)
+
+    # Clip invalid values for P
+    pValue = min(pValue, 1.0)
+
+    return pValue, KSstat
+
+
+def quantile_from_histogram(counts, bins, q):
+    '''
+    Estimate the q-th quantile (0 <= q <= 1) of a sample from its histogram
+    `counts` over the edges `bins`, interpolating linearly within the bin.
+    Histograms of chunks can simply be added up, so this serves as a mergeable
+    quantile sketch whose accuracy is set by the bin width.
+    '''
+    cdf = np.cumsum(np.concatenate(([0.0], counts)))
+    if cdf[-1] <= 0:
+        raise ValueError('Cannot compute a quantile from an empty histogram')
+    cdf /= cdf[-1]
+    i = np.clip(np.searchsorted(cdf, q, side='left'), 1, len(bins) - 1)
+    frac = (q - cdf[i-1]) / (cdf[i] - cdf[i-1]) if cdf[i] > cdf[i-1] else 0.0
+    return bins[i-1] + frac * (bins[i] - bins[i-1])
+
+
+def histogram_fraction_above(bins, threshold):
+    '''
+    Fraction of each bin of `bins` that lies above `threshold`,
+    assuming the values are uniformly distributed within a bin.
+    '''
+    bins = np.asarray(bins, dtype=np.float64)
+    return np.clip((bins[1:] - threshold) / (bins[1:] - bins[:-1]), 0.0, 1.0)
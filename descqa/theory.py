@@ -0,0 +1,105 @@
+"""
+theory predictions shared by the validation tests
+"""
+from __future__ import unicode_literals, division, print_function, absolute_import
+import os
+import hashlib
+import numpy as np
+from scipy.interpolate import RectBivariateSpline
+import camb
+from .cosmology import cosmology_key
+
+
+__all__ = [
+    'PowerSpectrumInterpolator',
+    'get_matter_power_interpolator',
+]
+
+
+_power_spectrum_cache = dict()
+
+
+class PowerSpectrumInterpolator(RectBivariateSpline):
+    """
+    Interpolator of the matter power spectrum P(z, k) tabulated on a (z, k) grid.
+    Call `P(z, k, grid=True)` as for the CAMB interpolator (k in 1/Mpc, P in Mpc**3).
+
+    Parameters
+    ----------
+    z : ndarray
+        1d array of redshifts (ascending)
+    k : ndarray
+        1d array of wavenumbers in 1/Mpc (ascending)
+    log_pk : ndarray
+        2d array of shape (len(z), len(k)) that contains log(P)
+    """
+    def __init__(self, z, k, log_pk):
+        self.z = np.asarray(z, dtype=np.float64)
+        self.k = np.asarray(k, dtype=np.float64)
+        self.log_pk = np.asarray(log_pk, dtype=np.float64)
+        super(PowerSpectrumInterpolator, self).__init__(
+            self.z, np.log(self.k), self.log_pk, kx=min(len(self.z)-1, 3), ky=min(len(self.k)-1, 3))
+
+    def P(self, z, k, grid=True):
+        """
+        matter power spectrum in Mpc**3 at redshift z and wavenumber k (in 1/Mpc)
+        """
+        return np.exp(self(z, np.log(k), grid=grid))
+
+
+def get_matter_power_interpolator(cosmo, zmax, kmax=100.0, nonlinear=True, halofit_version='takahashi', cache_dir=None):
+    """
+    Return the CAMB matter power spectrum interpolator for `cosmo`.
+    CAMB only runs when no interpolator with the same parameters has been computed
+    in this process, or stored in `cache_dir`.
+
+    Parameters
+    ----------
+    cosmo : astropy.Cosmology
+        n_s and sigma8 are taken from the cosmology if available (default: 0.963 and 0.8)
+    zmax : float
+        maximal redshift
+    kmax : float, optional
+        maximal wavenumber in 1/Mpc
+    nonlinear : bool, optional
+        include the halofit non-linear correction
+    halofit_version : str, optional
+        halofit version used if nonlinear is True
+    cache_dir : str, optional
+        if set, the tabulated P(z, k) is stored in (and read from) this directory
+
+    Returns
+    -------
+    interpolator : PowerSpectrumInterpolator
+    """
+    key = (cosmology_key(cosmo), float(zmax), float(kmax), bool(nonlinear), halofit_version)
+    if key in _power_spectrum_cache:
+        return _power_spectrum_cache[key]
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, 'pk_{}.npz'.format(hashlib.sha1(repr(key).encode()).hexdigest()))
+
+    if cache_path and os.path.isfile(cache_path):
+        with np.load(cache_path) as f:
+            interpolator = PowerSpectrumInterpolator(f['z'], f['k'], f['log_pk'])
+
+    else:
+        ns = getattr(cosmo, 'n_s', 0.963)
+        s8 = getattr(cosmo, 'sigma8', 0.8)
+        pars = camb.CAMBparams()
+        pars.set_cosmology(H0=cosmo.H0.value, ombh2=cosmo.Ob0*cosmo.h**2, omch2=(cosmo.Om0-cosmo.Ob0)*cosmo.h**2)
+        pars.InitPower.set_params(ns=ns, As=2.168e-9*(s8/0.8)**2)
+        if nonlinear:
+            pars.NonLinearModel.set_params(halofit_version=halofit_version)
+        pk, z, k = camb.get_matter_power_interpolator(pars, nonlinear=nonlinear, k_hunit=False, hubble_units=False,
+                                                      kmax=kmax, zmax=zmax, k_per_logint=False, return_z_k=True)
+        interpolator = PowerSpectrumInterpolator(z, k, np.log(pk.P(z, k)))
+
+        if cache_path:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            np.savez(cache_path, z=interpolator.z, k=interpolator.k, log_pk=interpolator.log_pk)
+
+    _power_spectrum_cache[key] = interpolator
+    return interpolator
@@ -2,14 +2,23 @@
 utility functions for descqa
 """
 from __future__ import unicode_literals, division, print_function, absolute_import
+import os
+import hashlib
 import numpy as np
 import healpy as hp
+from .cosmology import get_distance_table
 
 
 __all__ = [
     'get_sky_volume',
     'get_opt_binpoints',
     'get_healpixel_footprint',
+    'HealpixFootprint',
+    'get_catalog_footprint',
+    'JackknifeRegions',
+    'get_jackknife_regions',
+    'StreamingHistogram',
+    'MomentHistogram',
     'generate_uniform_random_ra_dec',
     'generate_uniform_random_ra_dec_footprint',
     'first',
@@ -34,33 +43,26 @@ def get_sky_volume(sky_area, zlo, zhi, cosmology):
     sky_volume : float
         in unit of Mpc**3.0
     """
-    dhi = cosmology.comoving_distance(zhi).to('Mpc').value if zhi > 0 else 0.0
-    dlo = cosmology.comoving_distance(zlo).to('Mpc').value if zlo > 0 else 0.0
+    dlo, dhi = get_distance_table(cosmology).comoving_distance(np.maximum([zlo, zhi], 0.0))
     sky_area_rad = np.deg2rad(np.deg2rad(sky_area))
     return (dhi**3.0 - dlo**3.0) * sky_area_rad / 3.0
 
-def get_sky_area(catalog_instance, nside=1024):
+def get_sky_area(catalog_instance, nside=1024, catalog_name=None, cache_dir=None):
     """
     Parameters
     ----------
     catalog_instance: GCRCatalogs intance
     nside: nside parameter for healpy
+    catalog_name: str, optional
+        name of the catalog; if given, the footprint is shared through `get_catalog_footprint`
+    cache_dir: str, optional
+        directory in which the footprint is stored (see `get_catalog_footprint`)
     Returns
     -------
     sky_area : float
         in units of deg**2.0
     """
-    possible_area_qs = (('ra_true', 'ra'), ('dec_true', 'dec'))
-    area_qs = [catalog_instance.first_available(*a) for a in possible_area_qs]
-
-    pixels = set()
-    for d in catalog_instance.get_quantities(area_qs, return_iterator=True):
-        pixels.update(hp.ang2pix(nside, d[area_qs[0]], d[area_qs[1]], lonlat=True))
-
-    frac = len(pixels) / hp.nside2npix(nside)
-    sky_area = frac * np.rad2deg(np.rad2deg(4.0*np.pi))
-
-    return sky_area
+    return get_catalog_footprint(catalog_instance, catalog_name, nside, cache_dir).get_sky_area()
 
 
 def get_opt_binpoints(N, sumM, sumM2, bins):
@@ -105,11 +107,620 @@ def get_healpixel_footprint(ra, dec, nside, nest=False, count_threshold=None):
     pixels : ndarray
         1d array that contains healpixel IDs
     """
-    pixels = hp.ang2pix(nside, ra, dec, nest=nest, lonlat=True)
-    if count_threshold and count_threshold > 1:
-        pixels, counts = np.unique(pixels, return_counts=True)
-        return pixels[counts >= count_threshold]
-    return np.unique(pixels)
+    return HealpixFootprint(nside, nest).add(ra, dec).get_pixels(count_threshold=count_threshold)
+
+
+class HealpixFootprint(object):
+    """
+    Streaming healpix count map and footprint.
+    Object counts are accumulated chunk by chunk (`add`) with `np.bincount`
+    at `nside` (stored in nest ordering), and count maps, footprint
+    masks and pixels (pixels with at least `count_threshold` objects, default 1),
+    sky areas and random points at `nside` or any coarser nside can be derived
+    afterwards. The footprint mask can be saved to and loaded from disk.
+
+    Parameters
+    ----------
+    nside : int
+        number of healpixel nside, must be 2**k
+    nest : bool, optional
+        default ordering (nest or ring) of the returned maps and pixels
+    """
+    def __init__(self, nside, nest=False):
+        self.nside = nside
+        self.nest = nest
+        self.counts = np.zeros(hp.nside2npix(nside), dtype=np.int32)
+
+    @property
+    def mask(self):
+        """
+        boolean mask (nest ordering, at `nside`) of the pixels that contain at least one object
+        """
+        return self.counts > 0
+
+    def add(self, ra, dec):
+        """
+        Parameters
+        ----------
+        ra : ndarray
+            RA in degrees
+        dec : ndarray
+            Dec in degrees
+
+        Returns
+        -------
+        self
+        """
+        pixels = hp.ang2pix(self.nside, ra, dec, nest=True, lonlat=True)
+        # only touch the pixels hit by this chunk, rather than a full-sky bincount
+        self._add_counts(*np.unique(pixels, return_counts=True))
+        return self
+
+    def _add_counts(self, pixels, counts):
+        # pixels must be unique
+        counts = self.counts[pixels] + np.asarray(counts, dtype=np.int64)
+        if counts.size and counts.max() > np.iinfo(self.counts.dtype).max:
+            raise OverflowError('Too many objects in a healpixel for nside={}'.format(self.nside))
+        self.counts[pixels] = counts
+
+    def merge(self, other):
+        """
+        add the counts of another HealpixFootprint with the same nside
+        """
+        if other.nside != self.nside:
+            raise ValueError('Cannot merge footprints with different nside')
+        pixels = np.flatnonzero(other.counts)
+        self._add_counts(pixels, other.counts[pixels])
+        return self
+
+    def get_map(self, nside=None, nest=None):
+        """
+        Parameters
+        ----------
+        nside : int, optional
+            nside of the returned map, must be <= self.nside (default: self.nside)
+        nest : bool, optional
+            ordering of the returned map (default: self.nest)
+
+        Returns
+        -------
+        counts : ndarray
+            healpix map of object counts
+        """
+        nside = nside or self.nside
+        if nside > self.nside:
+            raise ValueError('nside must be <= {}'.format(self.nside))
+        counts = self.counts.reshape(-1, (self.nside // nside)**2).sum(axis=1)
+        if not (self.nest if nest is None else nest):
+            counts = counts[hp.ring2nest(nside, np.arange(counts.size))]
+        return counts
+
+    def get_mask(self, nside=None, nest=None, count_threshold=None):
+        """
+        Parameters
+        ----------
+        nside : int, optional
+            nside of the returned mask, must be <= self.nside (default: self.nside)
+        nest : bool, optional
+            ordering of the returned mask (default: self.nest)
+        count_threshold : None or int (optional)
+            minimal number of points within a healpixel to count as part of the footprint
+
+        Returns
+        -------
+        mask : ndarray
+            boolean healpix map, True for pixels within the footprint
+        """
+        return self.get_map(nside, nest) >= max(count_threshold or 1, 1)
+
+    def get_pixels(self, nside=None, nest=None, count_threshold=None):
+        """
+        Parameters
+        ----------
+        nside : int, optional
+            nside of the footprint, must be <= self.nside (default: self.nside)
+        nest : bool, optional
+            ordering of the returned pixels (default: self.nest)
+        count_threshold : None or int (optional)
+            minimal number of points within a healpixel to count as part of the footprint
+
+        Returns
+        -------
+        pixels : ndarray
+            1d array that contains (sorted) healpixel IDs
+        """
+        return np.flatnonzero(self.get_mask(nside, nest, count_threshold))
+
+    def get_sky_area(self, nside=None, count_threshold=None):
+        """
+        Parameters
+        ----------
+        nside : int, optional
+            nside of the footprint, must be <= self.nside (default: self.nside)
+        count_threshold : None or int (optional)
+            minimal number of points within a healpixel to count as part of the footprint
+
+        Returns
+        -------
+        sky_area : float
+            in units of deg**2.0
+        """
+        nside = nside or self.nside
+        return np.count_nonzero(self.get_mask(nside, True, count_threshold)) * hp.nside2pixarea(nside, degrees=True)
+
+    def generate_uniform_random_ra_dec(self, n, nside=None):
+        """
+        Parameters
+        ----------
+        n : int
+            number of random points needed
+        nside : int, optional
+            nside of the footprint, must be <= self.nside (default: self.nside)
+
+        Returns
+        -------
+        ra : ndarray
+            1d array of length n that contains RA in degrees
+        dec : ndarray
+            1d array of length n that contains Dec in degrees
+        """
+        nside = nside or self.nside
+        return generate_uniform_random_ra_dec_footprint(n, self.get_pixels(nside), nside, self.nest)
+
+    def save(self, filename):
+        """
+        save the footprint (the counts of the non-empty pixels) to `filename` (npz format)
+        """
+        pixels = np.flatnonzero(self.counts)
+        with open(filename, 'wb') as f:
+            np.savez_compressed(f, nside=self.nside, pixels=pixels, counts=self.counts[pixels])
+
+    @classmethod
+    def load(cls, filename, nest=False):
+        """
+        load a footprint saved by `HealpixFootprint.save`
+        """
+        with np.load(filename) as d:
+            footprint = cls(int(d['nside']), nest)
+            footprint.counts[d['pixels']] = d['counts']
+        return footprint
+
+
+_footprint_cache = dict()
+
+
+def get_catalog_footprint(catalog_instance, catalog_name=None, nside=1024, cache_dir=None, ra=None, dec=None):
+    """
+    Healpix footprint of a catalog, computed chunk by chunk from ra/dec.
+    When `catalog_name` is given, the footprint is kept for the rest of the
+    process (keyed by catalog name, catalog version and nside) and, if
+    `cache_dir` is set, also stored on disk, so that all tests share it.
+    A footprint already computed at a finer nside is degraded instead of recomputed.
+
+    Parameters
+    ----------
+    catalog_instance : GCRCatalogs intance
+    catalog_name : str, optional
+        name of the catalog, required for caching
+    nside : int, optional
+        number of healpixel nside, must be 2**k
+    cache_dir : str, optional
+        directory in which the footprints are stored
+    ra, dec : str, optional
+        columns to use (default: 'ra_true'/'dec_true' if available, otherwise 'ra'/'dec')
+
+    Returns
+    -------
+    footprint : HealpixFootprint
+    """
+    area_qs = [q or catalog_instance.first_available(*a) for q, a in ((ra, ('ra_true', 'ra')), (dec, ('dec_true', 'dec')))]
+
+    key = cache_path = None
+    if catalog_name:
+        key = (catalog_name, str(getattr(catalog_instance, 'version', ''))) + tuple(area_qs)
+        for cached_nside in sorted(_footprint_cache.get(key, {}), reverse=True):
+            if cached_nside == nside:
+                return _footprint_cache[key][nside]
+            if cached_nside > nside:
+                footprint = HealpixFootprint(nside)
+                footprint.counts[:] = _footprint_cache[key][cached_nside].get_map(nside, True)
+                _footprint_cache[key][nside] = footprint
+                return footprint
+
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, 'footprint_{}_nside{}.npz'.format(
+                hashlib.sha1(repr(key).encode()).hexdigest(), nside))
+
+    if cache_path and os.path.isfile(cache_path):
+        footprint = HealpixFootprint.load(cache_path)
+    else:
+        footprint = HealpixFootprint(nside)
+        for d in catalog_instance.get_quantities(area_qs, return_iterator=True):
+            footprint.add(d[area_qs[0]], d[area_qs[1]])
+
+        if cache_path:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            footprint.save(cache_path)
+
+    if key is not None:
+        _footprint_cache.setdefault(key, dict())[nside] = footprint
+    return footprint
+
+
+def _get_bin_index(x, edges):
+    """
+    index of the bin of `edges` that contains each element of `x`, or -1 if outside
+    (as in np.histogram, the last bin includes its right edge)
+    """
+    x = np.asarray(x)
+    n = len(edges) - 1
+    inside = (x >= edges[0]) & (x <= edges[-1])
+    width = np.diff(edges)
+    if np.allclose(width, width[0], rtol=1e-10, atol=0):
+        idx = np.where(inside, (x - edges[0]) * (n / (edges[-1] - edges[0])), 0).astype(np.intp)
+        np.clip(idx, 0, n - 1, out=idx)
+        # fix floating-point round-off at the bin edges
+        idx -= (x < edges[idx])
+        idx += (x >= edges[idx + 1]) & (idx < n - 1)
+    else:
+        idx = np.searchsorted(edges, x, side='right') - 1
+        idx[x == edges[-1]] = n - 1
+    idx[~inside] = -1
+    return idx
+
+
+class JackknifeRegions(object):
+    """
+    Jackknife regions of a healpix footprint.
+    The footprint pixels (optionally degraded to a coarser nside) are grouped
+    into `n_regions` compact, roughly equal-area regions by a deterministic
+    k-means on the pixel centers, initialized with equal-size runs of pixels
+    in nest ordering. Objects are then assigned a region by pixel lookup.
+
+    Parameters
+    ----------
+    footprint : HealpixFootprint
+    n_regions : int
+        number of jackknife regions
+    nside : int, optional
+        nside of the region map, must be <= footprint.nside (default: footprint.nside)
+    n_iter : int, optional
+        maximal number of k-means iterations (default: 50)
+    """
+    def __init__(self, footprint, n_regions, nside=None, n_iter=50):
+        self.nside = nside or footprint.nside
+        self.n_regions = n_regions
+        self.pixels = footprint.get_pixels(self.nside, nest=True)
+        if len(self.pixels) < n_regions:
+            raise ValueError('Footprint has fewer pixels ({}) than jackknife regions ({})'.format(len(self.pixels), n_regions))
+
+        xyz = np.stack(hp.pix2vec(self.nside, self.pixels, nest=True), axis=1)
+        labels = np.arange(len(self.pixels)) * n_regions // len(self.pixels)
+        for _ in range(n_iter):
+            centers = np.stack([np.bincount(labels, xyz[:, i], minlength=n_regions) for i in range(3)], axis=1)
+            centers /= np.maximum(np.linalg.norm(centers, axis=1, keepdims=True), 1e-300)
+            new_labels = np.argmax(np.dot(xyz, centers.T), axis=1)
+            if (new_labels == labels).all():
+                break
+            labels = new_labels
+        self.pixel_labels = labels
+
+    def get_labels(self, ra, dec):
+        """
+        Parameters
+        ----------
+        ra : ndarray
+            RA in degrees
+        dec : ndarray
+            Dec in degrees
+
+        Returns
+        -------
+        labels : ndarray
+            jackknife region of each object (-1 if outside the footprint)
+        """
+        pixels = hp.ang2pix(self.nside, ra, dec, nest=True, lonlat=True)
+        idx = np.searchsorted(self.pixels, pixels)
+        idx[idx >= len(self.pixels)] = 0
+        return np.where(self.pixels[idx] == pixels, self.pixel_labels[idx], -1)
+
+
+_jackknife_regions_cache = dict()
+
+
+def get_jackknife_regions(footprint, n_regions, nside=None):
+    """
+    `JackknifeRegions` of `footprint`, shared by all tests that use the same
+    footprint and number of regions within this process.
+
+    Parameters
+    ----------
+    footprint : HealpixFootprint
+    n_regions : int
+        number of jackknife regions
+    nside : int, optional
+        nside of the region map, must be <= footprint.nside (default: footprint.nside)
+
+    Returns
+    -------
+    regions : JackknifeRegions
+    """
+    key = (hashlib.sha1(np.packbits(footprint.mask).tobytes()).hexdigest(), footprint.nside, n_regions, nside)
+    if key not in _jackknife_regions_cache:
+        _jackknife_regions_cache[key] = JackknifeRegions(footprint, n_regions, nside)
+    return _jackknife_regions_cache[key]
+
+
+class StreamingHistogram(object):
+    """
+    Streaming N-D histogram, optionally split into several groups
+    (e.g. centrals and satellites) that share the same bins.
+    Call `add` on each chunk of a catalog; the bin indices of all dimensions
+    are computed once (with uniform-bin arithmetic when possible) and encoded
+    into a flat index, and all groups are accumulated with a single `np.bincount`.
+    Counts agree with `np.histogramdd` on the same bins.
+
+    Parameters
+    ----------
+    bins : list of 1d arrays
+        bin edges of each dimension (must be increasing)
+    n_groups : int, optional
+        number of groups (default: 1)
+    """
+    def __init__(self, bins, n_groups=1):
+        self.bins = [np.asarray(b, dtype=np.float64) for b in bins]
+        self.shape = tuple(len(b) - 1 for b in self.bins)
+        self.n_groups = n_groups
+        self.counts = np.zeros((n_groups,) + self.shape)
+
+    def get_bin_index(self, values):
+        """
+        Parameters
+        ----------
+        values : list of 1d arrays
+            values of each dimension
+
+        Returns
+        -------
+        index : ndarray
+            flat bin index (within one group) of each entry, or -1 if outside the bins
+        """
+        index = np.zeros(np.shape(values[0]), dtype=np.intp)
+        outside = np.zeros(index.shape, dtype=np.bool_)
+        for x, edges, n in zip(values, self.bins, self.shape):
+            idx = _get_bin_index(x, edges)
+            outside |= (idx < 0)
+            index *= n
+            index += idx
+        index[outside] = -1
+        return index
+
+    def add(self, values, group=None, weights=None):
+        """
+        Parameters
+        ----------
+        values : list of 1d arrays
+            values of each dimension
+        group : int or 1d int array, optional
+            group of each entry; entries with a negative group are skipped (default: 0)
+        weights : 1d array, optional
+            weight of each entry
+
+        Returns
+        -------
+        self
+        """
+        return self.add_index(self.get_bin_index(values), group, weights)
+
+    def add_index(self, index, group=None, weights=None):
+        """
+        same as `add`, with the flat bin index of each entry (from `get_bin_index`)
+        instead of the values, so that the index can be shared by several histograms
+
+        Returns
+        -------
+        self
+        """
+        index = np.array(index, dtype=np.intp)
+        if group is not None:
+            group = np.broadcast_to(group, index.shape)
+            index[group < 0] = -1
+            index += np.where(index >= 0, group, 0) * int(np.prod(self.shape))
+        mask = (index >= 0)
+        if weights is not None:
+            weights = np.broadcast_to(weights, index.shape)[mask]
+        self.counts += np.bincount(index[mask], weights, minlength=self.counts.size).reshape(self.counts.shape)
+        return self
+
+    def merge(self, other):
+        """
+        add the counts of another StreamingHistogram with the same bins
+        """
+        if other.counts.shape != self.counts.shape or \
+                not all(np.array_equal(b1, b2) for b1, b2 in zip(self.bins, other.bins)):
+            raise ValueError('Cannot merge histograms with different bins')
+        self.counts += other.counts
+        return self
+
+    def get_counts(self, group=None):
+        """
+        Parameters
+        ----------
+        group : int, optional
+            if given, only return the counts of this group (default: sum over all groups)
+
+        Returns
+        -------
+        counts : ndarray
+            histogram counts, with the shape of the bins
+        """
+        if group is None:
+            return self.counts.sum(axis=0)
+        return self.counts[group]
+
+
+class MomentHistogram(object):
+    """
+    Streaming histogram of counts and moments (sums of x, x**2, ...) on the bins
+    of a `StreamingHistogram`, for several (possibly overlapping) cuts. The moments
+    are those of the binned values themselves (1-D bins, as needed by
+    `get_opt_binpoints`), or of other named quantities (e.g., sizes binned in
+    redshift and luminosity). The bin index of each entry is computed once per
+    chunk and shared by all cuts, quantities and moments.
+    Counts and moments agree with `np.histogram` on the same bins.
+    Only statistics derived from the moments (mean and std) are supported;
+    medians or other percentiles would require keeping all the values.
+
+    Statistics can be restricted to a range of bins with `select`, a tuple of
+    one int or slice per (leading) bin dimension; the bins in a slice are merged.
+    For example, with bins [z_edges, L_edges], `select=(slice(2, 4),)` gives the
+    statistics in L bins of the entries in the z intervals 2 and 3.
+
+    Parameters
+    ----------
+    bins : 1d array, or list of 1d arrays
+        bin edges (of each dimension; must be increasing)
+    n_masks : int, optional
+        number of cuts (default: 1)
+    n_moments : int, optional
+        highest moment to accumulate (default: 2)
+    names : list of str, optional
+        names of the quantities whose moments are accumulated (given to `add` as `data`);
+        default: the binned values themselves (1-D bins only), with name None
+    """
+    def __init__(self, bins, n_masks=1, n_moments=2, names=None):
+        if np.ndim(bins[0]) == 0: # 1-D bins given as a single array of edges
+            bins = [bins]
+        self.ndim = len(bins)
+        self._counts = StreamingHistogram(bins, n_groups=n_masks)
+        self.bins = self._counts.bins[0] if self.ndim == 1 else self._counts.bins
+        self.n_bins = self._counts.shape[0] if self.ndim == 1 else self._counts.shape
+        self.n_masks = n_masks
+        self.n_moments = n_moments
+        self.names = [None] if names is None else list(names)
+        self._sums = {name: [StreamingHistogram(self._counts.bins, n_groups=n_masks) for _ in range(n_moments)]
+                      for name in self.names}
+
+    def add(self, values, masks=None, group=None, data=None):
+        """
+        Parameters
+        ----------
+        values : 1d array (1-D bins), or list of 1d arrays
+            values to histogram
+        masks : list of 1d bool arrays, optional
+            one selection mask per cut (default: all values in the only cut)
+        group : 1d int array, optional
+            instead of `masks`, the cut each value belongs to (for non-overlapping cuts);
+            values with a negative group are skipped
+        data : dict, optional
+            name -> 1d array of the quantities in `names`
+
+        Returns
+        -------
+        self
+        """
+        if self.ndim == 1 and np.ndim(values[0]) == 0:
+            values = [values]
+        index = self._counts.get_bin_index(values)
+        if group is not None:
+            group = np.broadcast_to(group, index.shape)
+            if group.size and group.max() >= self.n_masks:
+                raise ValueError('group must be < {}'.format(self.n_masks))
+            selected = np.flatnonzero((index >= 0) & (group >= 0))
+            group = group[selected]
+        else:
+            if masks is None:
+                masks = [np.ones(index.shape, dtype=np.bool_)]
+            if len(masks) != self.n_masks:
+                raise ValueError('Expecting {} masks'.format(self.n_masks))
+            selected = [np.flatnonzero(mask & (index >= 0)) for mask in masks]
+            group = np.concatenate([np.full(s.size, i, dtype=np.intp) for i, s in enumerate(selected)])
+            selected = np.concatenate(selected)
+        index = index[selected]
+
+        self._counts.add_index(index, group)
+        for name in self.names:
+            x = np.asarray(values[0] if name is None else data[name], dtype=np.float64)[selected]
+            weights = x
+            for hist in self._sums[name]:
+                hist.add_index(index, group, weights)
+                weights = weights * x
+        return self
+
+    def merge(self, other):
+        """
+        add the counts and moments of another MomentHistogram with the same setup
+        """
+        if other.n_moments != self.n_moments or other.names != self.names:
+            raise ValueError('Cannot merge histograms with different setup')
+        self._counts.merge(other._counts)
+        for name in self.names:
+            for hist, other_hist in zip(self._sums[name], other._sums[name]):
+                hist.merge(other_hist)
+        return self
+
+    @staticmethod
+    def _reduce(array, select):
+        # array has the cuts as first axis
+        for axis, s in reversed(list(enumerate(select or (), 1))):
+            array = array[(slice(None),) * axis + (s,)]
+            if isinstance(s, slice):
+                array = array.sum(axis=axis)
+        return array
+
+    def get_counts(self, select=None):
+        """
+        Returns
+        -------
+        counts : ndarray
+            integer counts, of shape (n_masks,) + bin shape
+        """
+        return np.rint(self._reduce(self._counts.counts, select)).astype(np.int64)
+
+    def get_moment(self, p, name=None, select=None):
+        """
+        Returns
+        -------
+        moment : ndarray
+            sum of values**p (of quantity `name`) in each bin, of shape (n_masks,) + bin shape
+        """
+        if p == 0:
+            return self._reduce(self._counts.counts, select)
+        return self._reduce(self._sums[name][p-1].counts, select)
+
+    def get_mean(self, name=None, select=None):
+        """
+        Returns
+        -------
+        mean : ndarray
+            mean of quantity `name` in each bin (nan for empty bins)
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.get_moment(1, name, select) / self.get_moment(0, name, select)
+
+    def get_std(self, name=None, select=None):
+        """
+        Returns
+        -------
+        std : ndarray
+            (population) standard deviation of quantity `name` in each bin (nan for empty bins)
+        """
+        counts = self.get_moment(0, name, select)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.get_moment(1, name, select) / counts
+            var = self.get_moment(2, name, select) / counts - mean * mean
+        return np.sqrt(np.maximum(var, 0.0))
+
+    def get_opt_binpoints(self):
+        """
+        Returns
+        -------
+        binpoints : ndarray
+            `get_opt_binpoints` of each cut, of shape (n_masks, n_bins)
+        """
+        return np.array([get_opt_binpoints(N, sumM, sumM2, self.bins)
+                         for N, sumM, sumM2 in zip(self.get_counts(), self.get_moment(1), self.get_moment(2))])
 
 
 def generate_uniform_random_ra_dec_min_max(n, ra_min, ra_max, dec_min, dec_max):
@@ -136,6 +136,31 @@ def make_output_dir(root_output_dir):
     return output_dir
 
 
+def update_run_index(root_output_dir, output_dir, logger=None):
+    """
+    add a finished run to the run index used by the web interface (if available)
+    """
+    try:
+        from descqaweb.runindex import RunIndex
+    except ImportError:
+        return
+    try:
+        # update() adds this run, fills a new index from all run directories,
+        # and retries earlier runs whose indexing failed
+        errors = []
+        with RunIndex(make_path_absolute(root_output_dir)) as run_index:
+            run_index.update(errors=errors)
+        for run_name, error in errors:
+            if logger:
+                logger.warning('Failed to index run %s: %s', run_name, error)
+        # every user who runs descqarun needs to write to the index (only its owner can chmod it)
+        if os.stat(run_index.path).st_uid == os.getuid():
+            subprocess.check_call(['chmod', 'a+r,g+w,o-w', run_index.path])
+    except Exception: #pylint: disable=W0703
+        if logger:
+            logger.warning('Failed to update the run index:\n%s', traceback.format_exc())
+
+
 def get_username():
     for k in ('LOGNAME', 'USER', 'LNAME', 'USERNAME'):
         user = os.getenv(k)
@@ -167,6 +192,8 @@ class DescqaTask(object):
     logfile_basename = 'traceback.log'
     config_basename = 'config.yaml'
     status_basename = 'STATUS'
+    manifest_basename = 'MANIFEST.jsonl'
+    manifest_version = 1
 
     def __init__(self, output_dir, validations_to_run, catalogs_to_run, logger):
         self.output_dir = output_dir
@@ -179,6 +206,8 @@ class DescqaTask(object):
 
         self._validation_instance_cache = dict()
         self._results = dict()
+        self._status_lines = dict()
+        self._timings = dict()
 
 
     @staticmethod
@@ -273,15 +302,19 @@ class DescqaTask(object):
 
         self._results[key] = (status, test_result)
 
+        if hasattr(test_result, 'status_full'):
+            lines = [test_result.status_full]
+        else:
+            lines = [status]
+            if getattr(test_result, 'summary', None):
+                lines.append(test_result.summary)
+            if getattr(test_result, 'score', None):
+                lines.append('{:.3g}'.format(test_result.score))
+        self._status_lines[key] = lines
+
         with open(pjoin(self.get_path(*key), self.status_basename), 'w') as f:
-            if hasattr(test_result, 'status_full'):
-                f.write(test_result.status_full + '\n')
-            else:
-                f.write(status + '\n')
-                if getattr(test_result, 'summary', None):
-                    f.write(test_result.summary + '\n')
-                if getattr(test_result, 'score', None):
-                    f.write('{:.3g}'.format(test_result.score) + '\n')
+            for line in lines:
+                f.write(line + '\n')
 
 
     def get_status(self, validation=None, catalog=None, return_test_result=False):
@@ -344,8 +377,10 @@ class DescqaTask(object):
                 self.logger.debug(msg)
 
                 test_result = None
+                t0 = time.time()
                 with CatchExceptionAndStdStream(logfile, self.logger, msg):
                     test_result = validation_instance.run_on_single_catalog(catalog_instance, catalog, output_dir_this)
+                self._timings[(validation, catalog)] = time.time() - t0
 
                 self.set_result(test_result or 'RUN_VALIDATION_TEST_ERROR', validation, catalog)
 
@@ -366,8 +401,59 @@ class DescqaTask(object):
             msg = 'concluding validation test `{}`'.format(validation)
             self.logger.debug(msg)
 
+            t0 = time.time()
             with CatchExceptionAndStdStream(logfile, self.logger, msg):
                 validation_instance.conclude_test(output_dir_this)
+            self._timings[(validation, None)] = time.time() - t0
+
+
+    def wait_for_figures(self):
+        """
+        wait for figures that are rendered in the background, and log rendering errors
+        """
+        plotting = importlib.import_module('descqa.plotting')
+        for filename, error in plotting.wait_for_figures():
+            msg = 'Failed to render figure {}:\n{}'.format(filename, error)
+            self.logger.error(msg)
+            logfile = pjoin(os.path.dirname(filename), self.logfile_basename)
+            if os.path.isdir(os.path.dirname(logfile)):
+                with open(logfile, 'a') as f:
+                    f.write(msg + '\n')
+
+
+    def iter_manifest_records(self):
+        for validation in self.validations_to_run:
+            for catalog in (None,) + tuple(self.catalogs_to_run):
+                path = self.get_path(validation, catalog)
+                files = []
+                for filename in sorted(os.listdir(path)):
+                    if os.path.isfile(pjoin(path, filename)):
+                        files.append([filename, os.path.getsize(pjoin(path, filename))])
+
+                record = collections.OrderedDict([('test', validation), ('catalog', catalog)])
+                if catalog is not None:
+                    lines = self._status_lines.get((validation, catalog), [])
+                    lines = (lines[0].splitlines() if len(lines) == 1 else lines) + ['']*3
+                    record['status'] = lines[0].strip().upper()
+                    record['summary'] = lines[1].strip()
+                    record['score'] = lines[2].strip()
+                record['files'] = files
+                record['run_time'] = self._timings.get((validation, catalog))
+                yield record
+
+
+    def write_manifest(self):
+        """
+        write status, summary, score, files (with sizes) and timing of every cell of this run
+        into a single JSON-lines file, so that the web interface does not need to read each cell directory
+        """
+        path = pjoin(self.output_dir, self.manifest_basename)
+        with CatchExceptionAndStdStream(None, self.logger, 'writing manifest'):
+            with open(path + '.tmp', 'w') as f:
+                f.write(json.dumps({'manifest_version': self.manifest_version}) + '\n')
+                for record in self.iter_manifest_records():
+                    f.write(json.dumps(record) + '\n')
+            os.rename(path + '.tmp', path)
 
 
     def run(self):
@@ -377,6 +463,7 @@ class DescqaTask(object):
         if all(self.get_validation_instance(validation) is None for validation in self.validations_to_run):
             self.logger.info('No valid validation tests. End program.')
             self.check_status()
+            self.write_manifest()
             return
 
         self.logger.debug('starting to run all validation tests...')
@@ -385,6 +472,10 @@ class DescqaTask(object):
 
         self.logger.debug('starting to conclude all validation tests...')
         self.conclude_tests()
+        self.wait_for_figures()
+
+        self.logger.debug('writing manifest...')
+        self.write_manifest()
 
 
 def main():
@@ -411,6 +502,13 @@ def main():
     parser.add_argument('-w', '--web-base-url', metavar='URL', default=config.base_url,
             help='Web interface base URL')
 
+    parser.add_argument('--plot-dpi', type=float,
+            help='Resolution of saved figures (e.g., lower it for nightly runs)')
+    parser.add_argument('--plot-formats', metavar='FORMAT', nargs='+',
+            help='Additional formats (e.g., pdf) to save figures in')
+    parser.add_argument('--plot-workers', type=int,
+            help='Number of processes to render figures in the background (default: 0, i.e., render inline)')
+
     args = parser.parse_args()
 
     logger = create_logger(verbose=args.verbose)
@@ -432,6 +530,8 @@ def main():
     global descqa #pylint: disable=W0601
     descqa = importlib.import_module('descqa')
 
+    importlib.import_module('descqa.plotting').configure_plotting(args.plot_dpi, args.plot_formats, args.plot_workers)
+
     record_version('DESCQA', descqa.__version__, master_status['versions'], logger=logger)
     record_version('GCRCatalogs', GCRCatalogs.__version__, master_status['versions'], logger=logger)
     if hasattr(GCRCatalogs, 'GCR'):
@@ -476,6 +576,7 @@ def main():
     finally:
         os.unlink(pjoin(output_dir, '.lock'))
         subprocess.check_call(['chmod', '-R', 'a+rX,o-w', output_dir])
+        update_run_index(args.root_output_dir, output_dir, logger)
         logger.info('Web output: %s?run=%s', args.web_base_url, os.path.basename(output_dir))
 
 
@@ -1,5 +1,5 @@
 """
 DESCQA Web Interface
 """
-from .main import run
+from .main import run, application
 __version__ = '2.1.0'
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 import html
-from .interface import iter_all_runs, DescqaRun
+from .interface import iter_all_runs, get_descqa_run
+from .runindex import get_run_index
 from . import config
 
 __all__ = ['prepare_bigtable']
@@ -65,11 +66,29 @@ def filter_search_results(descqa_run, search):
     return True
 
 
+def prepare_bigtable_from_index(run_index, page=1, months=3, search=None):
+    n_per_page = config.run_per_page
+    npages = ((run_index.count_runs(months, search) - 1) // n_per_page) + 1
+    if page > npages:
+        page = npages
+    return run_index.get_runs(months, search, offset=n_per_page*max(page-1, 0), limit=n_per_page), page, npages
+
+
 def prepare_bigtable(page=1, months=3, search=None):
+    run_index = get_run_index(config.root_dir)
+    if run_index is not None:
+        with run_index:
+            # finished runs newer than the newest indexed run (e.g., whose indexing failed) are only on disk
+            use_index = not run_index.get_unindexed_runs()
+            if use_index:
+                all_runs, page, npages = prepare_bigtable_from_index(run_index, page, months, search)
+        if use_index:
+            return format_bigtable(all_runs, page, npages, search)
+
     all_runs = list(iter_all_runs(config.root_dir, months_to_search=months))
     if search:
         all_runs = [descqa_run
-                    for descqa_run in (DescqaRun(run, config.root_dir, validated=True) for run in all_runs)
+                    for descqa_run in (get_descqa_run(run, config.root_dir, validated=True) for run in all_runs)
                     if filter_search_results(descqa_run, search)]
 
     n_per_page = config.run_per_page
@@ -79,8 +98,12 @@ def prepare_bigtable(page=1, months=3, search=None):
     all_runs = all_runs[n_per_page*(page-1):n_per_page*page]
 
     if not search:
-        all_runs = [DescqaRun(run, config.root_dir, validated=True) for run in all_runs]
+        all_runs = [get_descqa_run(run, config.root_dir, validated=True) for run in all_runs]
+
+    return format_bigtable(all_runs, page, npages, search)
+
 
+def format_bigtable(all_runs, page, npages, search):
     table_out = []
     table_out.append('<table class="bigboard" border="0" width="100%" cellspacing="0">')
     for run in all_runs:
@@ -23,3 +23,16 @@ The source code of DESCQA is hosted in <a href="https://github.com/LSSTDESC/desc
 '''
 
 use_latest_run_as_home = False
+
+# the matrix page is split into pages of this many tests (rows) and catalogs (columns); None for no limit
+matrix_tests_per_page = 60
+matrix_catalogs_per_page = 40
+# number of threads used to read the STATUS files of the matrix cells
+matrix_threads = 8
+
+# plots are served with "Cache-Control: max-age" of this many seconds
+image_max_age = 86400
+
+# if set, the left panel shows thumbnails of this width (in pixels; requires PIL),
+# which are cached in "_thumbnails" directories next to the plots
+thumbnail_width = None
@@ -0,0 +1,171 @@
+"""
+Score history of (test, catalog) pairs across runs, and regressions between runs,
+built on the run index (see `descqaweb.runindex`), which descqarun updates as runs complete.
+
+Command line usage:
+
+    python -m descqaweb.history ROOT_DIR history TEST [CATALOG] [--comment "full run"]
+    python -m descqaweb.history ROOT_DIR regressions [--run RUN] [--threshold X]
+"""
+from __future__ import unicode_literals, print_function
+import json
+import argparse
+import collections
+
+from .runindex import RunIndex, get_run_index
+from . import config
+
+__all__ = ['get_score_history', 'find_regressions', 'get_history_response', 'get_regressions_response']
+
+
+def _to_float(score):
+    try:
+        return float(score)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_score_history(run_index, test, catalog=None, comment=None):
+    """
+    Returns
+    -------
+    history : OrderedDict
+        catalog -> list of dict(run, date, comment, status, score, run_time), oldest run first
+    """
+    history = collections.OrderedDict()
+    for run, date, run_comment, catalog_this, status, score, run_time in run_index.get_item_history(test, catalog, comment):
+        history.setdefault(catalog_this, []).append(dict(
+            run=run,
+            date=date,
+            comment=run_comment,
+            status=status,
+            score=_to_float(score),
+            run_time=run_time,
+        ))
+    return history
+
+
+def find_regressions(run_index, run=None, reference=None, reference_comment='full run', threshold=0.0, higher_is_worse=True):
+    """
+    compare the scores and statuses of `run` (default: latest run) with those of `reference`
+    (default: latest run with `reference_comment` before `run`)
+
+    Returns
+    -------
+    run : str
+    reference : str
+    regressions : list of dict
+        (test, catalog, reference_status, status, reference_score, score, change) for every cell whose
+        score worsened by more than `threshold`, or whose status changed from passed to anything else
+    """
+    if run is None:
+        run = run_index.find_last_run()
+    if reference is None and run is not None:
+        reference = run_index.find_last_run(reference_comment, before=run)
+    if run is None or reference is None:
+        raise ValueError('Cannot find the run or the reference run to compare')
+
+    items_ref = run_index.get_items(reference)
+    regressions = []
+    for key, (status, _, score) in sorted(run_index.get_items(run).items()):
+        if key not in items_ref:
+            continue
+        status_ref, _, score_ref = items_ref[key]
+        score = _to_float(score)
+        score_ref = _to_float(score_ref)
+        change = None
+        if score is not None and score_ref is not None:
+            change = (score - score_ref) if higher_is_worse else (score_ref - score)
+        status_worsened = (status_ref or '').endswith('PASSED') and not (status or '').endswith('PASSED')
+        if status_worsened or (change is not None and change > threshold):
+            regressions.append(dict(
+                test=key[0],
+                catalog=key[1],
+                reference_status=status_ref,
+                status=status,
+                reference_score=score_ref,
+                score=score,
+                change=change,
+            ))
+    return run, reference, regressions
+
+
+def _json_response(data, status='200 OK'):
+    body = json.dumps(data, indent=1).encode('utf-8')
+    return status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))], body
+
+
+def _get_run_index_or_error():
+    run_index = get_run_index(config.root_dir)
+    if run_index is None:
+        return None, _json_response({'error': 'run index not available'}, '503 Service Unavailable')
+    return run_index, None
+
+
+def get_history_response(test, catalog=None, comment=None):
+    """
+    prepare the JSON response for the score history of `test` (and `catalog`)
+    """
+    run_index, error = _get_run_index_or_error()
+    if error:
+        return error
+    with run_index:
+        history = get_score_history(run_index, test, catalog, comment)
+    return _json_response({'test': test, 'history': history})
+
+
+def get_regressions_response(run=None, threshold=0.0, reference_comment='full run'):
+    """
+    prepare the JSON response for the regressions of `run` (default: latest run)
+    """
+    run_index, error = _get_run_index_or_error()
+    if error:
+        return error
+    try:
+        with run_index:
+            run, reference, regressions = find_regressions(run_index, run or None,
+                                                           reference_comment=reference_comment, threshold=threshold)
+    except ValueError as e:
+        return _json_response({'error': str(e)}, '404 Not Found')
+    return _json_response({'run': run, 'reference': reference, 'threshold': threshold, 'regressions': regressions})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score history and regressions of DESCQA runs (from the run index)')
+    parser.add_argument('root_dir', help='root output directory of DESCQA runs')
+    subparsers = parser.add_subparsers(dest='command')
+
+    parser_history = subparsers.add_parser('history', help='print the score history of a test')
+    parser_history.add_argument('test')
+    parser_history.add_argument('catalog', nargs='?')
+    parser_history.add_argument('--comment', help='only include runs with this comment (e.g. "full run")')
+
+    parser_regressions = subparsers.add_parser('regressions', help='list cells that got worse since the last full run')
+    parser_regressions.add_argument('--run', help='run to check (default: latest run)')
+    parser_regressions.add_argument('--reference', help='run to compare with (default: latest full run before RUN)')
+    parser_regressions.add_argument('--reference-comment', default='full run')
+    parser_regressions.add_argument('--threshold', type=float, default=0.0, help='minimal score change to report')
+    parser_regressions.add_argument('--lower-is-worse', action='store_true', help='a lower score is worse (default: higher is worse)')
+
+    args = parser.parse_args()
+
+    with RunIndex(args.root_dir, readonly=True) as run_index:
+        if args.command == 'history':
+            for catalog, rows in get_score_history(run_index, args.test, args.catalog, args.comment).items():
+                print('# {} / {}'.format(args.test, catalog))
+                for row in rows:
+                    print('{run:<16} {status:<28} {score!s:>10} {run_time!s:>10}'.format(**row))
+
+        elif args.command == 'regressions':
+            run, reference, regressions = find_regressions(run_index, args.run, args.reference, args.reference_comment,
+                                                           args.threshold, not args.lower_is_worse)
+            print('# {} compared with {}: {} regression(s)'.format(run, reference, len(regressions)))
+            for r in regressions:
+                print('{test:<32} {catalog:<32} {reference_status} -> {status}  {reference_score!s} -> {score!s}'.format(**r))
+
+        else:
+            parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,12 @@ import re
 import json
 import datetime
 import base64
+import threading
+import collections
 
-__all__ = ['b64encode', 'iter_all_runs', 'DescqaRun']
+__all__ = ['b64encode', 'iter_all_runs', 'DescqaRun', 'get_descqa_run']
 
-ALLOWED_EXT = {'txt', 'dat', 'csv', 'log', 'json', 'yaml', 'pdf', 'png', 'html'}
+ALLOWED_EXT = {'txt', 'dat', 'csv', 'log', 'json', 'yaml', 'pdf', 'png', 'html', 'npz'}
 STATUS_COLORS = {'PASSED': 'green', 'SKIPPED': 'gold', 'INSPECT': 'blue', 'FAILED': 'orangered', 'ERROR': 'darkred'}
 
 def b64encode(content):
@@ -38,7 +40,7 @@ class File(object):
 
 
 class DescqaItem(object):
-    def __init__(self, test, catalog, run, base_dir):
+    def __init__(self, test, catalog, run, base_dir, record=None):
         self.path = os.path.join(base_dir, run, test)
         self.relpath = os.path.join(os.path.basename(os.path.normpath(base_dir)), run, test)
         self.is_test_summary = True
@@ -57,16 +59,20 @@ class DescqaItem(object):
         self._score = None
         self._status_color = None
         self._files = None
+        self._record = record
 
     def _parse_status(self):
         if self.is_test_summary:
             return
 
-        try:
-            with open(os.path.join(self.path, 'STATUS')) as f:
-                lines = f.readlines()
-        except (OSError, IOError):
-            lines = []
+        if self._record is not None:
+            lines = [self._record.get(k) or '' for k in ('status', 'summary', 'score')]
+        else:
+            try:
+                with open(os.path.join(self.path, 'STATUS')) as f:
+                    lines = f.readlines()
+            except (OSError, IOError):
+                lines = []
 
         while len(lines) < 3:
             lines.append('')
@@ -107,8 +113,12 @@ class DescqaItem(object):
         return self._status_color
 
     def _get_files(self):
+        if self._record is not None:
+            filenames = sorted(f[0] for f in self._record.get('files', []))
+        else:
+            filenames = sorted((f for f in os.listdir(self.path) if os.path.isfile(os.path.join(self.path, f))))
         files = []
-        for item in sorted((f for f in os.listdir(self.path) if os.path.isfile(os.path.join(self.path, f)))):
+        for item in filenames:
             if item.rpartition('.')[-1].lower() in ALLOWED_EXT:
                 files.append(File(item, self.path, self.relpath))
         return tuple(files)
@@ -119,6 +129,13 @@ class DescqaItem(object):
             self._files = self._get_files()
         return self._files
 
+    @property
+    def run_time(self):
+        """
+        time (in seconds) to run the test on the catalog (or to conclude the test), if recorded in the manifest
+        """
+        return self._record.get('run_time') if self._record is not None else None
+
 
 def validate_descqa_run_name(run_name, sub_base_dir):
     path = os.path.join(sub_base_dir, run_name)
@@ -137,6 +154,8 @@ def validate_descqa_run_name(run_name, sub_base_dir):
 
 
 class DescqaRun(object):
+    manifest_basename = 'MANIFEST.jsonl'
+
     def __init__(self, run_name, base_dir, validated=False):
         if not run_name.startswith(os.path.basename(os.path.normpath(base_dir))):
             base_dir = os.path.join(base_dir, run_name.rpartition('-')[0])
@@ -151,16 +170,42 @@ class DescqaRun(object):
         self._test_prefixes = None
         self._catalog_prefixes = None
         self._status = None
+        self._manifest = None
         self._data = dict()
 
     @staticmethod
     def _find_subdirs(path):
         return tuple(sorted((d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d)) and os.access(os.path.join(path, d), os.R_OK + os.X_OK) and not d.startswith('_'))))
 
+    def _load_manifest(self):
+        """
+        read the per-run manifest written by descqarun (not available for older runs)
+        """
+        manifest = dict()
+        try:
+            with open(os.path.join(self.path, self.manifest_basename)) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if 'test' in record:
+                        manifest[record['test'], record['catalog']] = record
+        except (IOError, OSError, ValueError):
+            return dict()
+        return manifest
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+        return self._manifest
+
     def _find_tests(self):
+        if self.manifest:
+            return tuple(sorted(set(test for test, _ in self.manifest)))
         return self._find_subdirs(self.path)
 
     def _find_catalogs(self):
+        if self.manifest:
+            return tuple(sorted(set(catalog for _, catalog in self.manifest if catalog is not None)))
         return self._find_subdirs(os.path.join(self.path, self.tests[0])) if len(self.tests) else tuple()
 
     @staticmethod
@@ -213,7 +258,7 @@ class DescqaRun(object):
                 test = key
                 catalog = None
             if test in self.tests and (catalog in self.catalogs or catalog is None):
-                self._data[key] = DescqaItem(test, catalog, self.name, self.base_dir)
+                self._data[key] = DescqaItem(test, catalog, self.name, self.base_dir, self.manifest.get((test, catalog)))
             else:
                 raise KeyError('(test, catalog) = {} does not exist'.format(key))
 
@@ -230,6 +275,34 @@ class DescqaRun(object):
         return self._status
 
 
+_run_cache = collections.OrderedDict()
+_run_cache_lock = threading.Lock()
+RUN_CACHE_SIZE = 64
+
+
+def get_descqa_run(run_name, base_dir, validated=False):
+    """
+    same as `DescqaRun(run_name, base_dir, validated)`, but keeps the most recently used
+    `RUN_CACHE_SIZE` runs (with their items) in memory, for long-running (WSGI) processes.
+    A cached run is discarded when the mtime of its directory changes.
+    """
+    descqa_run = DescqaRun(run_name, base_dir, validated)
+    try:
+        mtime = os.stat(descqa_run.path).st_mtime
+    except OSError:
+        return descqa_run
+
+    key = (run_name, base_dir)
+    with _run_cache_lock:
+        cached = _run_cache.pop(key, None)
+        if cached is not None and cached[0] == mtime:
+            descqa_run = cached[1]
+        _run_cache[key] = (mtime, descqa_run)
+        while len(_run_cache) > RUN_CACHE_SIZE:
+            _run_cache.popitem(last=False)
+    return descqa_run
+
+
 def iter_all_runs_unsorted(base_dir):
     for run_name in os.listdir(base_dir):
         run_key = validate_descqa_run_name(run_name, base_dir)
@@ -1,17 +1,24 @@
 from __future__ import print_function, unicode_literals
 import sys
-import cgi
 from jinja2 import Environment, PackageLoader
 
+try:
+    from urllib.parse import parse_qs
+except ImportError:
+    from urlparse import parse_qs
+
 from . import config
 from .bigtable import prepare_bigtable
-from .twopanels import prepare_leftpanel, print_file
+from .twopanels import prepare_leftpanel, get_file_response, get_image_response, print_response
 from .matrix import prepare_matrix
+from .history import get_history_response, get_regressions_response
 
-__all__ = ['run']
+__all__ = ['run', 'application']
 
 env = Environment(loader=PackageLoader('descqaweb', 'templates'))
 
+HTML_HEADERS = [('Content-Type', 'text/html; charset=utf-8')]
+
 
 def _convert_to_integer(value, default=0):
     try:
@@ -20,19 +27,49 @@ def _convert_to_integer(value, default=0):
         return default
 
 
-def run():
-    form = cgi.FieldStorage()
+def _convert_to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+class QueryForm(object):
+    """
+    minimal stand-in for `cgi.FieldStorage` (only `getfirst`) built from a query string
+    """
+    def __init__(self, query_string):
+        self._fields = parse_qs(query_string or '')
 
+    def getfirst(self, key, default=None):
+        values = self._fields.get(key)
+        return values[0] if values else default
+
+
+def get_data_response(form, environ=None):
+    """
+    return (status, headers, body) for non-HTML requests (files, images, JSON data), or None
+    """
+    if form.getfirst('image'):
+        return get_image_response(form.getfirst('image'), thumbnail=bool(form.getfirst('thumb')), environ=environ)
     if form.getfirst('file'):
-        print_file(form.getfirst('file'))
-        return
+        return get_file_response(form.getfirst('file'))
+    if form.getfirst('history'):
+        return get_history_response(form.getfirst('history'), form.getfirst('catalog'), form.getfirst('comment'))
+    if form.getfirst('regressions'):
+        run = form.getfirst('regressions')
+        threshold = _convert_to_float(form.getfirst('threshold'), 0.0)
+        return get_regressions_response(None if run == 'latest' else run, threshold)
 
-    print('Content-Type: text/html; charset=utf-8')
-    print()
-    sys.stdout.flush()
 
+def iter_page(form):
+    """
+    yield the HTML page for the request in `form` in chunks, so that the
+    "please wait" header (and the first rows of the matrix) can be sent
+    before the slow part is prepared
+    """
     if form.getfirst('header'):
-        print(env.get_template('header.html').render(full_header=True, header_page=True, config=config))
+        yield env.get_template('header.html').render(full_header=True, header_page=True, config=config) + '\n'
         return
 
     _run = form.getfirst('run', '')
@@ -41,9 +78,8 @@ def run():
         page = _convert_to_integer(form.getfirst('page'), 1)
         months = _convert_to_integer(form.getfirst('months'), config.months_to_search)
         search = {item: form.getfirst(item) for item in ('users', 'tests', 'catalogs') if form.getfirst(item)}
-        print(env.get_template('header.html').render(full_header=True, please_wait=True, config=config))
-        sys.stdout.flush()
-        print(env.get_template('bigtable.html').render(**prepare_bigtable(page, months, search)))
+        yield env.get_template('header.html').render(full_header=True, please_wait=True, config=config) + '\n'
+        yield env.get_template('bigtable.html').render(**prepare_bigtable(page, months, search)) + '\n'
         return
 
     elif _run:
@@ -52,20 +88,70 @@ def run():
 
         if catalog or test:
             if form.getfirst('left'):
-                print(env.get_template('header.html').render(please_wait=True, config=config))
-                sys.stdout.flush()
-                print(env.get_template('leftpanel.html').render(**prepare_leftpanel(_run, test, catalog)))
+                yield env.get_template('header.html').render(please_wait=True, config=config) + '\n'
+                yield env.get_template('leftpanel.html').render(**prepare_leftpanel(_run, test, catalog)) + '\n'
             else:
-                print(env.get_template('twopanels.html').render(run=_run, catalog=catalog, test=test, right=form.getfirst('right')))
+                yield env.get_template('twopanels.html').render(run=_run, catalog=catalog, test=test, right=form.getfirst('right')) + '\n'
             return
 
-    print(env.get_template('header.html').render(full_header=True, please_wait=True, config=config))
-    sys.stdout.flush()
+    yield env.get_template('header.html').render(full_header=True, please_wait=True, config=config) + '\n'
     if _run or getattr(config, 'use_latest_run_as_home', True):
-        print(env.get_template('matrix.html').render(**prepare_matrix(
+        stream = env.get_template('matrix.html').stream(**prepare_matrix(
             run=_run,
             catalog_prefix=form.getfirst('catalog_prefix'),
             test_prefix=form.getfirst('test_prefix'),
-        )))
+            test_page=_convert_to_integer(form.getfirst('test_page'), 1),
+            catalog_page=_convert_to_integer(form.getfirst('catalog_page'), 1),
+        ))
+        stream.enable_buffering(20)
+        for chunk in stream:
+            yield chunk
+        yield '\n'
     else:
-        print(env.get_template('home.html').render(general_info=config.general_info))
+        yield env.get_template('home.html').render(general_info=config.general_info) + '\n'
+
+
+def run():
+    """
+    CGI entry point (see index.cgi)
+    """
+    import cgi
+    form = cgi.FieldStorage()
+
+    response = get_data_response(form)
+    if response is not None:
+        print_response(*response)
+        return
+
+    print('Content-Type: text/html; charset=utf-8')
+    print()
+    sys.stdout.flush()
+
+    for chunk in iter_page(form):
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+
+
+def application(environ, start_response):
+    """
+    WSGI entry point (see index.wsgi). Unlike the CGI entry point, the template
+    environment and the recently used runs stay in memory between requests.
+    """
+    form = QueryForm(environ.get('QUERY_STRING'))
+
+    response = get_data_response(form, environ)
+    if response is None:
+        start_response('200 OK', list(HTML_HEADERS))
+        return (chunk.encode('utf-8') for chunk in iter_page(form))
+
+    status, headers, body = response
+    start_response(str(status), [(str(k), str(v)) for k, v in headers])
+    return [body]
+
+
+def serve(host='localhost', port=8000):
+    """
+    serve `application` with the reference WSGI server (for testing only)
+    """
+    from wsgiref.simple_server import make_server
+    make_server(host, port, application).serve_forever()
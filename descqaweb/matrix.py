@@ -1,16 +1,27 @@
 from __future__ import unicode_literals
 import time
 import html
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 from . import config
-from .interface import iter_all_runs, DescqaRun
+from .interface import iter_all_runs, get_descqa_run
+from .runindex import get_run_index
 
 __all__ = ['prepare_matrix']
 
 
 def find_last_descqa_run():
+    run_index = get_run_index(config.root_dir)
+    if run_index is not None:
+        with run_index:
+            # finished runs newer than the newest indexed run (e.g., whose indexing failed) are only on disk
+            run = None if run_index.get_unindexed_runs() else (run_index.find_last_run('full run') or run_index.find_last_run())
+        if run is not None:
+            return get_descqa_run(run, config.root_dir, validated=True)
+
     last_run = None
     for run in iter_all_runs(config.root_dir):
-        descqa_run = DescqaRun(run, config.root_dir, validated=True)
+        descqa_run = get_descqa_run(run, config.root_dir, validated=True)
         if last_run is None:
             last_run = descqa_run
         if descqa_run.status.get('comment', '').strip().lower() == 'full run':
@@ -45,11 +56,75 @@ def get_short_status(status):
     return short_status
 
 
-def prepare_matrix(run=None, catalog_prefix=None, test_prefix=None):
+def format_page_links(run, test_prefix, catalog_prefix, test_page, catalog_page, istest, npages):
+    if npages <= 1:
+        return ''
+    current = test_page if istest else catalog_page
+    links = []
+    for page in range(1, npages+1):
+        if page == current:
+            links.append('<span style="color:gray">{}</span>'.format(page))
+            continue
+        query = ['run={}'.format(quote(run))]
+        if test_prefix:
+            query.append('test_prefix={}'.format(quote(test_prefix)))
+        if catalog_prefix:
+            query.append('catalog_prefix={}'.format(quote(catalog_prefix)))
+        query.append('test_page={}'.format(page if istest else test_page))
+        query.append('catalog_page={}'.format(catalog_page if istest else page))
+        links.append('<a href="?{}">{}</a>'.format(html.escape('&'.join(query)), page))
+    return '[&nbsp;{} page: {}&nbsp;]<br>'.format('Test' if istest else 'Catalog', '&nbsp;|&nbsp;'.join(links))
+
+
+def paginate(things, page, per_page):
+    """
+    return the things on `page` (1-based; clipped to the valid range), the page, and the number of pages
+    """
+    if not per_page:
+        return things, 1, 1
+    npages = max((len(things) - 1) // per_page + 1, 1)
+    page = min(max(page, 1), npages)
+    return things[per_page*(page-1):per_page*page], page, npages
+
+
+def _load_item_status(item):
+    item.status #pylint: disable=pointless-statement
+    return item
+
+
+def iter_matrix_rows(descqa_run, tests, catalogs):
+    """
+    yield the rows of the matrix (as HTML) one at a time;
+    the STATUS files of the cells are read concurrently.
+    """
+    row = ['<tr><td>&nbsp;</td>']
+    for catalog in catalogs:
+        row.append('<td><a href="?run={1}&catalog={0}">{0}</a></td>'.format(catalog, descqa_run.name))
+    row.append('</tr>')
+    yield '\n'.join(row)
+
+    if not catalogs:
+        return
+
+    items = [descqa_run[test, catalog] for test in tests for catalog in catalogs]
+    with ThreadPoolExecutor(getattr(config, 'matrix_threads', 8)) as executor:
+        items = executor.map(_load_item_status, items)
+        for test in tests:
+            row = ['<tr>']
+            row.append('<td><a href="?run={0}&test={1}">{1}</a></td>'.format(descqa_run.name, test))
+            for catalog in catalogs:
+                item = next(items)
+                row.append('<td class="{}"><a class="celllink" href="?run={}&test={}&catalog={}">{}<br>{}</a></td>'.format(\
+                        item.status_color, descqa_run.name, test, catalog, get_short_status(item.status), item.score))
+            row.append('</tr>')
+            yield '\n'.join(row)
+
+
+def prepare_matrix(run=None, catalog_prefix=None, test_prefix=None, test_page=1, catalog_page=1):
 
     if run:
         try:
-            descqa_run = DescqaRun(run, config.root_dir)
+            descqa_run = get_descqa_run(run, config.root_dir)
         except AssertionError:
             raise ValueError('Invalid run "{}"'.format(run))
     else:
@@ -78,7 +153,14 @@ def prepare_matrix(run=None, catalog_prefix=None, test_prefix=None):
             for p in ('',) + descqa_run.catalog_prefixes))
     data['catalog_links'] = '[&nbsp;Catalog prefix: {}&nbsp;]'.format(links)
 
-    catalogs_this = descqa_run.get_catalogs(catalog_prefix)
+    catalogs_this, catalog_page, catalog_npages = paginate(descqa_run.get_catalogs(catalog_prefix), catalog_page,
+                                                          getattr(config, 'matrix_catalogs_per_page', None))
+    tests_this, test_page, test_npages = paginate(descqa_run.get_tests(test_prefix), test_page,
+                                                  getattr(config, 'matrix_tests_per_page', None))
+    data['page_links'] = ''.join((
+        format_page_links(descqa_run.name, test_prefix, catalog_prefix, test_page, catalog_page, True, test_npages),
+        format_page_links(descqa_run.name, test_prefix, catalog_prefix, test_page, catalog_page, False, catalog_npages),
+    ))
 
     table_width = len(catalogs_this)*120 + 200
     if table_width > 1280:
@@ -86,20 +168,8 @@ def prepare_matrix(run=None, catalog_prefix=None, test_prefix=None):
     else:
         data['table_width'] = "{}px".format(table_width)
 
-    matrix = list()
-    matrix.append('<tr><td>&nbsp;</td>')
-    for catalog in catalogs_this:
-        matrix.append('<td><a href="?run={1}&catalog={0}">{0}</a></td>'.format(catalog, descqa_run.name))
-    matrix.append('</tr>')
-    for test in descqa_run.get_tests(test_prefix, True):
-        matrix.append('<tr>')
-        matrix.append('<td><a href="?run={0}&test={1}">{1}</a></td>'.format(descqa_run.name, test))
-        for catalog in catalogs_this:
-            item = descqa_run[test, catalog]
-            matrix.append('<td class="{}"><a class="celllink" href="?run={}&test={}&catalog={}">{}<br>{}</a></td>'.format(\
-                    item.status_color, descqa_run.name, test, catalog, get_short_status(item.status), item.score))
-        matrix.append('</tr>')
-    data['matrix'] = '\n'.join(matrix)
+    # rows are rendered lazily, so that the page can be streamed while STATUS files are being read
+    data['matrix'] = iter_matrix_rows(descqa_run, tests_this, catalogs_this)
 
     for type_this in ('Validation', 'Catalog'):
         key = '{}_description'.format(type_this.lower())
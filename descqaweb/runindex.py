@@ -0,0 +1,398 @@
+"""
+SQLite index of DESCQA runs (run info, per-cell statuses and file lists),
+so that the web interface does not need to walk and stat all run directories.
+
+The index lives in the root output directory. `descqarun` adds each run to it
+when the run finishes (and fills it from the existing run directories the first
+time); to (re)build it by hand, use
+
+    python -m descqaweb.runindex [--rebuild] ROOT_DIR
+
+The index file is made group-writable by the user who creates it, so that all
+users of the (group-shared) root output directory can update it; SQLite also
+needs to create its journal file in the root output directory, which therefore
+has to be group-writable too.
+
+The web interface only uses an index that has been filled from all run directories
+and has the current schema version, and falls back to the run directories when
+there are finished runs newer than the newest indexed run.
+"""
+from __future__ import unicode_literals, print_function
+import os
+import json
+import time
+import sqlite3
+import argparse
+
+from .interface import DescqaRun, iter_all_runs, validate_descqa_run_name
+
+__all__ = ['INDEX_FILENAME', 'SCHEMA_VERSION', 'RunIndex', 'IndexedRun', 'get_run_index']
+
+INDEX_FILENAME = 'descqa_run_index.sqlite'
+
+# stored as PRAGMA user_version; version 2 added items.run_time
+SCHEMA_VERSION = 2
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS runs (
+    name TEXT PRIMARY KEY,
+    month TEXT NOT NULL,
+    date TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    user TEXT,
+    comment TEXT,
+    start_time REAL,
+    end_time REAL,
+    status TEXT,
+    indexed_at REAL
+);
+CREATE INDEX IF NOT EXISTS runs_order ON runs (date DESC, seq DESC);
+CREATE INDEX IF NOT EXISTS runs_month ON runs (month);
+CREATE INDEX IF NOT EXISTS runs_user ON runs (user);
+
+CREATE TABLE IF NOT EXISTS items (
+    run TEXT NOT NULL,
+    test TEXT NOT NULL,
+    catalog TEXT NOT NULL,
+    status TEXT,
+    summary TEXT,
+    score TEXT,
+    run_time REAL,
+    PRIMARY KEY (run, test, catalog)
+);
+CREATE INDEX IF NOT EXISTS items_test ON items (test, catalog);
+CREATE INDEX IF NOT EXISTS items_catalog ON items (catalog);
+
+CREATE TABLE IF NOT EXISTS files (
+    run TEXT NOT NULL,
+    test TEXT NOT NULL,
+    catalog TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    PRIMARY KEY (run, test, catalog, filename)
+);
+'''
+
+
+class IndexedRun(object):
+    """
+    lightweight stand-in for `DescqaRun` (name, status, tests, catalogs) built from the index
+    """
+    def __init__(self, name, status, tests, catalogs):
+        self.name = name
+        self.status = status
+        self.tests = tests
+        self.catalogs = catalogs
+
+
+class RunIndex(object):
+    """
+    SQLite index of the runs in `root_dir`
+
+    Parameters
+    ----------
+    root_dir : str
+        root output directory of DESCQA runs (contains the month directories)
+    path : str, optional
+        path of the index file (default: `root_dir`/`INDEX_FILENAME`)
+    readonly : bool, optional
+        open the index in read-only mode (the file must exist)
+    """
+    def __init__(self, root_dir, path=None, readonly=False):
+        self.root_dir = root_dir
+        self.path = path or os.path.join(root_dir, INDEX_FILENAME)
+        if readonly:
+            if not os.path.isfile(self.path):
+                raise IOError('No run index at {}'.format(self.path))
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.execute('PRAGMA query_only = 1')
+        else:
+            self._conn = sqlite3.connect(self.path, timeout=30)
+            self._conn.executescript(_SCHEMA)
+            self._migrate()
+            self._conn.commit()
+
+    @property
+    def schema_version(self):
+        return self._conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def _migrate(self):
+        """
+        bring an index written by an older version up to `SCHEMA_VERSION`
+        """
+        if self.schema_version >= SCHEMA_VERSION:
+            return
+        columns = set(row[1] for row in self._conn.execute('PRAGMA table_info(items)'))
+        if 'run_time' not in columns:
+            self._conn.execute('ALTER TABLE items ADD COLUMN run_time REAL')
+        self._conn.execute('PRAGMA user_version = {:d}'.format(SCHEMA_VERSION))
+
+    def is_complete(self):
+        """
+        whether the index has been filled from all run directories (by `update`)
+        """
+        row = self._conn.execute('SELECT value FROM meta WHERE key = \'complete\'').fetchone()
+        return bool(row and row[0] == '1')
+
+    def is_usable(self):
+        """
+        whether the index can be used instead of the run directories
+        """
+        try:
+            return self.schema_version == SCHEMA_VERSION and self.is_complete()
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def add_run(self, run_name):
+        """
+        (re)index a finished run from its directory
+        """
+        run_key = validate_descqa_run_name(run_name, os.path.join(self.root_dir, run_name.rpartition('-')[0]))
+        if run_key is None:
+            raise ValueError('Invalid or unfinished run "{}"'.format(run_name))
+        descqa_run = DescqaRun(run_name, self.root_dir, validated=True)
+        status = descqa_run.status
+
+        run_row = (
+            run_name,
+            run_name.rpartition('-')[0],
+            run_key.strftime('%Y-%m-%d'),
+            run_key.microsecond,
+            status.get('user'),
+            status.get('comment', ''),
+            status.get('start_time'),
+            status.get('end_time'),
+            json.dumps(status),
+            time.time(),
+        )
+
+        item_rows = []
+        file_rows = []
+        for test in descqa_run.tests:
+            for catalog in (None,) + descqa_run.catalogs:
+                item = descqa_run[test, catalog]
+                if catalog is None:
+                    item_rows.append((run_name, test, '', None, None, None, item.run_time))
+                else:
+                    item_rows.append((run_name, test, catalog, item.status, item.summary, item.score, item.run_time))
+                file_rows.extend(((run_name, test, catalog or '', f.filename) for f in item.files))
+
+        with self._conn:
+            self._delete_run(run_name)
+            self._conn.execute('INSERT INTO runs VALUES (?,?,?,?,?,?,?,?,?,?)', run_row)
+            self._conn.executemany('INSERT INTO items VALUES (?,?,?,?,?,?,?)', item_rows)
+            self._conn.executemany('INSERT INTO files VALUES (?,?,?,?)', file_rows)
+
+    def _delete_run(self, run_name):
+        for table, column in (('runs', 'name'), ('items', 'run'), ('files', 'run')):
+            self._conn.execute('DELETE FROM {} WHERE {} = ?'.format(table, column), (run_name,))
+
+    def remove_run(self, run_name):
+        with self._conn:
+            self._delete_run(run_name)
+
+    def update(self, rebuild=False, errors=None):
+        """
+        index all finished runs in `root_dir` that are not yet in the index
+        (or all of them if `rebuild` is set), and drop runs that no longer exist.
+        If `errors` is a list, runs that cannot be indexed are skipped and
+        (run_name, exception) is appended to it; otherwise the exception is raised.
+
+        Returns
+        -------
+        n_added : int
+        """
+        indexed = set() if rebuild else self.get_run_names()
+        existing = set()
+        n_added = 0
+        for run_name in iter_all_runs(self.root_dir):
+            existing.add(run_name)
+            if run_name not in indexed:
+                try:
+                    self.add_run(run_name)
+                except Exception as e: #pylint: disable=W0703
+                    if errors is None:
+                        raise
+                    errors.append((run_name, e))
+                    continue
+                n_added += 1
+        for run_name in self.get_run_names() - existing:
+            self.remove_run(run_name)
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO meta VALUES (\'complete\', \'1\')')
+        return n_added
+
+    def get_run_names(self):
+        return set(row[0] for row in self._conn.execute('SELECT name FROM runs'))
+
+    def has_run(self, run_name):
+        return self._conn.execute('SELECT 1 FROM runs WHERE name = ?', (run_name,)).fetchone() is not None
+
+    def get_unindexed_runs(self):
+        """
+        Returns
+        -------
+        run_names : list of str
+            finished runs in `root_dir` that are newer than the newest indexed run, newest first
+            (e.g., runs whose indexing failed)
+        """
+        run_names = []
+        for run_name in iter_all_runs(self.root_dir):
+            if self.has_run(run_name):
+                break
+            run_names.append(run_name)
+        return run_names
+
+    @staticmethod
+    def _build_where(months=None, search=None):
+        clauses = []
+        params = []
+        if months is not None:
+            clauses.append('month IN (SELECT DISTINCT month FROM runs ORDER BY month DESC LIMIT ?)')
+            params.append(int(months))
+        search = search or {}
+        if search.get('users'):
+            users = search['users'].split()
+            clauses.append('user IN ({})'.format(','.join('?'*len(users))))
+            params.extend(users)
+        for key, column in (('tests', 'test'), ('catalogs', 'catalog')):
+            for prefix in (search.get(key) or '').split():
+                clauses.append('EXISTS (SELECT 1 FROM items WHERE items.run = runs.name AND items.catalog != \'\' '
+                               'AND substr(items.{0}, 1, ?) = ?)'.format(column))
+                params.extend((len(prefix), prefix))
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def count_runs(self, months=None, search=None):
+        where, params = self._build_where(months, search)
+        return self._conn.execute('SELECT COUNT(*) FROM runs' + where, params).fetchone()[0]
+
+    def get_runs(self, months=None, search=None, offset=0, limit=None):
+        """
+        Returns
+        -------
+        runs : list of IndexedRun
+            runs matching `months` and `search` (same meaning as in `prepare_bigtable`), newest first
+        """
+        where, params = self._build_where(months, search)
+        query = 'SELECT name, status FROM runs{} ORDER BY date DESC, seq DESC LIMIT ? OFFSET ?'.format(where)
+        rows = self._conn.execute(query, params + [-1 if limit is None else int(limit), int(offset)]).fetchall()
+
+        output = []
+        for name, status in rows:
+            tests, catalogs = self.get_tests_and_catalogs(name)
+            output.append(IndexedRun(name, json.loads(status or '{}'), tests, catalogs))
+        return output
+
+    def get_tests_and_catalogs(self, run_name):
+        tests = tuple(row[0] for row in self._conn.execute(
+            'SELECT DISTINCT test FROM items WHERE run = ? ORDER BY test', (run_name,)))
+        catalogs = tuple(row[0] for row in self._conn.execute(
+            'SELECT DISTINCT catalog FROM items WHERE run = ? AND catalog != \'\' ORDER BY catalog', (run_name,)))
+        return tests, catalogs
+
+    def get_items(self, run_name):
+        """
+        Returns
+        -------
+        items : dict
+            (test, catalog) -> (status, summary, score) for all cells of the run
+        """
+        return {(test, catalog): (status, summary, score) for test, catalog, status, summary, score in self._conn.execute(
+            'SELECT test, catalog, status, summary, score FROM items WHERE run = ? AND catalog != \'\'', (run_name,))}
+
+    def get_files(self, run_name, test, catalog=None):
+        return tuple(row[0] for row in self._conn.execute(
+            'SELECT filename FROM files WHERE run = ? AND test = ? AND catalog = ? ORDER BY filename',
+            (run_name, test, catalog or '')))
+
+    def find_last_run(self, comment=None, before=None):
+        """
+        name of the latest run (with `comment`, case-insensitive, if given;
+        older than run `before`, if given), or None
+        """
+        clauses = []
+        params = []
+        if comment is not None:
+            clauses.append('lower(trim(comment)) = ?')
+            params.append(comment.strip().lower())
+        if before is not None:
+            clauses.append('(date < (SELECT date FROM runs WHERE name = ?) OR '
+                           '(date = (SELECT date FROM runs WHERE name = ?) AND seq < (SELECT seq FROM runs WHERE name = ?)))')
+            params.extend((before,)*3)
+        query = 'SELECT name FROM runs'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        row = self._conn.execute(query + ' ORDER BY date DESC, seq DESC LIMIT 1', params).fetchone()
+        return row[0] if row else None
+
+    def get_item_history(self, test, catalog=None, comment=None):
+        """
+        Returns
+        -------
+        rows : list of tuples
+            (run, date, comment, catalog, status, score, run_time) of `test` (and `catalog`, if given)
+            in all indexed runs (only those with `comment`, if given), oldest first
+        """
+        query = ('SELECT runs.name, runs.date, runs.comment, items.catalog, items.status, items.score, items.run_time '
+                 'FROM items JOIN runs ON runs.name = items.run WHERE items.test = ?')
+        params = [test]
+        if catalog is None:
+            query += ' AND items.catalog != \'\''
+        else:
+            query += ' AND items.catalog = ?'
+            params.append(catalog)
+        if comment is not None:
+            query += ' AND lower(trim(runs.comment)) = ?'
+            params.append(comment.strip().lower())
+        return self._conn.execute(query + ' ORDER BY runs.date, runs.seq, items.catalog', params).fetchall()
+
+
+def get_run_index(root_dir):
+    """
+    read-only RunIndex of `root_dir`, or None if there is no usable index
+    (missing, unreadable, not filled from all run directories, or with an old schema)
+    """
+    path = os.path.join(root_dir, INDEX_FILENAME)
+    if not os.path.isfile(path):
+        return None
+    try:
+        run_index = RunIndex(root_dir, path, readonly=True)
+    except (sqlite3.Error, IOError):
+        return None
+    if not run_index.is_usable():
+        run_index.close()
+        return None
+    return run_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update (or rebuild) the DESCQA run index')
+    parser.add_argument('root_dir', help='root output directory of DESCQA runs')
+    parser.add_argument('--rebuild', action='store_true', help='re-index all runs')
+    parser.add_argument('--run', dest='runs', metavar='RUN', nargs='+', help='(re)index only these runs')
+    args = parser.parse_args()
+
+    with RunIndex(args.root_dir) as run_index:
+        if args.runs:
+            for run_name in args.runs:
+                run_index.add_run(run_name)
+            print('Indexed {} run(s)'.format(len(args.runs)))
+        else:
+            print('Indexed {} run(s)'.format(run_index.update(args.rebuild)))
+
+
+if __name__ == '__main__':
+    main()
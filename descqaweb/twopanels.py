@@ -1,15 +1,29 @@
 from __future__ import unicode_literals, print_function
 import os
 import sys
+from email.utils import formatdate, parsedate_tz, mktime_tz
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+try:
+    from html import escape
+except ImportError:
+    from cgi import escape
+
 from . import config
-from .interface import DescqaRun, b64encode
+from .interface import get_descqa_run
+
+__all__ = ['prepare_leftpanel', 'print_file', 'print_image', 'get_file_response', 'get_image_response']
 
-__all__ = ['prepare_leftpanel', 'print_file']
+IMAGE_TYPES = {'png': 'image/png', 'gif': 'image/gif', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg'}
 
 def prepare_leftpanel(run, test=None, catalog=None, right=None):
 
     try:
-        descqa_run = DescqaRun(run, config.root_dir)
+        descqa_run = get_descqa_run(run, config.root_dir)
     except AssertionError:
         raise ValueError('Invalid run "{}"'.format(run))
 
@@ -25,18 +39,15 @@ def prepare_leftpanel(run, test=None, catalog=None, right=None):
     data['test'] = test
     data['catalog'] = catalog
     data['right'] = right
+    data['thumbnail'] = bool(getattr(config, 'thumbnail_width', None))
 
     if test:
         data['group'] = [descqa_run[test, c] for c in descqa_run.catalogs]
-        for item in data['group']:
-            item.name = item.catalog
         data['summary'] = descqa_run[test]
         data['title'] = test
         data['is_group_by_catalog'] = False
     else:
         data['group'] = [descqa_run[t, catalog] for t in descqa_run.tests]
-        for item in data['group']:
-            item.name = item.test
         data['title'] = catalog
         data['summary'] = None
         data['is_group_by_catalog'] = True
@@ -44,53 +55,171 @@ def prepare_leftpanel(run, test=None, catalog=None, right=None):
     return data
 
 
-def print_file(target_file, root_dir=config.root_dir):
+def get_file_path(target_file, root_dir=config.root_dir):
+    """
+    return the absolute path of `target_file`, or raise ValueError if it is outside `root_dir`
+    or contains ".." components
+    """
+    if '..' in target_file.replace(os.sep, '/').split('/'):
+        raise ValueError('{} contains ".."'.format(target_file))
+    root_dir = os.path.realpath(root_dir)
+    path = os.path.realpath(os.path.join(root_dir, target_file))
+    if not path.startswith(os.path.join(root_dir, '')):
+        raise ValueError('{} is not within the output directory'.format(target_file))
+    return path
+
+
+def get_thumbnail_path(path, width):
+    """
+    return the path of a thumbnail of image `path` with `width` pixels,
+    which is generated and cached in a "_thumbnails" directory next to the image.
+    Return `path` itself if the thumbnail cannot be made (e.g., PIL not installed or no write permission).
+    """
+    dir_path, filename = os.path.split(path)
+    thumb_path = os.path.join(dir_path, '_thumbnails', 'w{}'.format(int(width)), filename)
+    try:
+        if os.path.getmtime(thumb_path) >= os.path.getmtime(path):
+            return thumb_path
+    except OSError:
+        pass
+
     try:
-        assert (not os.path.isabs(target_file)) or target_file.startswith(root_dir)
+        from PIL import Image
+        img = Image.open(path)
+        if img.width <= width:
+            return path
+        img.thumbnail((int(width), img.height))
+        if not os.path.isdir(os.path.dirname(thumb_path)):
+            os.makedirs(os.path.dirname(thumb_path))
+        tmp_path = '{}.{}.tmp'.format(thumb_path, os.getpid())
+        img.save(tmp_path, format=img.format)
+        os.rename(tmp_path, thumb_path)
+    except (ImportError, OSError, IOError, ValueError):
+        return path
+    return thumb_path
+
+
+def is_not_modified(etag, mtime, environ=None):
+    """
+    check the conditional request headers against the `etag` and `mtime` of the requested file
+    """
+    if environ is None:
+        environ = os.environ
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*'
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since:
+        t = parsedate_tz(if_modified_since)
+        return t is not None and int(mtime) <= mktime_tz(t)
+    return False
+
 
-        with open(os.path.join(root_dir, target_file), 'rb') as f:
+def _error_response(target_file, status='404 Not Found'):
+    body = '[Error] Cannot open/read file {}\n'.format(target_file).encode('utf-8')
+    return status, [('Content-Type', 'text/plain; charset=utf-8'), ('X-Content-Type-Options', 'nosniff'),
+                    ('Content-Length', str(len(body)))], body
+
+
+def get_image_response(target_file, thumbnail=False, environ=None, root_dir=config.root_dir):
+    """
+    prepare the response for an image file, with caching headers (or "304 Not Modified")
+
+    Returns
+    -------
+    status : str
+    headers : list of (str, str)
+    body : bytes
+    """
+    content_type = IMAGE_TYPES.get(target_file.rpartition('.')[-1].lower())
+    try:
+        if content_type is None:
+            raise ValueError('{} is not an image'.format(target_file))
+        path = get_file_path(target_file, root_dir)
+        if thumbnail and getattr(config, 'thumbnail_width', None):
+            path = get_thumbnail_path(path, config.thumbnail_width)
+        stat = os.stat(path)
+    except (OSError, IOError, ValueError):
+        return _error_response(target_file)
+
+    etag = '"{:x}-{:x}{}"'.format(int(stat.st_mtime), stat.st_size, '-thumb' if thumbnail else '')
+    headers = [
+        ('ETag', etag),
+        ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+        ('Cache-Control', 'public, max-age={}'.format(getattr(config, 'image_max_age', 86400))),
+    ]
+    if is_not_modified(etag, stat.st_mtime, environ):
+        return '304 Not Modified', headers, b''
+
+    try:
+        with open(path, 'rb') as f:
             file_content = f.read()
+    except (OSError, IOError):
+        return _error_response(target_file)
+    headers.append(('Content-Type', content_type))
+    headers.append(('Content-Length', str(len(file_content))))
+    return '200 OK', headers, file_content
+
 
-    except (OSError, IOError, AssertionError):
-        print('Content-Type: text/plain; charset=utf-8')
-        print()
-        sys.stdout.flush()
-        print('[Error] Cannot open/read file {}'.format(target_file))
+def get_file_response(target_file, root_dir=config.root_dir):
+    """
+    prepare the response for an output file (PNG files are shown in an HTML page)
 
+    Returns
+    -------
+    status : str
+    headers : list of (str, str)
+    body : bytes
+    """
+    try:
+        path = get_file_path(target_file, root_dir)
+        with open(path, 'rb') as f:
+            file_content = f.read()
+    except (OSError, IOError, ValueError):
+        return _error_response(target_file, '200 OK')
+
+    filename = os.path.basename(target_file)
+    ext = filename.rpartition('.')[-1].lower()
+    headers = []
+    if ext == 'png':
+        headers.append(('Content-Type', 'text/html; charset=utf-8'))
+        image_link = escape('?image=' + quote(os.path.relpath(path, os.path.realpath(root_dir)).replace(os.sep, '/').encode('utf-8')), True)
+        file_content = '<!DOCTYPE html>\n<html><body>\n<img src="{}" width="100%">\n</body></html>\n'.format(image_link).encode('utf-8')
+    elif ext == 'pdf':
+        headers.append(('Content-Type', 'application/pdf'))
+        headers.append(('Content-Disposition', 'inline; filename="{}"'.format(filename)))
+    elif ext == 'html':
+        headers.append(('Content-Type', 'text/html; charset=utf-8'))
+    elif ext == 'npz':
+        headers.append(('Content-Type', 'application/octet-stream'))
+        headers.append(('Content-Disposition', 'attachment; filename="{}"'.format(filename)))
     else:
-        if target_file.lower().endswith('.png'):
-            print('Content-Type: text/html; charset=utf-8')
-            print()
-            sys.stdout.flush()
-            print('<!DOCTYPE html>')
-            print('<html><body>')
-            print('<img src="data:image/png;base64,{}" width="100%">'.format(b64encode(file_content)))
-            print('</body></html>')
-
-        elif target_file.lower().endswith('.pdf'):
-            print('Content-Type: application/pdf')
-            print('Content-Length: {}'.format(len(file_content)))
-            print('Content-Disposition: inline; filename="{}"'.format(os.path.basename(target_file)))
-            print()
-            sys.stdout.flush()
-            try:
-                sys.stdout.buffer.write(file_content)
-            except AttributeError:
-                print(file_content)
-
-        elif target_file.lower().endswith('.html'):
-            print('Content-Type: text/html; charset=utf-8')
-            file_content = file_content.decode('utf-8')
-            print('Content-Length: {}'.format(len(file_content)))
-            print()
-            sys.stdout.flush()
-            print(file_content)
-
-        else:
-            print('Content-Type: text/plain; charset=utf-8')
-            file_content = file_content.decode('utf-8')
-            print('Content-Length: {}'.format(len(file_content)))
-            print('Content-Disposition: inline; filename="{}"'.format(os.path.basename(target_file)))
-            print()
-            sys.stdout.flush()
-            print(file_content)
+        headers.append(('Content-Type', 'text/plain; charset=utf-8'))
+        headers.append(('Content-Disposition', 'inline; filename="{}"'.format(filename)))
+    headers.append(('Content-Length', str(len(file_content))))
+    return '200 OK', headers, file_content
+
+
+def print_response(status, headers, body):
+    """
+    write a response prepared by `get_image_response` or `get_file_response` to stdout (CGI)
+    """
+    if not status.startswith('200'):
+        print('Status: {}'.format(status))
+    for header in headers:
+        print('{}: {}'.format(*header))
+    print()
+    sys.stdout.flush()
+    try:
+        sys.stdout.buffer.write(body)
+        sys.stdout.buffer.flush()
+    except AttributeError:
+        sys.stdout.write(body)
+
+
+def print_image(target_file, thumbnail=False, root_dir=config.root_dir):
+    print_response(*get_image_response(target_file, thumbnail, root_dir=root_dir))
+
+
+def print_file(target_file, root_dir=config.root_dir):
+    print_response(*get_file_response(target_file, root_dir))
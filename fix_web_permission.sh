@@ -14,7 +14,7 @@ $PYTHON -E -c "import descqaweb"
 
 # chmod
 chmod o+r .htaccess
-chmod o+rx index.cgi .
+chmod o+rx index.cgi index.wsgi .
 chmod -R o+rX descqaweb web-static
 
 # end subshell
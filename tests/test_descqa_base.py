@@ -0,0 +1,55 @@
+"""
+Unit tests for result artifacts in descqa.base
+"""
+import os
+import numpy as np
+import pytest
+
+from descqa.base import BaseValidationTest, ResultArtifact, save_result_artifact
+
+
+def test_result_artifact(tmpdir):
+    test = BaseValidationTest()
+    for catalog in ('cat_a', 'cat_b'):
+        os.mkdir(os.path.join(str(tmpdir), catalog))
+        test.save_result_artifact(os.path.join(str(tmpdir), catalog),
+                                  {'r': np.arange(3.0), 'xi': np.ones(3)},
+                                  {'xi': np.eye(3)},
+                                  {'catalog': catalog})
+
+    artifacts = []
+    for catalog, artifact in test.iter_result_artifacts(str(tmpdir)):
+        assert artifact.metadata == {'catalog': catalog, 'test_class': 'BaseValidationTest'}
+        assert artifact.data_names == ['r', 'xi']
+        assert artifact.covariance_names == ['xi']
+        assert 'r' in artifact
+        assert (artifact['r'] == np.arange(3.0)).all()
+        assert (artifact.get_covariance('xi') == np.eye(3)).all()
+        artifacts.append(catalog)
+    assert artifacts == ['cat_a', 'cat_b']
+
+    with pytest.raises(ValueError):
+        save_result_artifact(os.path.join(str(tmpdir), 'bad.npz'), {}, {'xi': np.ones(3)})
+
+    np.savez(os.path.join(str(tmpdir), 'other.npz'), x=np.ones(3))
+    with pytest.raises(ValueError):
+        ResultArtifact(os.path.join(str(tmpdir), 'other.npz'))
+
+
+def test_conclude_test_from_artifacts(tmpdir):
+    from descqa.register import load_validation
+    test = load_validation('SMF_PRIMUS')
+    z_bins = [k for k in test.validation_data if k != 'label']
+    M = np.linspace(9.0, 12.0, 10)
+    for catalog, color in (('cat_a', 'r'), ('cat_b', 'b')):
+        os.mkdir(os.path.join(str(tmpdir), catalog))
+        data = {}
+        for n in range(len(z_bins)):
+            data['z{}/M'.format(n)] = M
+            data['z{}/phi'.format(n)] = 10**(-2.0 - 0.3*(M - 9.0))
+            data['z{}/phi_err'.format(n)] = 0.1 * data['z{}/phi'.format(n)]
+        test.save_result_artifact(os.path.join(str(tmpdir), catalog), data,
+                                  metadata={'catalog': catalog, 'z_bins': z_bins, 'color': color})
+
+    test.conclude_test(str(tmpdir))
+    assert os.path.isfile(os.path.join(str(tmpdir), 'summary.png'))
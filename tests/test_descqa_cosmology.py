@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from astropy.cosmology import WMAP7, LambdaCDM, FlatwCDM # pylint: disable=no-name-in-module
+from descqa.cosmology import cosmology_key, get_distance_table
+
+
+def test_distance_table():
+    z = np.concatenate(([0.0, 1.0e-4], np.random.rand(1000) * 5.0))
+    for cosmo in (WMAP7, LambdaCDM(70.0, 0.3, 0.6)):
+        distances = get_distance_table(cosmo)
+        assert distances is get_distance_table(cosmo)
+        for name in ('comoving_distance', 'comoving_transverse_distance',
+                     'angular_diameter_distance', 'luminosity_distance'):
+            assert np.allclose(getattr(distances, name)(z), getattr(cosmo, name)(z).to('Mpc').value, rtol=1e-8, atol=1e-8)
+        assert np.allclose(distances.H(z), cosmo.H(z).value, rtol=1e-8)
+        assert np.allclose(distances.redshift_at_comoving_distance(distances.comoving_distance(z)), z, rtol=1e-8, atol=1e-10)
+        z_outside = np.array([-0.01, 0.5, 25.0])
+        assert np.allclose(distances.comoving_distance(z_outside), cosmo.comoving_distance(z_outside).to('Mpc').value)
+        assert np.allclose(distances.H(z_outside), cosmo.H(z_outside).value)
+        assert np.isclose(distances.comoving_distance(-0.01), cosmo.comoving_distance(-0.01).to('Mpc').value)
+        assert np.isnan(distances.comoving_distance([0.5, np.nan])[1])
+        with pytest.raises(ValueError):
+            distances.redshift_at_comoving_distance([-10.0])
+
+
+def test_cosmology_key():
+    assert cosmology_key(FlatwCDM(70.0, 0.3, w0=-0.8)) == cosmology_key(FlatwCDM(70.0, 0.3, w0=-0.8))
+    assert cosmology_key(FlatwCDM(70.0, 0.3, w0=-0.8)) != cosmology_key(FlatwCDM(70.0, 0.3, w0=-1.2))
+    assert cosmology_key(FlatwCDM(70.0, 0.3, m_nu=0.06, Tcmb0=2.725)) != cosmology_key(FlatwCDM(70.0, 0.3, Tcmb0=2.725))
+
+
+def test_distance_table_wcdm():
+    z = np.random.rand(100) * 3.0
+    for w0 in (-0.8, -1.2):
+        cosmo = FlatwCDM(70.0, 0.3, w0=w0)
+        assert np.allclose(get_distance_table(cosmo).comoving_distance(z), cosmo.comoving_distance(z).to('Mpc').value, rtol=1e-8)
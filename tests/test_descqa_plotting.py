@@ -0,0 +1,42 @@
+"""
+Unit tests for descqa.plotting
+"""
+import os
+import subprocess
+import sys
+
+from descqa.plotting import plt, configure_plotting, save_figure, wait_for_figures
+
+
+def test_save_figure(tmpdir):
+    for n_workers in (0, 1):
+        configure_plotting(formats=['pdf'], n_workers=n_workers)
+        fig, ax = plt.subplots()
+        ax.plot([1, 2, 3])
+        filename = os.path.join(str(tmpdir), 'plot{}.png'.format(n_workers))
+        save_figure(fig, filename, tight_layout=True)
+        assert not wait_for_figures()
+        assert os.path.isfile(filename)
+        assert os.path.isfile(filename.replace('.png', '.pdf'))
+    configure_plotting(formats=[], n_workers=0)
+
+
+def test_configure_plotting_keeps_errors(tmpdir):
+    configure_plotting(n_workers=1)
+    fig, ax = plt.subplots()
+    ax.plot([1, 2, 3])
+    filename = os.path.join(str(tmpdir), 'missing', 'plot.png')
+    save_figure(fig, filename)
+    configure_plotting(n_workers=0)
+    errors = wait_for_figures()
+    assert len(errors) == 1 and errors[0][0] == filename
+
+
+def test_bad_environment_values():
+    env = dict(os.environ, DESCQA_PLOT_WORKERS='four', DESCQA_PLOT_DPI='high')
+    output = subprocess.check_output(
+        [sys.executable, '-c', 'import descqa.plotting as p; print(p._plot_config["n_workers"])'],
+        env=env, stderr=subprocess.STDOUT,
+    ).decode()
+    assert 'DESCQA_PLOT_WORKERS' in output and 'DESCQA_PLOT_DPI' in output
+    assert output.strip().endswith('0')
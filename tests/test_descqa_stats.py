@@ -0,0 +1,44 @@
+from __future__ import division
+import numpy as np
+from descqa.stats import count_dominated_points, kstest_2d, quantile_from_histogram, histogram_fraction_above
+
+
+def kstest_2d_brute_force(dist1, dist2):
+    KSstat = -np.inf
+    for edge in np.hstack((dist1, dist2)).T:
+        cdf = []
+        for x in (dist1, dist2):
+            cdf.append(np.array([np.sum((x[0] >= edge[0]) & (x[1] >= edge[1])),
+                                 np.sum((x[0] <= edge[0]) & (x[1] >= edge[1])),
+                                 np.sum((x[0] <= edge[0]) & (x[1] <= edge[1])),
+                                 np.sum((x[0] >= edge[0]) & (x[1] <= edge[1]))]) / x.shape[1])
+        KSstat = max(KSstat, np.abs(cdf[0] - cdf[1]).max())
+    return KSstat
+
+
+def test_count_dominated_points():
+    p = np.random.randint(10, size=(2, 500)).astype(float)
+    q = np.random.randint(12, size=(2, 200)).astype(float) - 1.0
+    expected = ((p[0] <= q[0][:, np.newaxis]) & (p[1] <= q[1][:, np.newaxis])).sum(axis=1)
+    assert (count_dominated_points(p[0], p[1], q[0], q[1]) == expected).all()
+
+
+def test_kstest_2d():
+    dist1 = np.random.randn(2, 400)
+    dist2 = np.random.randn(2, 300) * 1.2
+    dist2[:, :50] = np.round(dist2[:, :50], 1) # include ties
+    pvalue, KSstat = kstest_2d(dist1, dist2)
+    assert np.isclose(KSstat, kstest_2d_brute_force(dist1, dist2))
+    assert 0.0 <= pvalue <= 1.0
+
+
+def test_quantile_from_histogram():
+    x = np.random.randn(100000)
+    bins = np.linspace(-6, 6, 12001)
+    counts = sum(np.histogram(chunk, bins)[0] for chunk in np.array_split(x, 7))
+    for q in (0.1, 0.5, 0.8):
+        assert abs(quantile_from_histogram(counts, bins, q) - np.percentile(x, 100.0 * q)) < 2e-3
+
+    weights = histogram_fraction_above(bins, 0.0005)
+    assert np.isclose(weights[6000], 0.5)
+    assert (weights[6001:] == 1.0).all() and (weights[:6000] == 0.0).all()
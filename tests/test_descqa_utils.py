@@ -3,6 +3,7 @@ import numpy as np
 from scipy.stats import chi2
 import healpy as hp
 from descqa.utils import *
+from descqa.utils import generate_uniform_random_ra_dec_min_max
 
 
 def check_ra_dec_basic(ra, dec, n):
@@ -41,3 +42,127 @@ def test_generate_uniform_random_ra_dec_footprint():
     check_ra_dec_uniform(ra, dec, nside, footprint)
 
     assert (get_healpixel_footprint(ra, dec, nside) == footprint).all()
+
+
+def test_healpix_footprint_counts():
+    n = 10000
+    nside = 8
+    ra, dec = generate_uniform_random_ra_dec(n)
+
+    healpix_map = HealpixFootprint(nside)
+    for i in range(0, n, 3000):
+        healpix_map.add(ra[i:i+3000], dec[i:i+3000])
+
+    for nside_this in (nside, nside // 2):
+        for nest in (False, True):
+            pixels = hp.ang2pix(nside_this, ra, dec, nest=nest, lonlat=True)
+            expected = np.bincount(pixels, minlength=hp.nside2npix(nside_this))
+            assert (healpix_map.get_map(nside_this, nest) == expected).all()
+            assert (healpix_map.get_pixels(nside_this, nest, count_threshold=20) == np.flatnonzero(expected >= 20)).all()
+
+    assert np.isclose(healpix_map.get_sky_area(), 4.0 * np.pi * (180.0 / np.pi)**2)
+
+    merged = HealpixFootprint(nside).add(ra[:5000], dec[:5000]).merge(HealpixFootprint(nside).add(ra[5000:], dec[5000:]))
+    assert (merged.counts == healpix_map.counts).all()
+
+
+def test_healpix_footprint(tmpdir):
+    n = 10000
+    nside = 8
+    ra, dec = generate_uniform_random_ra_dec_min_max(n, 0, 90, -30, 30)
+
+    footprint = HealpixFootprint(nside)
+    for i in range(0, n, 3000):
+        footprint.add(ra[i:i+3000], dec[i:i+3000])
+
+    for nside_this in (nside, nside // 2):
+        for nest in (False, True):
+            expected = np.unique(hp.ang2pix(nside_this, ra, dec, nest=nest, lonlat=True))
+            assert (footprint.get_pixels(nside_this, nest) == expected).all()
+        assert np.isclose(footprint.get_sky_area(nside_this), expected.size * hp.nside2pixarea(nside_this, degrees=True))
+
+    filename = str(tmpdir.join('footprint.npz'))
+    footprint.save(filename)
+    assert (HealpixFootprint.load(filename).get_map() == footprint.get_map()).all()
+
+    rand_ra, rand_dec = footprint.generate_uniform_random_ra_dec(1000)
+    check_ra_dec_basic(rand_ra, rand_dec, 1000)
+    assert footprint.mask[hp.ang2pix(nside, rand_ra, rand_dec, nest=True, lonlat=True)].all()
+
+
+def test_streaming_histogram():
+    n = 20000
+    x = np.random.uniform(-0.1, 1.1, n)
+    y = 10**np.random.uniform(0, 3, n)
+    x[:100] = np.linspace(0, 1, 100) # values on the bin edges
+    x[100] = np.nan
+    group = np.random.randint(-1, 2, n)
+    bins = (np.linspace(0, 1, 34), np.logspace(0.5, 2.5, 7))
+
+    hist = StreamingHistogram(bins, n_groups=2)
+    for s in (slice(0, 7000), slice(7000, None)):
+        hist.add([x[s], y[s]], group=group[s])
+
+    for g in (0, 1):
+        mask = (group == g)
+        expected = np.histogramdd(np.stack((x[mask], y[mask])).T, bins)[0]
+        assert (hist.get_counts(g) == expected).all()
+    assert hist.get_counts().sum() == np.histogramdd(np.stack((x[group >= 0], y[group >= 0])).T, bins)[0].sum()
+
+
+def test_moment_histogram():
+    n = 10000
+    x = np.random.uniform(-0.5, 3.5, n)
+    bins = np.array([0.0, 0.5, 1.0, 2.0, 3.0])
+    masks = [x < 1.5, x > 0.8]
+
+    hist = MomentHistogram(bins, n_masks=2)
+    for s in (slice(0, 4000), slice(4000, None)):
+        hist.add(x[s], [m[s] for m in masks])
+
+    for i, mask in enumerate(masks):
+        x_this = x[mask]
+        assert (hist.get_counts()[i] == np.histogram(x_this, bins)[0]).all()
+        assert np.allclose(hist.get_moment(1)[i], np.histogram(x_this, bins, weights=x_this)[0])
+        assert np.allclose(hist.get_moment(2)[i], np.histogram(x_this, bins, weights=x_this**2)[0])
+
+    group = np.searchsorted([1.0, 2.0], x)
+    group[group == 2] = -1
+    hist = MomentHistogram(bins, n_masks=2, n_moments=1).add(x, group=group)
+    for i in range(2):
+        assert (hist.get_counts()[i] == np.histogram(x[group == i], bins)[0]).all()
+
+
+def test_moment_histogram_named_select():
+    from scipy.stats import binned_statistic
+    n = 20000
+    z = np.random.uniform(0, 2, n)
+    logL = np.random.uniform(8.5, 12, n)
+    size = np.random.lognormal(0, 1, n)
+    z_edges = np.array([0, 0.5, 1.0, 1.5, 2.0])
+    L_edges = np.array([9, 9.5, 10, 10.5, 11, 11.5])
+
+    stats = MomentHistogram([z_edges, L_edges], names=['size'])
+    for s in (slice(0, 7000), slice(7000, None)):
+        stats.add([z[s], logL[s]], data={'size': size[s]})
+
+    for select, mask in (((slice(1, 3),), (z >= 0.5) & (z < 1.5)), ((3,), z >= 1.5)):
+        for statistic, result in (('count', stats.get_counts(select)[0]),
+                                  ('mean', stats.get_mean('size', select)[0]),
+                                  ('std', stats.get_std('size', select)[0])):
+            expected = binned_statistic(logL[mask], size[mask], bins=L_edges, statistic=statistic)[0]
+            assert np.allclose(result, expected)
+    assert stats.get_counts().shape == (1, 4, 5)
+    assert stats.get_counts().sum() == ((logL >= 9) & (logL <= 11.5)).sum()
+
+
+def test_jackknife_regions():
+    ra, dec = generate_uniform_random_ra_dec_min_max(50000, 0, 40, -20, 20)
+    footprint = HealpixFootprint(64).add(ra, dec)
+    regions = get_jackknife_regions(footprint, 10)
+    assert get_jackknife_regions(footprint, 10) is regions
+
+    labels = regions.get_labels(ra, dec)
+    counts = np.bincount(labels, minlength=10)
+    assert counts.size == 10 and counts.min() > 0.5 * counts.mean()
+    assert (regions.get_labels([180.0], [60.0]) == -1).all()
@@ -0,0 +1,49 @@
+"""
+Unit tests for descqaweb.interface
+"""
+import os
+import json
+
+from descqaweb.interface import DescqaRun
+
+
+def test_manifest(tmpdir):
+    root_dir = str(tmpdir)
+    run_dir = os.path.join(root_dir, '2020-02', '2020-02-01')
+    records = [
+        {'test': 'smf', 'catalog': None, 'files': [['summary.png', 3]], 'run_time': 2.0},
+        {'test': 'smf', 'catalog': 'cat_a', 'status': 'VALIDATION_TEST_PASSED', 'summary': 'good', 'score': '0.5',
+         'files': [['STATUS', 10], ['plot.png', 3], ['traceback.log', 0]], 'run_time': 1.0},
+        {'test': 'smf', 'catalog': 'cat_b', 'status': 'RUN_VALIDATION_TEST_ERROR', 'summary': '', 'score': '',
+         'files': [['STATUS', 10]], 'run_time': 0.5},
+    ]
+    for record in records:
+        path = os.path.join(run_dir, record['test'], record['catalog'] or '')
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for filename, _ in record['files']:
+            open(os.path.join(path, filename), 'w').close()
+        if record['catalog']:
+            with open(os.path.join(path, 'STATUS'), 'w') as f:
+                f.write('\n'.join((record['status'], record['summary'], record['score'])))
+
+    def get_cells(descqa_run):
+        cells = [(descqa_run.tests, descqa_run.catalogs)]
+        for key in (('smf', 'cat_a'), ('smf', 'cat_b'), 'smf'):
+            item = descqa_run[key]
+            cells.append((item.status, item.summary, item.score, item.status_color, [f.filename for f in item.files]))
+        return cells
+
+    expected = get_cells(DescqaRun('2020-02-01', root_dir))
+    assert expected[1] == ('VALIDATION_TEST_PASSED', 'good', '0.5', 'green', ['plot.png', 'traceback.log'])
+
+    with open(os.path.join(run_dir, DescqaRun.manifest_basename), 'w') as f:
+        f.write(json.dumps({'manifest_version': 1}) + '\n')
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    for record in records:
+        os.remove(os.path.join(run_dir, record['test'], record['catalog'] or '', 'STATUS' if record['catalog'] else 'summary.png'))
+
+    descqa_run = DescqaRun('2020-02-01', root_dir)
+    assert len(descqa_run.manifest) == 3
+    assert get_cells(descqa_run) == expected
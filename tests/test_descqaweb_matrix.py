@@ -0,0 +1,10 @@
+"""
+Unit tests for descqaweb.matrix
+"""
+from descqaweb.matrix import format_page_links
+
+
+def test_format_page_links():
+    assert format_page_links('2018-01/2018-01-02', None, None, 1, 1, True, 1) == ''
+    links = format_page_links('2018-01/2018-01-02', 'a b&c', None, 1, 2, True, 2)
+    assert '<a href="?run=2018-01/2018-01-02&amp;test_prefix=a%20b%26c&amp;test_page=2&amp;catalog_page=2">2</a>' in links
@@ -0,0 +1,124 @@
+"""
+Unit tests for descqaweb.runindex
+"""
+import os
+import json
+import sqlite3
+
+from descqaweb.runindex import INDEX_FILENAME, SCHEMA_VERSION, RunIndex, get_run_index
+from descqaweb.history import get_score_history, find_regressions
+
+
+def make_fake_run(root_dir, run_name, user, tests, catalogs, comment=None, results=None):
+    path = os.path.join(root_dir, run_name.rpartition('-')[0], run_name)
+    for test in tests:
+        for catalog in catalogs:
+            os.makedirs(os.path.join(path, test, catalog))
+            status, score = (results or {}).get((test, catalog), ('VALIDATION_TEST_PASSED', '1.0'))
+            with open(os.path.join(path, test, catalog, 'STATUS'), 'w') as f:
+                f.write('{}\nsummary\n{}\n'.format(status, score))
+            open(os.path.join(path, test, catalog, 'plot.png'), 'w').close()
+    status = dict(user=user)
+    if comment:
+        status['comment'] = comment
+    with open(os.path.join(path, 'STATUS.json'), 'w') as f:
+        json.dump(status, f)
+
+
+def test_run_index(tmpdir):
+    root_dir = str(tmpdir)
+    make_fake_run(root_dir, '2020-01-31', 'alice', ['smf'], ['cat_a'], 'full run')
+    make_fake_run(root_dir, '2020-02-01', 'bob', ['smf', 'tpcf'], ['cat_a', 'cat_b'])
+    make_fake_run(root_dir, '2020-02-01_1', 'alice', ['nz'], ['cat_b'])
+    make_fake_run(root_dir, '2020-02-01_2', 'alice', ['nz'], ['cat_b'])
+    open(os.path.join(root_dir, '2020-02', '2020-02-01_2', '.lock'), 'w').close()
+
+    assert get_run_index(root_dir) is None
+    with RunIndex(root_dir) as run_index:
+        run_index.add_run('2020-02-01')
+    assert get_run_index(root_dir) is None # not filled from all run directories yet
+    with RunIndex(root_dir) as run_index:
+        assert run_index.update() == 2
+
+    run_index = get_run_index(root_dir)
+    assert run_index.count_runs() == 3
+    assert [r.name for r in run_index.get_runs()] == ['2020-02-01_1', '2020-02-01', '2020-01-31']
+    assert [r.name for r in run_index.get_runs(offset=1, limit=1)] == ['2020-02-01']
+    assert [r.name for r in run_index.get_runs(months=1)] == ['2020-02-01_1', '2020-02-01']
+    assert [r.name for r in run_index.get_runs(search={'users': 'alice'})] == ['2020-02-01_1', '2020-01-31']
+    assert [r.name for r in run_index.get_runs(search={'tests': 'smf tp', 'catalogs': 'cat_'})] == ['2020-02-01']
+    assert run_index.count_runs(search={'catalogs': 'cat_a', 'users': 'alice bob'}) == 2
+    assert run_index.count_runs(search={'tests': 's%'}) == 0
+
+    run = run_index.get_runs(limit=2)[1]
+    assert run.status['user'] == 'bob'
+    assert run.tests == ('smf', 'tpcf')
+    assert run.catalogs == ('cat_a', 'cat_b')
+    assert run_index.get_items('2020-02-01')['tpcf', 'cat_b'] == ('VALIDATION_TEST_PASSED', 'summary', '1.0')
+    assert run_index.get_files('2020-02-01', 'tpcf', 'cat_b') == ('plot.png',)
+
+    assert run_index.find_last_run() == '2020-02-01_1'
+    assert run_index.find_last_run('Full Run') == '2020-01-31'
+    run_index.close()
+
+    os.remove(os.path.join(root_dir, '2020-02', '2020-02-01_2', '.lock'))
+    with get_run_index(root_dir) as run_index:
+        assert run_index.get_unindexed_runs() == ['2020-02-01_2']
+    with RunIndex(root_dir) as run_index:
+        assert run_index.update() == 1
+        assert run_index.find_last_run() == '2020-02-01_2'
+
+
+def test_history(tmpdir):
+    root_dir = str(tmpdir)
+    make_fake_run(root_dir, '2020-01-31', 'alice', ['smf'], ['cat_a', 'cat_b'], 'full run')
+    make_fake_run(root_dir, '2020-02-01', 'bob', ['smf'], ['cat_a', 'cat_b'], 'full run',
+                  {('smf', 'cat_a'): ('VALIDATION_TEST_PASSED', '1.5')})
+    make_fake_run(root_dir, '2020-02-02', 'bob', ['smf'], ['cat_a', 'cat_b'], None,
+                  {('smf', 'cat_a'): ('VALIDATION_TEST_PASSED', '3.0'), ('smf', 'cat_b'): ('VALIDATION_TEST_FAILED', '')})
+
+    with RunIndex(root_dir) as run_index:
+        run_index.update()
+
+        history = get_score_history(run_index, 'smf')
+        assert list(history) == ['cat_a', 'cat_b']
+        assert [r['score'] for r in history['cat_a']] == [1.0, 1.5, 3.0]
+        assert [r['score'] for r in history['cat_b']] == [1.0, 1.0, None]
+        history = get_score_history(run_index, 'smf', 'cat_a', comment='full run')
+        assert [r['run'] for r in history['cat_a']] == ['2020-01-31', '2020-02-01']
+
+        run, reference, regressions = find_regressions(run_index, threshold=1.0)
+        assert (run, reference) == ('2020-02-02', '2020-02-01')
+        assert [(r['catalog'], r['change']) for r in regressions] == [('cat_a', 1.5), ('cat_b', None)]
+        _, reference, regressions = find_regressions(run_index, run='2020-02-01')
+        assert reference == '2020-01-31'
+        assert [r['catalog'] for r in regressions] == ['cat_a']
+        assert not find_regressions(run_index, run='2020-02-01', higher_is_worse=False)[2]
+
+
+def test_schema_migration(tmpdir):
+    root_dir = str(tmpdir)
+    make_fake_run(root_dir, '2020-01-31', 'alice', ['smf'], ['cat_a'], 'full run')
+    make_fake_run(root_dir, '2020-02-01', 'bob', ['smf'], ['cat_a'])
+
+    # index written before items.run_time was added (schema version 0)
+    conn = sqlite3.connect(os.path.join(root_dir, INDEX_FILENAME))
+    conn.executescript('''
+        CREATE TABLE runs (name TEXT PRIMARY KEY, month TEXT NOT NULL, date TEXT NOT NULL, seq INTEGER NOT NULL,
+                           user TEXT, comment TEXT, start_time REAL, end_time REAL, status TEXT, indexed_at REAL);
+        CREATE TABLE items (run TEXT NOT NULL, test TEXT NOT NULL, catalog TEXT NOT NULL,
+                            status TEXT, summary TEXT, score TEXT, PRIMARY KEY (run, test, catalog));
+        CREATE TABLE files (run TEXT NOT NULL, test TEXT NOT NULL, catalog TEXT NOT NULL, filename TEXT NOT NULL,
+                            PRIMARY KEY (run, test, catalog, filename));
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        INSERT INTO meta VALUES ('complete', '1');
+    ''')
+    conn.commit()
+    conn.close()
+    assert get_run_index(root_dir) is None
+
+    with RunIndex(root_dir) as run_index:
+        assert run_index.schema_version == SCHEMA_VERSION
+        assert run_index.update() == 2
+        assert len(get_score_history(run_index, 'smf')['cat_a']) == 2
+    assert get_run_index(root_dir) is not None
@@ -0,0 +1,25 @@
+"""
+Unit tests for descqaweb.twopanels
+"""
+import os
+
+from descqaweb.twopanels import get_file_response, get_image_response
+
+
+def test_file_response(tmpdir):
+    root_dir = str(tmpdir)
+    cell_dir = os.path.join(root_dir, '2020-02', '2020-02-01', 'smf', 'cat a')
+    os.makedirs(cell_dir)
+    with open(os.path.join(cell_dir, 'plot.png'), 'wb') as f:
+        f.write(b'png')
+
+    status, _, body = get_file_response('2020-02/2020-02-01/smf/cat a/plot.png', root_dir)
+    assert status == '200 OK'
+    assert b'<img src="?image=2020-02/2020-02-01/smf/cat%20a/plot.png"' in body
+    assert get_image_response('2020-02/2020-02-01/smf/cat a/plot.png', root_dir=root_dir)[2] == b'png'
+
+    for target_file in ('2020-02/2020-02-01/smf/cat a/"><img src=x onerror=alert(1)>/../plot.png', '../plot.png'):
+        status, headers, body = get_file_response(target_file, root_dir)
+        assert body.startswith(b'[Error]')
+        assert ('Content-Type', 'text/plain; charset=utf-8') in headers
+        assert get_image_response(target_file, root_dir=root_dir)[0] == '404 Not Found'
@@ -8,6 +8,48 @@ import astropy.cosmology
 import astropy.units as u
 from .GalaxyCatalogInterface import GalaxyCatalog
 
+
+class _LazyOutputGroup(object):
+    """
+    Read-only, dict-like view of an 'Output' group of the catalog file. Datasets
+    are read only when first accessed (and then kept), so that memory use and
+    loading time scale with the quantities requested rather than the file size.
+
+    If use_memmap is set, contiguous uncompressed datasets are memory-mapped
+    from the file instead of being read.
+    """
+
+    def __init__(self, group, filename, use_memmap=False):
+        self._group = group
+        self._filename = filename
+        self._use_memmap = use_memmap
+        self._keys = [str(x) for x in group.keys()]
+        self._arrays = {}
+
+    def keys(self):
+        return list(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __getitem__(self, key):
+        if key not in self._arrays:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._arrays[key] = self._read(self._group[key])
+        return self._arrays[key]
+
+    def _read(self, dataset):
+        if self._use_memmap and dataset.size and dataset.compression is None and dataset.chunks is None:
+            offset = dataset.id.get_offset()
+            if offset is not None:
+                return np.memmap(self._filename, mode='r', dtype=dataset.dtype, offset=offset, shape=dataset.shape)
+        array = np.empty(dataset.shape, dtype=dataset.dtype)
+        if dataset.size:
+            dataset.read_direct(array)
+        return array
+
+
 class GalacticusGalaxyCatalog(GalaxyCatalog):
     """
     Argonne galaxy catalog class. Uses generic quantity and filter mechanisms
@@ -153,6 +195,7 @@ class GalacticusGalaxyCatalog(GalaxyCatalog):
 
         self.outkeys = []
         self.zvalues = []
+        self._hdf5file = None   #kept open once data are requested
         self.load_init()   #get catalog output keys only
 
     def load_init(self):
@@ -190,7 +233,8 @@ class GalacticusGalaxyCatalog(GalaxyCatalog):
     def load(self,hdfKeys=[]):
         """
         Given a catalog path, attempt to read the catalog and set up its
-        internal data structures.
+        internal data structures. Only the list of datasets of each output
+        is read here; the datasets themselves are read when requested.
         """
         if len(self.outkeys)==0:
             self.load_init()
@@ -200,20 +244,26 @@ class GalacticusGalaxyCatalog(GalaxyCatalog):
             hdfKeys=self.outkeys
 
         fn = os.path.join(self.kwargs['base_catalog_dir'],self.kwargs['filename'])
-        hdfFile = h5py.File(fn, 'r')
+        if self._hdf5file is None:
+            self._hdf5file = h5py.File(fn, 'r')
 
         #print "load using keys: ", hdfKeys
-        #loop over requested keys and fetch those not already loaded
+        #loop over requested keys and set up those not already loaded
         for key in hdfKeys:
             if 'Output' in key and not(key in self.catalog.keys()): #check key, check if already loaded
-                outgroup = hdfFile[key]
-                dataKeys, dataAttrs = self._gethdf5group(outgroup)
-                self.catalog[key] = self._gethdf5arrays(outgroup)
-
+                self.catalog[key] = _LazyOutputGroup(self._hdf5file[key], fn, self.kwargs.get('use_memmap', False))
 
-        hdfFile.close()
         return
 
+    def close(self):
+        """
+        Close the catalog file and drop the data read so far.
+        """
+        self.catalog = {}
+        if self._hdf5file is not None:
+            self._hdf5file.close()
+            self._hdf5file = None
+
     # Functions for applying filters
 
     #check this function to see if really necessary
@@ -228,13 +278,13 @@ class GalacticusGalaxyCatalog(GalaxyCatalog):
         for filter_name in filters.keys():
             if filter_name == 'zlo':
                 try:
-                    zmax = max(halo['redshift'])
+                    zmax = np.max(halo['redshift'])
                     status = status and (zmax >= filters[filter_name])
                 except KeyError:
                     status = False
             elif filter_name  == 'zhi':
                 try:
-                    zmin = min(halo['redshift'])
+                    zmin = np.min(halo['redshift'])
                     status = status and (zmin <= filters[filter_name])
                 except KeyError:
                     status = False
@@ -269,13 +319,13 @@ class GalacticusGalaxyCatalog(GalaxyCatalog):
             for outkey in outkeys:
                 outdict = self.catalog[outkey]
                 if self._check_halo(outdict, filters):
-                    if quantity in outdict.keys():
-                        props.extend(outdict[quantity])
+                    if quantity in outdict:
+                        props.append(outdict[quantity])
 
         else:
             raise ValueError('No catalog outputs available for redshifts requested')
 
-        return np.asarray(props)
+        return self._concatenate(props)
 
     def _get_derived_property(self, quantity, filters):
         """
@@ -308,13 +358,27 @@ class GalacticusGalaxyCatalog(GalaxyCatalog):
                     #    values = outdict[stored_qty_name[0]]
                     #    props.extend(stored_qty_fctn(values, stored_qty_name[1:]))
                     #else:
-                    if stored_qty_name in outdict.keys():
-                        props.extend(stored_qty_fctn( outdict[stored_qty_name] ))
+                    if stored_qty_name in outdict:
+                        props.append(stored_qty_fctn( outdict[stored_qty_name] ))
 
         else:
             print ('No catalog outputs available for redshifts requested')
 
-        return np.asarray(props)
+        return self._concatenate(props)
+
+    @staticmethod
+    def _concatenate(arrays):
+        """
+        Concatenate the arrays of several outputs into one preallocated array.
+        """
+        if len(arrays)==0:
+            return np.asarray([])
+        result = np.empty((sum(len(a) for a in arrays),) + np.shape(arrays[0])[1:], dtype=np.result_type(*arrays))
+        start = 0
+        for a in arrays:
+            result[start:start+len(a)] = a
+            start += len(a)
+        return result
 
     # Functions for computing derived values
 
@@ -322,10 +386,7 @@ class GalacticusGalaxyCatalog(GalaxyCatalog):
         """
         Take a list of numbers and return 10.**(the numbers).
         """
-        result = []
-        for value in propList:
-            result.append(10.**value)
-        return result
+        return np.power(10., propList)
 
     # HDF5 utility routines
 
@@ -354,24 +415,6 @@ class GalacticusGalaxyCatalog(GalaxyCatalog):
         #endfor
         return groupkeys,groupdict
 
-    def _gethdf5arrays(self,group,*args):
-        groupkeys=self._gethdf5keys(group)
-        arraydict={}
-        oldlen=-1
-        for key in groupkeys:
-            array=np.array(group[key])
-            arraylen=len(array)
-            if(oldlen>-1):         #check that array length is unchanged
-                if(oldlen!=arraylen):
-                    print "Warning: hdf5 array length changed for key",key
-                #endif
-            else:
-                oldlen=arraylen   #set to ist array length
-            #endif
-            arraydict[str(key)]=array
-        #endfor
-        return arraydict
-
     def _multiply(self, propList, factor_tuple):
         """
         Multiplication routine -- derived quantity is equal to a stored